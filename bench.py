@@ -0,0 +1,388 @@
+"""Benchmark suite for the file sharing app
+
+Runs the listing, polling, upload ingest and archive download routes through
+the Flask test client against synthetic upload trees. The contention
+scenario fires many same-named text uploads at once and fails if any two of
+them end up in the same file.
+
+    python bench.py                                  # default matrix
+    python bench.py --files 1000,100000 --depth 1,4 --sizes small,mixed
+    python bench.py --output results.json --baseline bench_baseline.json
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --files 1000 --depth 1 --scenarios contention --contention-uploads 1000
+
+Every case runs in a fresh process so peak RSS is reported per case.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from queue import Empty
+
+
+SCENARIOS = ['listing', 'polling', 'download', 'ingest', 'contention']
+# How long a case may wait for the app's startup scan of its tree
+SETTLE_TIMEOUT = 3600
+
+# Size distributions for synthetic files, in bytes
+SIZE_DISTRIBUTIONS = {
+    'empty': lambda rng: 0,
+    'small': lambda rng: int(rng.lognormvariate(7, 1.5)) % (256 * 1024),
+    'mixed': lambda rng: (rng.randint(1, 8) * 1024 * 1024 if rng.random() < 0.01
+                          else int(rng.lognormvariate(8, 2)) % (1024 * 1024)),
+}
+
+FILES_PER_DIR = 100
+ITEMS_PER_FOLDER = 1000
+
+
+def generate_tree(root, file_count, depth, sizes, seed=0):
+    """Create a synthetic upload tree with roughly file_count files
+
+    One in ten files sits at the top level like a single upload or text
+    paste; the rest go into upload folders nested `depth` levels deep.
+    """
+    rng = random.Random(seed)
+    size_of = SIZE_DISTRIBUTIONS[sizes]
+    os.makedirs(root, exist_ok=True)
+    payload = os.urandom(1024 * 1024)
+
+    def write(path, size):
+        with open(path, 'wb') as f:
+            while size > 0:
+                chunk = payload[:min(size, len(payload))]
+                f.write(chunk)
+                size -= len(chunk)
+
+    top_level = max(1, file_count // 10)
+    for i in range(top_level):
+        ext = '.txt' if i % 3 == 0 else '.bin'
+        write(os.path.join(root, f'file_{i:07d}{ext}'), size_of(rng))
+
+    remaining = file_count - top_level
+    folder_index = 0
+    while remaining > 0:
+        folder = os.path.join(root, f'Multiple_Folders_bench_{folder_index:05d}')
+        in_folder = min(remaining, ITEMS_PER_FOLDER)
+        for i in range(in_folder):
+            parts = [f'd{(i // FILES_PER_DIR) % 10}'] + [f'l{level}' for level in range(1, depth)]
+            directory = os.path.join(folder, *parts[:depth])
+            os.makedirs(directory, exist_ok=True)
+            write(os.path.join(directory, f'f_{i:05d}.dat'), size_of(rng))
+        remaining -= in_folder
+        folder_index += 1
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100.0 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KB elsewhere
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def build_ingest_payload(rng, file_count, depth, sizes, iteration):
+    """Build the multipart fields for one folder upload"""
+    size_of = SIZE_DISTRIBUTIONS[sizes]
+    files = []
+    total = 0
+    for i in range(file_count):
+        parts = [f'bench_ingest_{iteration}'] + [f'l{level}' for level in range(depth)]
+        size = size_of(rng)
+        total += size
+        data = os.urandom(64) * (size // 64) + os.urandom(size % 64)
+        files.append((BytesIO(data), '/'.join(parts + [f'f_{i:05d}.dat'])))
+    return files, total
+
+
+def run_case(case, tree_root, data_folder, iterations, result_queue):
+    """Run one benchmark case inside a fresh process
+
+    The app keeps its search index, checksums, jobs and manifests in
+    data_folder, which is the case's own so no case sees another's state.
+    Whatever goes wrong, the case reports a result rather than leaving the
+    parent waiting.
+    """
+    try:
+        measure_case(case, tree_root, data_folder, iterations, result_queue)
+    except BaseException as e:
+        result_queue.put(dict(case, error=repr(e)))
+
+
+def measure_case(case, tree_root, data_folder, iterations, result_queue):
+    os.environ['UPLOAD_FOLDER'] = tree_root
+    os.environ['DATA_FOLDER'] = data_folder
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import ip
+
+    # Time the app, not its startup scan and search index build
+    if not ip.catalog_synced.wait(SETTLE_TIMEOUT):
+        raise RuntimeError(f'catalog not ready after {SETTLE_TIMEOUT}s')
+    client = ip.app.test_client()
+    rng = random.Random(1)
+    latencies = []
+    transferred = 0
+    scenario = case['scenario']
+
+    if scenario == 'listing':
+        requests = [lambda: client.get('/')] * iterations
+    elif scenario == 'polling':
+        current_hash = client.get('/check-updates').get_json()['hash']
+        requests = [lambda: client.get(f'/check-updates?hash={current_hash}')] * iterations
+    elif scenario == 'contention':
+        # Every upload uses the same title, so each must get a name of its own
+        title = f"contended_{os.getpid()}"
+        requests = [lambda i=i: client.post('/upload-text', data={'title': title, 'text_content': f'upload {i}'})
+                    for i in range(case['contention_uploads'])]
+    elif scenario == 'download':
+        folders = sorted(name for name in os.listdir(tree_root)
+                         if os.path.isdir(os.path.join(tree_root, name)))
+        if not folders:
+            result_queue.put(dict(case, skipped='no folders in tree'))
+            return
+        requests = [lambda name=folders[i % len(folders)]: client.get(f'/download-folder/{name}')
+                    for i in range(iterations)]
+    else:
+        requests = []
+        for i in range(iterations):
+            def upload(i=i):
+                files, total = build_ingest_payload(rng, case['ingest_files'], case['depth'],
+                                                    case['sizes'], i)
+                response = client.post('/upload-folder', data={'files': files},
+                                       content_type='multipart/form-data')
+                response.total_bytes = total
+                return response
+            requests.append(upload)
+
+    failures = []
+    lock = threading.Lock()
+
+    def timed(request):
+        nonlocal transferred
+        t0 = time.perf_counter()
+        response = request()
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                failures.append(response.status_code)
+            transferred += getattr(response, 'total_bytes', None) or len(response.get_data())
+
+    started = time.perf_counter()
+    if scenario == 'contention':
+        with ThreadPoolExecutor(case['contention_threads']) as pool:
+            list(pool.map(timed, requests))
+    else:
+        for request in requests:
+            timed(request)
+            if failures:
+                break
+    elapsed = time.perf_counter() - started
+    if failures:
+        result_queue.put(dict(case, error=f'HTTP {failures[0]}'))
+        return
+    if scenario == 'contention':
+        # Count the catalog, not the tree, which may be laid out by date
+        with ip.catalog_lock:
+            stored = [name for name in ip.catalog if name.startswith(title)]
+        if len(stored) != len(requests):
+            result_queue.put(dict(case, error=f'{len(requests) - len(stored)} of {len(requests)} '
+                                              f'uploads overwritten by another'))
+            return
+
+    result_queue.put(dict(
+        case,
+        requests=len(latencies),
+        elapsed_s=round(elapsed, 4),
+        throughput_rps=round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        throughput_mb_s=round(transferred / elapsed / (1024 * 1024), 3) if elapsed else 0.0,
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+        mean_ms=round(sum(latencies) / len(latencies) * 1000, 3),
+        peak_rss_kb=peak_rss_kb(),
+    ))
+
+
+def case_key(result):
+    return (result['scenario'], result['files'], result['depth'], result['sizes'])
+
+
+def compare(results, baseline, threshold):
+    """Compare results with a baseline, return the list of regressions"""
+    previous = {case_key(r): r for r in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'case':<40} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>9}")
+    for result in results:
+        old = previous.get(case_key(result))
+        if not old or 'p50_ms' not in result or 'p50_ms' not in old:
+            continue
+        label = '{}/{}f/d{}/{}'.format(*case_key(result))
+        # Lower is better for latency and memory, higher for throughput
+        for metric, higher_is_better in (('p50_ms', False), ('p99_ms', False),
+                                         ('throughput_rps', True), ('peak_rss_kb', False)):
+            before, after = old[metric], result[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = change < -threshold if higher_is_better else change > threshold
+            flag = '  REGRESSION' if worse else ''
+            print(f'{label:<40} {metric:<16} {before:>12} {after:>12} {change:>+8.1%}{flag}')
+            if worse:
+                regressions.append((label, metric, before, after))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def wait_for_result(worker, result_queue, case):
+    """Get the result of a case, or an error if its process dies without one"""
+    while True:
+        try:
+            return result_queue.get(timeout=1)
+        except Empty:
+            if not worker.is_alive():
+                break
+    try:
+        # Sent just before the process exited
+        return result_queue.get(timeout=1)
+    except Empty:
+        return dict(case, error=f'worker exited with code {worker.exitcode}')
+
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', default='1000,10000',
+                        help='comma separated file counts, e.g. 1000,100000,1000000')
+    parser.add_argument('--depth', default='1,4', help='comma separated folder depths')
+    parser.add_argument('--sizes', default='small',
+                        help='comma separated size distributions: ' + ','.join(SIZE_DISTRIBUTIONS))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--iterations', type=int, default=20, help='requests per case')
+    parser.add_argument('--ingest-files', type=int, default=200,
+                        help='files per folder upload in the ingest scenario')
+    parser.add_argument('--contention-uploads', type=int, default=1000,
+                        help='same-named uploads fired at once in the contention scenario')
+    parser.add_argument('--contention-threads', type=int, default=64,
+                        help='concurrent clients in the contention scenario')
+    parser.add_argument('--workdir', help='where to build trees (default: a temp dir)')
+    parser.add_argument('--keep-trees', action='store_true')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', help='also write results to this baseline path')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change counted as a regression (default 0.10)')
+    args = parser.parse_args()
+
+    for sizes in parse_list(args.sizes):
+        if sizes not in SIZE_DISTRIBUTIONS:
+            parser.error(f'unknown size distribution: {sizes}')
+    for scenario in parse_list(args.scenarios):
+        if scenario not in SCENARIOS:
+            parser.error(f'unknown scenario: {scenario}')
+    # Ingest and contention mutate the tree, so they always run last
+    scenarios = sorted(set(parse_list(args.scenarios)), key=SCENARIOS.index)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='filesharing-bench-')
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+
+    try:
+        for file_count in parse_list(args.files, int):
+            for depth in parse_list(args.depth, int):
+                for sizes in parse_list(args.sizes):
+                    tree_root = os.path.join(workdir, f'tree_{file_count}_{depth}_{sizes}')
+                    if not os.path.exists(tree_root):
+                        t0 = time.perf_counter()
+                        generate_tree(tree_root, file_count, depth, sizes)
+                        print(f'generated {file_count} files, depth {depth}, {sizes} sizes '
+                              f'in {time.perf_counter() - t0:.1f}s')
+
+                    for scenario in scenarios:
+                        case = {'scenario': scenario, 'files': file_count, 'depth': depth,
+                                'sizes': sizes, 'ingest_files': args.ingest_files,
+                                'contention_uploads': args.contention_uploads,
+                                'contention_threads': args.contention_threads}
+                        data_folder = f'{tree_root}_data_{scenario}'
+                        shutil.rmtree(data_folder, ignore_errors=True)
+                        queue = ctx.Queue()
+                        worker = ctx.Process(target=run_case,
+                                             args=(case, tree_root, data_folder, args.iterations, queue))
+                        worker.start()
+                        result = wait_for_result(worker, queue, case)
+                        worker.join()
+                        if not args.keep_trees:
+                            shutil.rmtree(data_folder, ignore_errors=True)
+                        results.append(result)
+                        if 'p50_ms' in result:
+                            print(f"{scenario:<9} {file_count:>8}f d{depth} {sizes:<6} "
+                                  f"p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                                  f"{result['throughput_rps']:>8.1f} req/s  "
+                                  f"{result['throughput_mb_s']:>8.2f} MB/s  "
+                                  f"rss {result['peak_rss_kb'] // 1024} MB")
+                        else:
+                            print(f"{scenario:<9} {file_count:>8}f d{depth} {sizes:<6} "
+                                  f"{result.get('error') or result.get('skipped')}")
+
+                    if not args.keep_trees:
+                        shutil.rmtree(tree_root, ignore_errors=True)
+    finally:
+        if not args.workdir and not args.keep_trees:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'wrote {path}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,1174 @@
-from flask import Flask, request, render_template_string, send_from_directory, redirect, url_for, send_file, jsonify
+from flask import Flask, request, render_template_string, send_from_directory, redirect, url_for, send_file, jsonify, abort, Response, g, has_request_context
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue
+from werkzeug.http import parse_options_header
+from werkzeug.security import safe_join
 import os
+import errno
 import zipfile
-from io import BytesIO
-from datetime import datetime, timedelta
+from io import BytesIO, BufferedReader
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from collections import deque
 import hashlib
+import hmac
+import base64
 import json
 import time
 import threading
+import sys
+import sqlite3
+import gzip
+import zlib
+import struct
+import codecs
+import mmap
+import bisect
+import shutil
+import tempfile
+import mimetypes
+import subprocess
+import socket
+import http.client
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
 
 
 app = Flask(__name__)
-UPLOAD_FOLDER = 'uploads'
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+# 'flat' keeps every upload directly in UPLOAD_FOLDER, 'dated' partitions
+# uploads by day as UPLOAD_FOLDER/YYYY/MM/DD/<name>
+STORAGE_LAYOUT = os.environ.get('STORAGE_LAYOUT', 'flat')
+# App state (search index, ...) lives outside the upload folder
+DATA_FOLDER = os.environ.get('DATA_FOLDER', 'data')
+SEARCH_DB = os.path.join(DATA_FOLDER, 'search.db')
+SEARCH_MAX_TEXT_BYTES = int(os.environ.get('SEARCH_MAX_TEXT_BYTES', 10 * 1024 * 1024))
+CHECKSUM_DB = os.path.join(DATA_FOLDER, 'checksums.db')
+INCOMING_FOLDER = os.path.join(DATA_FOLDER, 'incoming')
+THUMBNAIL_FOLDER = os.path.join(DATA_FOLDER, 'thumbnails')
+MANIFEST_FOLDER = os.path.join(DATA_FOLDER, 'manifests')
+JOBS_DB = os.path.join(DATA_FOLDER, 'jobs.db')
+# Threads running background jobs (search indexing, thumbnails, replication)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# 'off' loads the app without starting its background threads (watcher,
+# job workers, expiry, scrubbing, cluster sync), e.g. for tests
+BACKGROUND_TASKS = os.environ.get('BACKGROUND_TASKS', 'on')
+# Largest accepted text paste, and the size above which pastes are stored
+# gzip compressed (0 disables compression)
+TEXT_MAX_BYTES = int(os.environ.get('TEXT_MAX_BYTES', 100 * 1024 * 1024))
+TEXT_GZIP_THRESHOLD = int(os.environ.get('TEXT_GZIP_THRESHOLD', 0))
+# At-rest compression of compressible uploads: 'off', 'gzip' or 'zstd'
+AT_REST_COMPRESSION = os.environ.get('AT_REST_COMPRESSION', 'off')
+AT_REST_MIN_BYTES = int(os.environ.get('AT_REST_MIN_BYTES', 4096))
+CHUNK_SIZE = 64 * 1024
+# HTML and JSON responses larger than this are sent compressed
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+# Bandwidth in bytes per second for all transfers together and for each
+# client, and how many transfers may run at once overall and per client
+# (0 disables a limit)
+BANDWIDTH_LIMIT = int(os.environ.get('BANDWIDTH_LIMIT', 0))
+CLIENT_BANDWIDTH_LIMIT = int(os.environ.get('CLIENT_BANDWIDTH_LIMIT', 0))
+MAX_TRANSFERS = int(os.environ.get('MAX_TRANSFERS', 0))
+CLIENT_MAX_TRANSFERS = int(os.environ.get('CLIENT_MAX_TRANSFERS', 0))
+# Where uploads are kept for good: 'local' in the STORAGE_ROOT directory,
+# 's3' in a bucket of an S3 compatible object store. Unless that is the
+# upload folder itself, the upload folder is this node's working copy.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+STORAGE_ROOT = os.environ.get('STORAGE_ROOT', UPLOAD_FOLDER)
+S3_ENDPOINT = os.environ.get('S3_ENDPOINT', 'http://127.0.0.1:9000')
+S3_BUCKET = os.environ.get('S3_BUCKET', 'file-sharing')
+S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY', '')
+S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY', '')
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+# Objects larger than a part move as parts, S3_CONCURRENCY of them at a time
+S3_PART_SIZE = int(os.environ.get('S3_PART_SIZE', 8 * 1024 * 1024))
+S3_CONCURRENCY = int(os.environ.get('S3_CONCURRENCY', 8))
+# Cluster mode: nodes sharing CLUSTER_DB, an SQLite file all of them can
+# reach, follow each other's changes and report the same catalog versions.
+# Nodes on one host need distinct NODE_IDs.
+CLUSTER_DB = os.environ.get('CLUSTER_DB', '')
+CLUSTER_POLL_INTERVAL = float(os.environ.get('CLUSTER_POLL_INTERVAL', 1))
+NODE_ID = os.environ.get('NODE_ID') or socket.gethostname()
+# Share links are signed with SHARE_SECRET; without one a random secret is
+# kept in DATA_FOLDER. Nodes serving the same links need the same secret.
+SHARE_SECRET = os.environ.get('SHARE_SECRET', '')
+SHARE_TTL = int(os.environ.get('SHARE_TTL', 7 * 24 * 3600))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(DATA_FOLDER, exist_ok=True)
+os.makedirs(INCOMING_FOLDER, exist_ok=True)
+os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+os.makedirs(MANIFEST_FOLDER, exist_ok=True)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+if AT_REST_COMPRESSION == 'zstd' and zstandard is None:
+    print("zstandard is not installed, compressing uploads with gzip instead")
+    AT_REST_COMPRESSION = 'gzip'
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PARTITION_FORMAT = os.path.join('%Y', '%m', '%d')
+_partition_cache = {}
+
+
+def is_partition_year(name):
+    """Check if a top level entry is a year directory of the dated layout"""
+    return len(name) == 4 and name.isdigit() and os.path.isdir(os.path.join(UPLOAD_FOLDER, name))
+
+
+def list_partitions():
+    """List (date, path) of every day partition, newest first"""
+    partitions = []
+    for year in os.listdir(UPLOAD_FOLDER):
+        if not is_partition_year(year):
+            continue
+        year_path = os.path.join(UPLOAD_FOLDER, year)
+        for month in os.listdir(year_path):
+            month_path = os.path.join(year_path, month)
+            if not (month.isdigit() and os.path.isdir(month_path)):
+                continue
+            for day in os.listdir(month_path):
+                day_path = os.path.join(month_path, day)
+                try:
+                    partition_date = datetime(int(year), int(month), int(day))
+                except ValueError:
+                    continue
+                if os.path.isdir(day_path):
+                    partitions.append((partition_date, day_path))
+    partitions.sort(reverse=True)
+    return partitions
+
+
+def today_partition():
+    """Get (and create) the partition for uploads made today"""
+    path = os.path.join(UPLOAD_FOLDER, datetime.now().strftime(PARTITION_FORMAT))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def item_location(name):
+    """Get the directory holding a top level upload, or None if it does not exist"""
+    if STORAGE_LAYOUT != 'dated':
+        return UPLOAD_FOLDER
+    
+    cached = _partition_cache.get(name)
+    if cached and os.path.exists(os.path.join(cached, name)):
+        return cached
+    
+    for _, partition in list_partitions():
+        if os.path.exists(os.path.join(partition, name)):
+            _partition_cache[name] = partition
+            return partition
+    
+    # Uploads left over from the flat layout that were not migrated yet
+    if not is_partition_year(name) and os.path.exists(os.path.join(UPLOAD_FOLDER, name)):
+        return UPLOAD_FOLDER
+    return None
+
+
+def item_path(name):
+    """Resolve an upload name (optionally with a path inside a folder) to its path on disk"""
+    top = name.replace('\\', '/').split('/')[0]
+    location = item_location(top)
+    return os.path.join(location or UPLOAD_FOLDER, name)
+
+
+def item_exists(name):
+    return os.path.exists(item_path(name))
+
+
+def new_item_path(name):
+    """Get the path to write an upload to
+
+    In the dated layout new uploads go to today's partition. An existing
+    top level item with the same name is moved there first, so it is
+    replaced or merged into exactly as in the flat layout.
+    """
+    if STORAGE_LAYOUT != 'dated':
+        return os.path.join(UPLOAD_FOLDER, name)
+    
+    top = name.replace('\\', '/').split('/')[0]
+    partition = today_partition()
+    location = item_location(top)
+    if location and location != partition:
+        os.rename(os.path.join(location, top), os.path.join(partition, top))
+    _partition_cache[top] = partition
+    return os.path.join(partition, name)
+
+
+# Uploads are written under a temporary name in their final directory and
+# renamed into place once complete and synced to disk, so a crash never
+# leaves a truncated file under a real name. The catalog skips temporary
+# names and the janitor deletes the ones interrupted writes leave behind.
+TEMP_PREFIX = '.partial-'
+# A temporary file untouched for this long belongs to no running write
+ORPHAN_AGE = 3600
+
+
+def is_temp_name(name):
+    return name.startswith(TEMP_PREFIX)
+
+
+def create_temp(directory):
+    """Create a temporary file in `directory`, return (binary file object, path)"""
+    while True:
+        path = os.path.join(directory, TEMP_PREFIX + os.urandom(8).hex())
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        except FileExistsError:
+            continue
+        return os.fdopen(fd, 'wb'), path
+
+
+def sync_close(f):
+    """Flush a file to disk and close it"""
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def fsync_directory(path):
+    """Make the renames in a directory durable"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def commit_file(temp_path, file_path):
+    """Give a complete, synced temporary file its final name"""
+    os.replace(temp_path, file_path)
+    fsync_directory(os.path.dirname(file_path) or '.')
+
+
+def move_into_place(source, file_path):
+    """Atomically move a complete, synced file from elsewhere to its final name"""
+    try:
+        commit_file(source, file_path)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # Another filesystem, copy it next to the target first
+    f, temp_path = create_temp(os.path.dirname(file_path) or '.')
+    try:
+        with open(source, 'rb') as src:
+            shutil.copyfileobj(src, f, CHUNK_SIZE)
+        sync_close(f)
+        commit_file(temp_path, file_path)
+    except BaseException:
+        f.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.remove(source)
+
+
+def link_blob(source, file_path):
+    """Give a stored file another name, copying it where it cannot be hard linked"""
+    directory = os.path.dirname(file_path) or '.'
+    temp_path = os.path.join(directory, TEMP_PREFIX + os.urandom(8).hex())
+    try:
+        os.link(source, temp_path)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise
+        f, temp_path = create_temp(directory)
+        try:
+            with open(source, 'rb') as src:
+                shutil.copyfileobj(src, f, CHUNK_SIZE)
+            sync_close(f)
+        except BaseException:
+            f.close()
+            os.remove(temp_path)
+            raise
+    commit_file(temp_path, file_path)
+
+
+def remove_orphans(max_age=ORPHAN_AGE):
+    """Delete temporary files and staging directories of writes that never finished"""
+    cutoff = time.time() - max_age
+    roots = [UPLOAD_FOLDER, INCOMING_FOLDER]
+    if STORAGE_MIRRORED and isinstance(storage, LocalStorage):
+        roots.append(storage.root)
+    with upload_sessions_lock:
+        staging = {session['staging'] for session in upload_sessions.values()}
+    removed = 0
+    for top in roots:
+        for root, dirs, files in os.walk(top):
+            for dirname in [d for d in dirs if is_temp_name(d)]:
+                dirs.remove(dirname)
+                path = os.path.join(root, dirname)
+                try:
+                    if path not in staging and os.stat(path).st_mtime < cutoff:
+                        shutil.rmtree(path)
+                        removed += 1
+                except OSError:
+                    continue
+            for filename in files:
+                if not (is_temp_name(filename) or top == INCOMING_FOLDER):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+    if removed:
+        print(f"Removed {removed} orphaned temporary item(s)")
+    return removed
+
+
+def janitor():
+    """Run remove_orphans, expire_upload_sessions and prune_jobs at startup and then every hour"""
+    while True:
+        expire_upload_sessions()
+        remove_orphans()
+        prune_jobs()
+        time.sleep(3600)
+
+
+# Uploads compressed at rest stay valid gzip or zstd streams so they can be
+# sent as-is with Content-Encoding. A gzip upload carries a marker comment
+# and the uncompressed size in an extra header field, a zstd upload starts
+# with a skippable frame holding the same, so they can be told apart from
+# compressed files users uploaded and sized without decompressing.
+AT_REST_COMMENT = b'file-sharing at-rest\0'
+AT_REST_EXTRA_ID = b'FS'
+_GZIP_FLAGS = 0x04 | 0x10  # FEXTRA | FCOMMENT
+_GZIP_HEADER_SIZE = 10 + 2 + 4 + 8 + len(AT_REST_COMMENT)
+_ZSTD_SKIPPABLE_MAGIC = struct.pack('<I', 0x184D2A5F)
+_ZSTD_MARKER = b'FSAR'
+_ZSTD_HEADER_SIZE = 4 + 4 + len(_ZSTD_MARKER) + 8
+
+# Extensions that are already compressed and never worth compressing again
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.gz', '.tgz', '.bz2', '.xz', '.zst', '.zip', '.7z', '.rar', '.jar', '.apk',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp3', '.aac', '.ogg', '.opus', '.flac', '.m4a', '.mp4', '.mkv', '.webm', '.mov', '.avi',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt', '.woff', '.woff2',
+}
+COMPRESSIBLE_EXTENSIONS = {
+    '.txt', '.log', '.csv', '.tsv', '.json', '.xml', '.yaml', '.yml', '.md', '.html', '.css',
+    '.js', '.py', '.c', '.h', '.cpp', '.java', '.go', '.rs', '.sql', '.svg', '.ini', '.cfg', '.bmp',
+}
+
+
+class GzipAtRestWriter:
+    """File-like writer producing a gzip compressed upload"""
+    
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.crc = 0
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        f.write(b'\x1f\x8b\x08' + bytes([_GZIP_FLAGS]) + struct.pack('<I', int(time.time())) + b'\x00\xff')
+        f.write(struct.pack('<H', 4 + 8) + AT_REST_EXTRA_ID + struct.pack('<HQ', 8, 0))
+        f.write(AT_REST_COMMENT)
+    
+    def write(self, data):
+        self.size += len(data)
+        self.sha256.update(data)
+        self.crc = zlib.crc32(data, self.crc)
+        self.f.write(self.compressor.compress(data))
+    
+    def close(self):
+        self.f.write(self.compressor.flush())
+        self.f.write(struct.pack('<II', self.crc, self.size & 0xffffffff))
+        # Patch the real uncompressed size into the header
+        self.f.seek(16)
+        self.f.write(struct.pack('<Q', self.size))
+        sync_close(self.f)
+
+
+class ZstdAtRestWriter:
+    """File-like writer producing a zstd compressed upload"""
+    
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.compressor = zstandard.ZstdCompressor(level=3, write_checksum=True).compressobj()
+        f.write(_ZSTD_SKIPPABLE_MAGIC + struct.pack('<I', len(_ZSTD_MARKER) + 8) + _ZSTD_MARKER)
+        f.write(struct.pack('<Q', 0))
+    
+    def write(self, data):
+        self.size += len(data)
+        self.sha256.update(data)
+        self.f.write(self.compressor.compress(data))
+    
+    def close(self):
+        self.f.write(self.compressor.flush())
+        self.f.seek(_ZSTD_HEADER_SIZE - 8)
+        self.f.write(struct.pack('<Q', self.size))
+        sync_close(self.f)
+
+
+class PlainWriter:
+    """File-like writer storing an upload uncompressed"""
+    
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+    
+    def write(self, data):
+        self.size += len(data)
+        self.sha256.update(data)
+        self.f.write(data)
+    
+    def close(self):
+        sync_close(self.f)
+
+
+def at_rest_writer(f, encoding):
+    """Wrap a binary file opened for writing in a writer for the given encoding"""
+    if encoding == 'gzip':
+        return GzipAtRestWriter(f)
+    if encoding == 'zstd':
+        return ZstdAtRestWriter(f)
+    return PlainWriter(f)
+
+
+def should_compress(filename, sample):
+    """Decide from its name and first chunk whether an upload is worth compressing at rest"""
+    if AT_REST_COMPRESSION == 'off' or len(sample) < AT_REST_MIN_BYTES:
+        return False
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in INCOMPRESSIBLE_EXTENSIONS:
+        return False
+    mimetype = mimetypes.guess_type(filename)[0] or ''
+    if mimetype.startswith('text/') or ext in COMPRESSIBLE_EXTENSIONS:
+        return True
+    # Unknown type, see how well a sample compresses
+    return len(zlib.compress(sample, 1)) < len(sample) * 0.8
+
+
+def save_stream(stream, filename, file_path):
+    """Write an upload stream to disk, compressing it at rest when worthwhile
+    
+    Returns the SHA-256 of the bytes written, for record_checksums().
+    """
+    sample = stream.read(CHUNK_SIZE)
+    encoding = AT_REST_COMPRESSION if should_compress(filename, sample) else None
+    f, temp_path = create_temp(os.path.dirname(file_path) or '.')
+    try:
+        out = at_rest_writer(f, encoding)
+        try:
+            while sample:
+                out.write(sample)
+                sample = stream.read(CHUNK_SIZE)
+        finally:
+            out.close()
+        commit_file(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return out.sha256.hexdigest()
+
+
+def save_upload(file, file_path):
+    """Save an uploaded file, compressing it at rest when worthwhile"""
+    return save_stream(file.stream, file.filename, file_path)
+
+
+def stored_encoding(path):
+    """Get (encoding, logical size) of a stored upload; encoding is None for plain files"""
+    with open(path, 'rb') as f:
+        header = f.read(max(_GZIP_HEADER_SIZE, _ZSTD_HEADER_SIZE))
+    if (len(header) >= _GZIP_HEADER_SIZE and header[:4] == b'\x1f\x8b\x08' + bytes([_GZIP_FLAGS])
+            and header[12:14] == AT_REST_EXTRA_ID and header[24:_GZIP_HEADER_SIZE] == AT_REST_COMMENT):
+        return 'gzip', struct.unpack('<Q', header[16:24])[0]
+    if header[:4] == _ZSTD_SKIPPABLE_MAGIC and header[8:12] == _ZSTD_MARKER:
+        return 'zstd', struct.unpack('<Q', header[12:_ZSTD_HEADER_SIZE])[0]
+    return None, os.path.getsize(path)
+
+
+def open_upload(path):
+    """Open a stored upload for reading its original bytes"""
+    encoding, _ = stored_encoding(path)
+    if encoding == 'gzip':
+        return gzip.open(path, 'rb')
+    if encoding == 'zstd':
+        f = open(path, 'rb')
+        f.seek(_ZSTD_HEADER_SIZE)
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    return open(path, 'rb')
+
+
+def iter_upload(path):
+    """Yield the original bytes of a stored upload in chunks"""
+    with open_upload(path) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+# Storage backends hold objects named by keys like 2024/05/01/folder/file.txt,
+# the path of a file relative to the upload folder. They all offer
+# put_stream, get_range, list_prefix, delete and stat.
+class StorageError(OSError):
+    """A request to a storage backend failed"""
+
+
+def read_full(stream, size):
+    """Read `size` bytes from a stream, fewer only at its end"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+class LocalStorage:
+    """Objects as files under a directory"""
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def path(self, key):
+        path = safe_join(self.root, key)
+        if path is None:
+            raise StorageError(f"Invalid storage key: {key}")
+        return path
+    
+    def put_stream(self, key, stream):
+        """Store an object read from a stream, return its size"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f, temp_path = create_temp(os.path.dirname(path))
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                size += len(chunk)
+            sync_close(f)
+            commit_file(temp_path, path)
+        except BaseException:
+            f.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return size
+    
+    def get_range(self, key, start=0, end=None):
+        """Yield the bytes of an object from `start` up to, not including, `end`"""
+        with open(self.path(key), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+    
+    def list_prefix(self, prefix=''):
+        """Yield (key, size, mtime) of the objects whose key starts with `prefix`"""
+        base = prefix.rpartition('/')[0]
+        top = safe_join(self.root, base) if base else self.root
+        if top is None:
+            return
+        for dirpath, dirnames, filenames in os.walk(top):
+            rel = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            rel = '' if rel == '.' else rel + '/'
+            # Only descend into directories that can hold matching keys
+            dirnames[:] = sorted(d for d in dirnames
+                                 if (rel + d + '/').startswith(prefix) or prefix.startswith(rel + d + '/'))
+            for filename in sorted(filenames):
+                if not (rel + filename).startswith(prefix) or is_temp_name(filename):
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                yield rel + filename, st.st_size, st.st_mtime
+    
+    def delete(self, key):
+        path = self.path(key)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        # Drop directories the object leaves empty
+        path = os.path.dirname(path)
+        while os.path.abspath(path) != os.path.abspath(self.root):
+            try:
+                os.rmdir(path)
+            except OSError:
+                break
+            path = os.path.dirname(path)
+    
+    def stat(self, key):
+        """Get (size, mtime) of an object, None if it does not exist"""
+        try:
+            st = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime
+
+
+class S3Storage:
+    """Objects in a bucket of an S3 compatible object store
+    
+    Requests are signed with AWS signature version 4 and address the bucket
+    path-style. Objects larger than `part_size` are uploaded as a multipart
+    upload and downloaded as ranged GETs, `concurrency` parts at a time, so
+    a single large file is not held to the throughput of one connection.
+    """
+    
+    def __init__(self, endpoint, bucket, access_key, secret_key, region,
+                 part_size=S3_PART_SIZE, concurrency=S3_CONCURRENCY):
+        url = urllib.parse.urlsplit(endpoint)
+        self.secure = url.scheme == 'https'
+        self.host = url.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.pool = ThreadPoolExecutor(concurrency)
+        # One keep-alive connection per thread
+        self.local = threading.local()
+    
+    def sign(self, method, path, query, headers):
+        """Add the signature version 4 headers to a request"""
+        amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        headers['host'] = self.host
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = 'UNSIGNED-PAYLOAD'
+        signed_headers = sorted(headers)
+        canonical_query = '&'.join(f"{urllib.parse.quote(k, safe='-_.~')}={urllib.parse.quote(v, safe='-_.~')}"
+                                   for k, v in sorted(query.items()))
+        canonical_request = '\n'.join([
+            method, path, canonical_query,
+            ''.join(f"{name}:{headers[name].strip()}\n" for name in signed_headers),
+            ';'.join(signed_headers), 'UNSIGNED-PAYLOAD',
+        ])
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+        key = ('AWS4' + self.secret_key).encode('utf-8')
+        for part in (amz_date[:8], self.region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['authorization'] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(signed_headers)}, Signature={signature}")
+    
+    def request(self, method, key='', query=None, headers=None, body=b'', expect=(200,)):
+        """Send a signed request, return the response with its body still to be read"""
+        path = '/' + urllib.parse.quote(f"{self.bucket}/{key}" if key else self.bucket, safe='/~')
+        query = query or {}
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        self.sign(method, path, query, headers)
+        url = path + ('?' + urllib.parse.urlencode(query, quote_via=urllib.parse.quote) if query else '')
+        for attempt in range(3):
+            conn = getattr(self.local, 'conn', None)
+            if conn is None:
+                connection_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+                conn = self.local.conn = connection_class(self.host, timeout=60)
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                # A dropped keep-alive connection, try again on a fresh one
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise StorageError(f"{method} {path} failed: {e}") from e
+        if response.status not in expect:
+            detail = response.read()[:500].decode('utf-8', errors='replace')
+            raise StorageError(f"{method} {path} failed with HTTP {response.status}: {detail}")
+        return response
+    
+    def put_part(self, key, upload_id, number, data):
+        response = self.request('PUT', key, {'partNumber': str(number), 'uploadId': upload_id}, body=data)
+        response.read()
+        return number, response.getheader('ETag')
+    
+    def put_stream(self, key, stream):
+        """Store an object read from a stream, return its size"""
+        data = read_full(stream, self.part_size)
+        if len(data) < self.part_size:
+            self.request('PUT', key, body=data).read()
+            return len(data)
+        
+        result = ET.fromstring(self.request('POST', key, {'uploads': ''}).read())
+        upload_id = result.findtext('{*}UploadId') or result.findtext('UploadId')
+        etags = {}
+        pending = set()
+        number = 0
+        size = 0
+        try:
+            # At most `concurrency` parts are in flight, bounding the memory used
+            while data:
+                number += 1
+                size += len(data)
+                pending.add(self.pool.submit(self.put_part, key, upload_id, number, data))
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    etags.update(future.result() for future in done)
+                data = read_full(stream, self.part_size)
+            etags.update(future.result() for future in pending)
+            parts = ''.join(f"<Part><PartNumber>{n}</PartNumber><ETag>{etags[n]}</ETag></Part>"
+                            for n in sorted(etags))
+            body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode('utf-8')
+            result = self.request('POST', key, {'uploadId': upload_id}, body=body).read()
+            # Completing can fail after the status line was sent as 200
+            if ET.fromstring(result).tag.endswith('Error'):
+                raise StorageError(f"Completing the upload of {key} failed: {result[:500]!r}")
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            try:
+                self.request('DELETE', key, {'uploadId': upload_id}, expect=(200, 204, 404)).read()
+            except StorageError:
+                pass
+            raise
+        return size
+    
+    def get_part(self, key, start, end):
+        response = self.request('GET', key, headers={'Range': f"bytes={start}-{end - 1}"}, expect=(200, 206))
+        data = response.read()
+        # Servers ignoring Range send the whole object
+        return data[start:end] if response.status == 200 else data
+    
+    def get_range(self, key, start=0, end=None):
+        """Yield the bytes of an object from `start` up to, not including, `end`"""
+        if end is None:
+            stat = self.stat(key)
+            if stat is None:
+                raise FileNotFoundError(key)
+            end = stat[0]
+        if end - start <= self.part_size:
+            if end > start:
+                response = self.request('GET', key, headers={'Range': f"bytes={start}-{end - 1}"},
+                                        expect=(200, 206))
+                if response.status == 200:
+                    yield response.read()[start:end]
+                    return
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            return
+        
+        # Fetch parts in parallel, keeping `concurrency` of them ahead of the reader
+        ranges = iter([(offset, min(offset + self.part_size, end))
+                       for offset in range(start, end, self.part_size)])
+        pending = deque(self.pool.submit(self.get_part, key, *r) for r in
+                        [r for _, r in zip(range(self.concurrency), ranges)])
+        try:
+            while pending:
+                data = pending.popleft().result()
+                following = next(ranges, None)
+                if following:
+                    pending.append(self.pool.submit(self.get_part, key, *following))
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def list_prefix(self, prefix=''):
+        """Yield (key, size, mtime) of the objects whose key starts with `prefix`"""
+        token = None
+        while True:
+            query = {'list-type': '2', 'prefix': prefix}
+            if token:
+                query['continuation-token'] = token
+            result = ET.fromstring(self.request('GET', query=query).read())
+            for item in result.iterfind('{*}Contents'):
+                modified = datetime.strptime(item.findtext('{*}LastModified')[:19], '%Y-%m-%dT%H:%M:%S')
+                yield (item.findtext('{*}Key'), int(item.findtext('{*}Size')),
+                       modified.replace(tzinfo=timezone.utc).timestamp())
+            token = result.findtext('{*}NextContinuationToken')
+            if result.findtext('{*}IsTruncated') != 'true' or not token:
+                break
+    
+    def delete(self, key):
+        self.request('DELETE', key, expect=(200, 204, 404)).read()
+    
+    def stat(self, key):
+        """Get (size, mtime) of an object, None if it does not exist"""
+        response = self.request('HEAD', key, expect=(200, 404))
+        response.read()
+        if response.status == 404:
+            return None
+        return (int(response.getheader('Content-Length')),
+                parsedate_to_datetime(response.getheader('Last-Modified')).timestamp())
+
+
+if STORAGE_BACKEND == 's3':
+    storage = S3Storage(S3_ENDPOINT, S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION)
+else:
+    storage = LocalStorage(STORAGE_ROOT)
+STORAGE_MIRRORED = not (isinstance(storage, LocalStorage)
+                        and os.path.abspath(storage.root) == os.path.abspath(UPLOAD_FOLDER))
+# Replication runs on one thread so changes reach the backend in order
+replication_executor = ThreadPoolExecutor(1)
+# Where each top level upload was last replicated from, to find the objects
+# to drop when it moves to another partition or is deleted
+replicated_locations = {}
+
+
+def storage_key(file_path):
+    """Key of a file under UPLOAD_FOLDER in the storage backend"""
+    return os.path.relpath(file_path, UPLOAD_FOLDER).replace(os.sep, '/')
+
+
+def replicate_item(name):
+    """Bring the objects of a top level upload in line with the working copy"""
+    location = item_location(name)
+    path = os.path.join(location, name) if location else None
+    if path and os.path.isdir(path):
+        files = [file_path for file_path, _ in folder_files(name) or []]
+    elif path and os.path.isfile(path):
+        files = [path]
+    else:
+        files = []
+    wanted = {storage_key(file_path): file_path for file_path in files}
+    
+    stored = {}
+    for prefix in {replicated_locations.get(name), location} - {None}:
+        item_key = storage_key(os.path.join(prefix, name))
+        for key, size, mtime in storage.list_prefix(item_key):
+            if key == item_key or key.startswith(item_key + '/'):
+                stored[key] = (size, mtime)
+    
+    for key, file_path in wanted.items():
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            continue
+        # Objects are written after the file, so a newer file is a changed one
+        if key not in stored or stored[key][0] != st.st_size or st.st_mtime > stored[key][1]:
+            with open(file_path, 'rb') as f:
+                storage.put_stream(key, f)
+    for key in stored.keys() - wanted.keys():
+        storage.delete(key)
+    
+    if files:
+        replicated_locations[name] = location
+    else:
+        replicated_locations.pop(name, None)
+
+
+def replicate_items(names):
+    failed = []
+    for name in names:
+        try:
+            replicate_item(name)
+        except OSError as e:
+            print(f"Could not replicate {name} to storage: {e}")
+            failed.append(name)
+    if failed:
+        raise StorageError(f"Could not replicate {', '.join(failed)}")
+
+
+def fetch_object(key, size, mtime):
+    """Copy an object from the storage backend into the working copy"""
+    target = os.path.join(UPLOAD_FOLDER, *key.split('/'))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    f, temp_path = create_temp(os.path.dirname(target))
+    try:
+        for chunk in storage.get_range(key, 0, size):
+            f.write(chunk)
+        sync_close(f)
+        os.utime(temp_path, (mtime, mtime))
+        commit_file(temp_path, target)
+    except BaseException:
+        f.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def sync_storage(push=True):
+    """Fetch objects missing from the working copy and, with `push`, replicate uploads missing from the backend"""
+    restored = set()
+    try:
+        for key, size, mtime in storage.list_prefix(''):
+            parts = key.split('/')
+            # Partitions may not exist locally yet, so tell them apart by the key alone
+            if STORAGE_LAYOUT == 'dated' and len(parts) > 3 and len(parts[0]) == 4 and parts[0].isdigit():
+                location, name = os.path.join(UPLOAD_FOLDER, *parts[:3]), parts[3]
+            else:
+                location, name = UPLOAD_FOLDER, parts[0]
+            replicated_locations[name] = location
+            file_path = os.path.join(UPLOAD_FOLDER, *parts)
+            if not os.path.exists(file_path):
+                fetch_object(key, size, mtime)
+                restored.add(name)
+    except OSError as e:
+        print(f"Could not sync with storage: {e}")
+        return
+    if restored:
+        print(f"Restored {len(restored)} item(s) from storage")
+        item_changed(*restored, announce=False)
+    
+    if push:
+        ensure_catalog()
+        with catalog_lock:
+            missing = [name for name in catalog if name not in replicated_locations]
+        replicate_items(missing)
+
+
+def pull_item(name, item_key):
+    """Make the working copy of a top level upload match its objects under `item_key`
+    
+    `item_key` is None for an upload that was deleted.
+    """
+    objects = {}
+    if item_key:
+        for key, size, mtime in storage.list_prefix(item_key):
+            if key == item_key or key.startswith(item_key + '/'):
+                objects[key] = (size, mtime)
+    target = os.path.join(UPLOAD_FOLDER, *item_key.split('/')) if objects else None
+    
+    location = item_location(name)
+    path = os.path.join(location, name) if location else None
+    if path and os.path.exists(path) and path != target:
+        # Deleted, or moved to another partition
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    elif path and os.path.isdir(path):
+        for root, dirs, files in os.walk(path, topdown=False):
+            for filename in files:
+                file_path = os.path.join(root, filename)
+                if not is_temp_name(filename) and storage_key(file_path) not in objects:
+                    os.remove(file_path)
+            if root != path and not os.listdir(root):
+                os.rmdir(root)
+    
+    for key, (size, mtime) in objects.items():
+        try:
+            st = os.stat(os.path.join(UPLOAD_FOLDER, *key.split('/')))
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_size != size or abs(st.st_mtime - mtime) >= 1:
+            fetch_object(key, size, mtime)
+    if objects:
+        replicated_locations[name] = os.path.dirname(target)
+    else:
+        replicated_locations.pop(name, None)
+
+
+# In cluster mode every change a node makes is appended to the change log
+# in CLUSTER_DB once its files are in storage. The log's sequence numbers
+# are the catalog versions every node reports, and each node follows the
+# log to apply the other nodes' changes to its working copy. Leases in the
+# same database let periodic jobs such as expiry run on a single node.
+cluster_version = 0
+cluster_ready = False
+cluster_lock = threading.Lock()
+# Top level uploads being pulled from other nodes, which the catalog
+# watcher must not announce again as this node's changes
+remote_changes = set()
+# Uploads expire hourly; a node that stops renewing loses the lease after this
+EXPIRY_LEASE = 2 * 3600
+# How long the change log is kept, nodes down for longer resync from storage
+CHANGE_LOG_DAYS = 7
+
+
+def cluster_db():
+    """Open a connection to the shared cluster database, creating the schema if needed"""
+    # The default rollback journal, as WAL does not work over network filesystems
+    conn = sqlite3.connect(CLUSTER_DB, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            node TEXT NOT NULL,
+            items TEXT NOT NULL,
+            time REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS nodes (
+            node TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            seen REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+def publish_change(names):
+    """Log a change of top level uploads made on this node for the other nodes"""
+    items = {}
+    for name in names:
+        location = item_location(name)
+        path = os.path.join(location, name) if location else None
+        items[name] = storage_key(path) if path and os.path.exists(path) else None
+    try:
+        conn = cluster_db()
+        with conn:
+            conn.execute('INSERT INTO changes(node, items, time) VALUES (?, ?, ?)',
+                         (NODE_ID, json.dumps(items), time.time()))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not publish the change of {', '.join(names)}: {e}")
+        return
+    follow_cluster()
+
+
+def follow_cluster():
+    """Apply the changes other nodes logged since this node last looked"""
+    global cluster_version
+    if not cluster_ready:
+        return
+    with cluster_lock:
+        try:
+            conn = cluster_db()
+            rows = conn.execute('SELECT version, node, items FROM changes WHERE version > ? ORDER BY version',
+                                (cluster_version,)).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Could not read the cluster change log: {e}")
+            return
+        if not rows:
+            return
+        
+        remote = {}
+        for version, node, items in rows:
+            if node != NODE_ID:
+                remote.update(json.loads(items))
+        if remote:
+            remote_changes.update(remote)
+            try:
+                if STORAGE_MIRRORED:
+                    for name, item_key in remote.items():
+                        try:
+                            pull_item(name, item_key)
+                        except OSError as e:
+                            print(f"Could not pull {name} from storage: {e}")
+                item_changed(*remote, announce=False)
+            finally:
+                remote_changes.difference_update(remote)
+        cluster_version = rows[-1][0]
+        report_node()
+
+
+def report_node():
+    """Record how far this node has applied the change log"""
+    try:
+        conn = cluster_db()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO nodes(node, version, seen) VALUES (?, ?, ?)',
+                         (NODE_ID, cluster_version, time.time()))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not report to the cluster: {e}")
+
+
+def hold_lease(name, ttl):
+    """Take or renew a cluster-wide lease, return True if this node holds it"""
+    if not CLUSTER_DB:
+        return True
+    now = time.time()
+    try:
+        conn = cluster_db()
+        with conn:
+            conn.execute('INSERT INTO leases(name, holder, expires) VALUES (?, ?, ?) '
+                         'ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires '
+                         'WHERE leases.holder = excluded.holder OR leases.expires < ?',
+                         (name, NODE_ID, now + ttl, now))
+            holder = conn.execute('SELECT holder FROM leases WHERE name = ?', (name,)).fetchone()[0]
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not take the {name} lease: {e}")
+        return False
+    return holder == NODE_ID
+
+
+def prune_change_log():
+    try:
+        conn = cluster_db()
+        with conn:
+            conn.execute('DELETE FROM changes WHERE time < ? AND version < (SELECT MAX(version) FROM changes)',
+                         (time.time() - CHANGE_LOG_DAYS * 86400,))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not prune the cluster change log: {e}")
+
+
+def cluster_follower():
+    """Join the cluster and keep applying the other nodes' changes"""
+    global cluster_version, cluster_ready
+    conn = cluster_db()
+    row = conn.execute('SELECT version FROM nodes WHERE node = ?', (NODE_ID,)).fetchone()
+    latest = conn.execute('SELECT COALESCE(MAX(version), 0) FROM changes').fetchone()[0]
+    oldest = conn.execute('SELECT COALESCE(MIN(version), 0) FROM changes').fetchone()[0]
+    conn.close()
+    # A returning node replays what it missed, a new one starts from storage
+    start = row[0] if row and row[0] >= oldest - 1 else latest
+    if STORAGE_MIRRORED:
+        # Local uploads the cluster doesn't know of are not pushed, they may have been deleted meanwhile
+        replication_executor.submit(sync_storage, False).result()
+    with cluster_lock:
+        cluster_version = start
+        cluster_ready = True
+    
+    reported = 0
+    while True:
+        follow_cluster()
+        if time.time() - reported > 30:
+            report_node()
+            reported = time.time()
+        time.sleep(CLUSTER_POLL_INTERVAL)
+
+
+def current_version():
+    """Catalog version as clients see it, the cluster-wide one in cluster mode"""
+    return cluster_version if CLUSTER_DB else catalog_version
 
 
 def get_folder_hash():
     """Generate a hash of the current folder structure"""
-    folders_by_date = get_files_by_date()
-    content = json.dumps(folders_by_date, sort_keys=True)
+    ensure_catalog()
+    if CLUSTER_DB:
+        follow_cluster()
+    # The date is part of the hash so clients re-render when labels roll over
+    content = f"{current_version()}:{datetime.now().date()}"
     return hashlib.md5(content.encode()).hexdigest()
 
 
@@ -28,78 +1179,789 @@ def delete_old_files():
     if not os.path.exists(UPLOAD_FOLDER):
         return
     
+    if STORAGE_LAYOUT == 'dated':
+        # Whole day partitions expire at once
+        for partition_date, partition in list_partitions():
+            if partition_date < one_month_ago.replace(hour=0, minute=0, second=0, microsecond=0):
+                expired = os.listdir(partition)
+                shutil.rmtree(partition)
+                for item in expired:
+                    item_changed(item)
+                print(f"Deleted old partition: {partition}")
+        for year in os.listdir(UPLOAD_FOLDER):
+            if not is_partition_year(year):
+                continue
+            year_path = os.path.join(UPLOAD_FOLDER, year)
+            for month in os.listdir(year_path):
+                month_path = os.path.join(year_path, month)
+                if os.path.isdir(month_path) and not os.listdir(month_path):
+                    os.rmdir(month_path)
+            if not os.listdir(year_path):
+                os.rmdir(year_path)
+    
     for item in os.listdir(UPLOAD_FOLDER):
         item_path = os.path.join(UPLOAD_FOLDER, item)
         
+        if STORAGE_LAYOUT == 'dated' and is_partition_year(item):
+            continue
+        
         if os.path.isfile(item_path):
             file_time = datetime.fromtimestamp(os.path.getctime(item_path))
             if file_time < one_month_ago:
                 os.remove(item_path)
+                item_changed(item)
                 print(f"Deleted old file: {item}")
         elif os.path.isdir(item_path):
             folder_time = datetime.fromtimestamp(os.path.getctime(item_path))
             if folder_time < one_month_ago:
-                import shutil
                 shutil.rmtree(item_path)
+                item_changed(item)
                 print(f"Deleted old folder: {item}")
 
 
 def auto_delete_scheduler():
-    """Run delete_old_files every hour"""
+    """Run delete_old_files every hour, on one node of a cluster"""
     while True:
-        delete_old_files()
+        if hold_lease('expiry', EXPIRY_LEASE):
+            delete_old_files()
+            if CLUSTER_DB:
+                prune_change_log()
         time.sleep(3600)
 
 
-delete_thread = threading.Thread(target=auto_delete_scheduler, daemon=True)
-delete_thread.start()
-
-
-def get_date_label(file_date):
-    """Get date label for a file (Today, Yesterday, or specific date)"""
-    today = datetime.now().date()
-    file_date_only = file_date.date()
-    
-    if file_date_only == today:
+def day_label(day):
+    """Get the label of a day given as a date ordinal (Today, Yesterday, or specific date)"""
+    today = datetime.now().toordinal()
+    if day == today:
         return "Today"
-    elif file_date_only == today - timedelta(days=1):
+    elif day == today - 1:
         return "Yesterday"
     else:
-        return file_date_only.strftime("%B %d, %Y")
+        return datetime.fromordinal(day).strftime("%B %d, %Y")
 
 
-def get_files_by_date():
-    """Organize files by date groups"""
-    date_groups = {}
-    
-    if not os.path.exists(UPLOAD_FOLDER):
-        return date_groups
-    
-    for item in os.listdir(UPLOAD_FOLDER):
-        item_path = os.path.join(UPLOAD_FOLDER, item)
+# In-memory catalog of the top level uploads, kept up to date by the upload
+# and delete routes and by the filesystem watcher for files copied into
+# UPLOAD_FOLDER from outside the app. Folder entries carry a manifest of
+# their files ({path: (size, mtime)}) with the total size and newest mtime,
+# which is also saved in MANIFEST_FOLDER so a restart doesn't walk them again.
+# A saved manifest holds the mtime of every directory of its folder and is
+# only trusted while none of them has changed; the directory mtimes of the
+# saved manifests are also kept in manifest_dirs, so polling the upload
+# folder only has to stat directories. The watcher updates them for the
+# directories its events name and saves the manifests of folders it changed
+# at most every MANIFEST_SAVE_DELAY seconds, tracked in unsaved_manifests.
+MANIFEST_SAVE_DELAY = 30
+catalog = {}
+catalog_version = 0
+catalog_loaded = False
+catalog_lock = threading.RLock()
+manifest_dirs = {}
+unsaved_manifests = {}
+# Set once the watcher's first scan and search index sync are done
+catalog_synced = threading.Event()
+
+
+def partition_date_of(location):
+    """Get the date of a day partition directory, or None for UPLOAD_FOLDER itself"""
+    if location == UPLOAD_FOLDER:
+        return None
+    try:
+        return datetime.strptime(os.path.relpath(location, UPLOAD_FOLDER), PARTITION_FORMAT)
+    except ValueError:
+        return None
+
+
+def manifest_path(name):
+    return os.path.join(MANIFEST_FOLDER, hashlib.md5(name.encode()).hexdigest() + '.json')
+
+
+def manifest_file(path):
+    """Get the (size, mtime) manifest record of a file inside an uploaded folder"""
+    mtime = os.stat(path).st_mtime
+    return stored_encoding(path)[1], mtime
+
+
+def walk_folder(path, on_dir=None, dirs=None):
+    """Build the manifest of an uploaded folder from disk
+    
+    The mtime of every directory is put in `dirs` before it is listed, so
+    anything added while walking shows up as a change later.
+    """
+    files = {}
+    pending = [path]
+    while pending:
+        root = pending.pop()
+        if on_dir:
+            on_dir(root)
+        try:
+            if dirs is not None:
+                dirs[os.path.relpath(root, path)] = os.stat(root).st_mtime_ns
+            with os.scandir(root) as it:
+                listing = list(it)
+        except OSError:
+            continue
+        for item in listing:
+            if item.is_dir(follow_symlinks=False):
+                pending.append(item.path)
+                continue
+            if is_temp_name(item.name):
+                continue
+            try:
+                files[os.path.relpath(item.path, path)] = manifest_file(item.path)
+            except OSError:
+                continue
+    return files
+
+
+def folder_dirs(path):
+    """Get {directory inside the folder: mtime_ns} for an uploaded folder"""
+    dirs = {}
+    for root, subdirs, filenames in os.walk(path):
+        try:
+            dirs[os.path.relpath(root, path)] = os.stat(root).st_mtime_ns
+        except OSError:
+            continue
+    return dirs
+
+
+def dirs_unchanged(path, dirs):
+    """Check that no directory of a folder was modified since `dirs` was taken"""
+    try:
+        return all(os.stat(os.path.join(path, rel_dir)).st_mtime_ns == mtime
+                   for rel_dir, mtime in dirs.items())
+    except OSError:
+        return False
+
+
+def folder_entry(date, location, files):
+    """Make a catalog entry for a folder from its manifest"""
+    return {'kind': 'folder', 'date': date, 'location': location, 'files': files,
+            'size': sum(size for size, _ in files.values()),
+            'mtime': max((mtime for _, mtime in files.values()), default=0)}
+
+
+def load_manifest(name, path):
+    """Read the saved manifest of a folder, None if missing or out of date"""
+    try:
+        with open(manifest_path(name)) as f:
+            data = json.load(f)
+        if data['name'] != name or not dirs_unchanged(path, data['dirs']):
+            return None
+        manifest_dirs[name] = data['dirs']
+        return {rel_path: tuple(record) for rel_path, record in data['files'].items()}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_manifest(name, entry, dirs=None):
+    """Save the manifest of a folder entry with the mtimes of its directories
+    
+    Pass `dirs` as filled in by walk_folder() when the entry was just
+    walked; otherwise they are read now.
+    """
+    if dirs is None:
+        dirs = folder_dirs(os.path.join(entry['location'], name))
+    if write_manifest(name, entry, dirs):
+        manifest_dirs[name] = dirs
+        unsaved_manifests.pop(name, None)
+
+
+def write_manifest(name, entry, dirs):
+    """Write the manifest file of a folder entry, return whether it was written"""
+    try:
+        data = {
+            'name': name,
+            'dirs': dirs,
+            'count': len(entry['files']),
+            'size': entry['size'],
+            'mtime': entry['mtime'],
+            'files': entry['files'],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=MANIFEST_FOLDER, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, manifest_path(name))
+        return True
+    except (OSError, RuntimeError) as e:
+        print(f"Could not save the manifest of {name}: {e}")
+        return False
+
+
+def flush_manifests(force=False):
+    """Save the manifests the watcher changed over MANIFEST_SAVE_DELAY seconds ago"""
+    now = time.time()
+    with catalog_lock:
+        due = [name for name, since in unsaved_manifests.items()
+               if force or now - since >= MANIFEST_SAVE_DELAY]
+        pending = {}
+        for name in due:
+            del unsaved_manifests[name]
+            entry = catalog.get(name)
+            if entry and entry['kind'] == 'folder' and name in manifest_dirs:
+                pending[name] = (dict(entry, files=dict(entry['files'])), dict(manifest_dirs[name]))
+    for name, (entry, dirs) in pending.items():
+        write_manifest(name, entry, dirs)
+
+
+def update_folder_dirs(name, path, changed_dirs):
+    """Bring the directory mtimes of a watched folder up to date for the directories named in events"""
+    dirs = manifest_dirs.get(name)
+    if dirs is None:
+        manifest_dirs[name] = folder_dirs(path)
+        return
+    dirs = dict(dirs)
+    for rel_dir in changed_dirs:
+        try:
+            dirs[rel_dir] = os.stat(os.path.join(path, rel_dir)).st_mtime_ns
+        except OSError:
+            prefix = rel_dir + os.sep
+            for gone in [d for d in dirs if d == rel_dir or d.startswith(prefix)]:
+                del dirs[gone]
+    manifest_dirs[name] = dirs
+
+
+def remove_manifest(name):
+    manifest_dirs.pop(name, None)
+    unsaved_manifests.pop(name, None)
+    try:
+        os.remove(manifest_path(name))
+    except OSError:
+        pass
+
+
+def scan_item(name, location, on_dir=None, use_manifest=False):
+    """Read one top level upload from disk into a catalog entry
+    
+    With use_manifest a folder's saved manifest is trusted if none of its
+    directories has been modified since, instead of walking the folder, and
+    the current catalog entry of a file or folder is kept if it is unchanged.
+    """
+    if is_temp_name(name):
+        return None
+    path = os.path.join(location, name)
+    previous = catalog.get(name) if use_manifest else None
+    if previous and previous['location'] != location:
+        previous = None
+    try:
+        st = os.stat(path)
+        date = partition_date_of(location) or datetime.fromtimestamp(st.st_ctime)
+        if not os.path.isdir(path):
+            if (previous and previous['kind'] == 'file' and previous['date'] == date
+                    and (previous['stored_size'], previous['mtime']) == (st.st_size, st.st_mtime)):
+                return previous
+            # Files only ever appear complete, so their sizes can be read once here
+            encoding, size = stored_encoding(path)
+            return {'kind': 'file', 'date': date, 'location': location, 'encoding': encoding,
+                    'size': size, 'stored_size': st.st_size, 'mtime': st.st_mtime}
+    except OSError:
+        return None
+    
+    files = None
+    if previous and previous['kind'] == 'folder' and name in manifest_dirs:
+        if dirs_unchanged(path, manifest_dirs[name]):
+            files = previous['files']
+    if files is None and use_manifest:
+        files = load_manifest(name, path)
+    if files is not None:
+        if on_dir:
+            for root, dirs, filenames in os.walk(path):
+                on_dir(root)
+        return folder_entry(date, location, files)
+    
+    dirs = {}
+    entry = folder_entry(date, location, walk_folder(path, on_dir, dirs))
+    previous = catalog.get(name)
+    # An out of date manifest is saved again even if the files are the same
+    if use_manifest or previous is None or previous.get('files') != entry['files']:
+        save_manifest(name, entry, dirs)
+    return entry
+
+
+def rescan_catalog(on_dir=None, use_manifests=False):
+    """Rebuild the catalog from a full walk of the upload folder, return the names that changed"""
+    global catalog, catalog_version, catalog_loaded
+    
+    entries = {}
+    if os.path.exists(UPLOAD_FOLDER):
+        if on_dir:
+            on_dir(UPLOAD_FOLDER)
+        sources = [UPLOAD_FOLDER]
+        if STORAGE_LAYOUT == 'dated':
+            for year in os.listdir(UPLOAD_FOLDER):
+                if on_dir and is_partition_year(year):
+                    # Watch the year, month and day directories but not the uploads in them
+                    for root, dirs, files in os.walk(os.path.join(UPLOAD_FOLDER, year)):
+                        on_dir(root)
+                        if partition_date_of(root):
+                            dirs[:] = []
+            sources += [partition for _, partition in list_partitions()]
         
-        creation_time = datetime.fromtimestamp(os.path.getctime(item_path))
-        date_label = get_date_label(creation_time)
+        for directory in sources:
+            for item in os.listdir(directory):
+                if directory == UPLOAD_FOLDER and STORAGE_LAYOUT == 'dated' and is_partition_year(item):
+                    continue
+                entry = scan_item(item, directory, on_dir, use_manifests)
+                if entry:
+                    entries[item] = entry
+    
+    with catalog_lock:
+        changed = {name for name in entries.keys() | catalog.keys() if entries.get(name) != catalog.get(name)}
+        for name in catalog.keys() - entries.keys():
+            remove_manifest(name)
+        catalog = entries
+        if changed or not catalog_loaded:
+            catalog_version += 1
+        catalog_loaded = True
+    return changed
+
+
+def ensure_catalog():
+    if not catalog_loaded:
+        with catalog_lock:
+            if not catalog_loaded:
+                rescan_catalog(use_manifests=True)
+
+
+def refresh_catalog_items(names):
+    """Re-read the given top level uploads from disk, return the names that changed"""
+    global catalog_version
+    
+    ensure_catalog()
+    entries = {}
+    for name in names:
+        location = item_location(name)
+        entries[name] = scan_item(name, location) if location else None
+    
+    changed = set()
+    with catalog_lock:
+        for name, entry in entries.items():
+            if entry != catalog.get(name):
+                changed.add(name)
+                if entry:
+                    catalog[name] = entry
+                else:
+                    catalog.pop(name, None)
+                    remove_manifest(name)
+        if changed:
+            catalog_version += 1
+    return changed
+
+
+def item_changed(*names, announce=True):
+    """Bring the catalog up to date after uploads changed and queue the rest as jobs
+    
+    The search index, thumbnails and the storage backend are updated in the
+    background. Changes made on this node are announced to the cluster,
+    those pulled from other nodes are applied with announce=False.
+    """
+    names = {name.replace('\\', '/').split('/')[0] for name in names}
+    refresh_catalog_items(names)
+    forget_folder_indexes(names)
+    queue_item_jobs(names, announce)
+
+
+def queue_item_jobs(names, announce=True):
+    """Queue the background work for top level uploads whose catalog entries changed"""
+    if not names:
+        return
+    forget_checksums(*[name for name in names if not item_exists(name)])
+    kinds = ['index']
+    if any(thumbnail_supported(name) for name in names):
+        kinds.append('thumbnail')
+    if announce and (STORAGE_MIRRORED or CLUSTER_DB):
+        kinds.append('replicate')
+    queue_jobs(names, *kinds)
+
+
+def folder_summary(entry):
+    """Snapshot of a folder entry for the listing"""
+    return {'count': len(entry['files']), 'size': entry['size'], 'mtime': entry['mtime']}
+
+
+def folder_files(path):
+    """List (path on disk, path inside the folder) of the files of an uploaded folder or a directory in it"""
+    name, _, inner = path.replace('\\', '/').strip('/').partition('/')
+    ensure_catalog()
+    with catalog_lock:
+        entry = catalog.get(name)
+        if entry is None or entry['kind'] != 'folder':
+            return None
+        base = os.path.join(entry['location'], name)
+        files = sorted(entry['files'])
+    
+    prefix = inner.replace('/', os.sep) + os.sep if inner else ''
+    return [(os.path.join(base, rel_path), rel_path[len(prefix):])
+            for rel_path in files if rel_path.startswith(prefix)]
+
+
+# Folder contents are browsed one directory level at a time. The levels of
+# a folder are indexed from its catalog entry when it is first browsed and
+# the index is kept until the catalog changes; each level is sorted the
+# first time it is asked for. Only the indexes of the most recently browsed
+# folders are kept, and a folder's index is dropped as soon as it changes.
+FOLDER_PAGE_SIZE = 1000
+MAX_FOLDER_PAGE_SIZE = 5000
+FOLDER_INDEX_CACHE_SIZE = 32
+folder_indexes = {}
+
+
+def forget_folder_indexes(names):
+    with catalog_lock:
+        for name in names:
+            folder_indexes.pop(name, None)
+
+
+def build_folder_index(files):
+    """Index a folder's files by directory: {dir: {'dirs': {name: [files, size]}, 'files': [(name, size)]}}"""
+    index = {'': {'dirs': {}, 'files': []}}
+    for rel_path, (size, _) in files.items():
+        parts = rel_path.split(os.sep)
+        directory = ''
+        for part in parts[:-1]:
+            totals = index[directory]['dirs'].setdefault(part, [0, 0])
+            totals[0] += 1
+            totals[1] += size
+            directory = f"{directory}/{part}" if directory else part
+            if directory not in index:
+                index[directory] = {'dirs': {}, 'files': []}
+        index[directory]['files'].append((parts[-1], size))
+    return index
+
+
+def folder_level(path):
+    """List one directory level of an uploaded folder, subdirectories first
+    
+    Returns the entries as dicts for the JSON answer, or None when the
+    folder or the directory does not exist.
+    """
+    name, _, inner = path.replace('\\', '/').strip('/').partition('/')
+    ensure_catalog()
+    with catalog_lock:
+        entry = catalog.get(name)
+        if entry is None or entry['kind'] != 'folder':
+            return None
+        cached = folder_indexes.pop(name, None)
+        if cached is None or cached[0] != catalog_version:
+            cached = (catalog_version, build_folder_index(entry['files']))
+        folder_indexes[name] = cached
+        while len(folder_indexes) > FOLDER_INDEX_CACHE_SIZE:
+            del folder_indexes[next(iter(folder_indexes))]
+        level = cached[1].get(inner.strip('/'))
+    
+    if level is None:
+        return None
+    if 'entries' not in level:
+        level['entries'] = (
+            [{'name': d, 'kind': 'dir', 'files': files, 'size': size}
+             for d, (files, size) in sorted(level['dirs'].items())]
+            + [{'name': f, 'kind': 'file', 'size': size} for f, size in sorted(level['files'])])
+    return level['entries']
+
+
+# Top level uploads grouped into day buckets keyed by date ordinal, rebuilt
+# only when the catalog changes. Days get their labels when they are shown,
+# so nothing has to be redone when the date rolls over at midnight.
+_day_buckets = (None, [])
+
+
+def get_files_by_date():
+    """Organize files by date groups: [(day ordinal, {'folders': ..., 'files': ...})], newest first"""
+    global _day_buckets
+    
+    ensure_catalog()
+    with catalog_lock:
+        version, date_groups = _day_buckets
+        if version == catalog_version:
+            return date_groups
         
-        if date_label not in date_groups:
-            date_groups[date_label] = {'folders': {}, 'files': []}
+        days = {}
+        for item in sorted(catalog):
+            entry = catalog[item]
+            day = entry['date'].toordinal()
+            
+            if day not in days:
+                days[day] = {'folders': {}, 'files': []}
+            
+            if entry['kind'] == 'folder':
+                days[day]['folders'][item] = folder_summary(entry)
+            else:
+                days[day]['files'].append(item)
         
-        if os.path.isdir(item_path):
-            folder_files = []
-            for root, dirs, files in os.walk(item_path):
-                for filename in files:
-                    rel_path = os.path.relpath(os.path.join(root, filename), item_path)
-                    folder_files.append(rel_path)
-            date_groups[date_label]['folders'][item] = sorted(folder_files)
-        else:
-            date_groups[date_label]['files'].append(item)
-    
-    for date_label in date_groups:
-        date_groups[date_label]['files'].sort()
-    
+        date_groups = sorted(days.items(), reverse=True)
+        _day_buckets = (catalog_version, date_groups)
     return date_groups
 
 
+# Filesystem watcher. inotify is used through libc on Linux; elsewhere, or
+# when inotify cannot be set up, the catalog is rescanned periodically.
+CATALOG_WATCHER = os.environ.get('CATALOG_WATCHER', 'auto')  # auto, inotify, poll or off
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', 10))
+# Events are collected until the folder has been quiet this long (or for
+# at most WATCHER_MAX_DELAY) and then applied as one catalog update
+WATCHER_QUIET_PERIOD = 0.25
+WATCHER_MAX_DELAY = 2.0
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+
+class InotifyWatcher:
+    """Recursive inotify watch on the upload folder"""
+    
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.paths = {}
+        self.ctypes = ctypes
+    
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(self.ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.paths[wd] = path
+    
+    def read_events(self, timeout):
+        """Read pending events as (path, mask) pairs, waiting up to timeout seconds"""
+        import select
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 256 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+            offset += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            directory = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+            if directory is not None:
+                events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events
+    
+    def reset(self):
+        for wd in list(self.paths):
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.paths.clear()
+
+
+def split_upload_path(path):
+    """Split a path under UPLOAD_FOLDER into (location, top level name, path inside the item)
+
+    Returns (location, None, None) for the dated layout's partition
+    directories and (None, None, None) for the upload folder itself.
+    """
+    parts = os.path.relpath(path, UPLOAD_FOLDER).split(os.sep)
+    if parts == ['.']:
+        return None, None, None
+    if STORAGE_LAYOUT == 'dated' and is_partition_year(parts[0]):
+        if len(parts) <= 3:
+            return os.path.join(UPLOAD_FOLDER, *parts), None, None
+        return os.path.join(UPLOAD_FOLDER, *parts[:3]), parts[3], os.sep.join(parts[4:])
+    return UPLOAD_FOLDER, parts[0], os.sep.join(parts[1:])
+
+
+def apply_watch_events(watcher, events):
+    """Apply a batch of filesystem events to the catalog, return True on overflow"""
+    global catalog_version
+    
+    dirty = set()
+    touched = set()
+    changed = set()
+    changed_dirs = {}
+    with catalog_lock:
+        for path, mask in events:
+            if path is None:
+                return True
+            if is_temp_name(os.path.basename(path)):
+                continue
+            location, name, inner = split_upload_path(path)
+            if name and is_temp_name(name):
+                # Staging directories of upload sessions
+                continue
+            is_dir = mask & IN_ISDIR
+            created = mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE)
+            
+            entry = catalog.get(name)
+            if (name and not inner and not is_dir and entry is not None and entry['kind'] == 'file'
+                    and not mask & (IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM)
+                    and scan_item(name, location) == entry):
+                # Written in place and already up to date, like text appends
+                continue
+            
+            if name is None:
+                # New day partition (or year/month directory) in the dated layout
+                if location and created and is_dir:
+                    for root, dirs, files in os.walk(path):
+                        watcher.add_watch(root)
+                        if partition_date_of(root):
+                            dirty.update(dirs + files)
+                elif location and mask & (IN_DELETE | IN_MOVED_FROM):
+                    gone = [n for n, e in catalog.items()
+                            if e['location'] == path or e['location'].startswith(path + os.sep)]
+                    for n in gone:
+                        del catalog[n]
+                        remove_manifest(n)
+                    changed.update(gone)
+                continue
+            
+            if not inner or entry is None or entry['kind'] != 'folder':
+                # Top level item appeared, disappeared or was replaced
+                dirty.add(name)
+                if created and is_dir:
+                    for root, dirs, files in os.walk(path):
+                        watcher.add_watch(root)
+                continue
+            
+            touched.add(name)
+            files = entry['files']
+            folder_path = os.path.join(location, name)
+            names_dirs = changed_dirs.setdefault(name, set())
+            names_dirs.add(os.path.dirname(inner) or '.')
+            if is_dir:
+                names_dirs.add(inner)
+            if created and is_dir:
+                # Files may have landed before the watch was added
+                for root, dirs, filenames in os.walk(path):
+                    watcher.add_watch(root)
+                    names_dirs.add(os.path.relpath(root, folder_path))
+                    for filename in filenames:
+                        if is_temp_name(filename):
+                            continue
+                        file_path = os.path.join(root, filename)
+                        rel_path = os.path.relpath(file_path, folder_path)
+                        try:
+                            record = manifest_file(file_path)
+                        except OSError:
+                            continue
+                        if files.get(rel_path) != record:
+                            files[rel_path] = record
+                            changed.add(name)
+            elif created or mask & IN_MODIFY:
+                try:
+                    record = manifest_file(path) if os.path.isfile(path) else None
+                except OSError:
+                    record = None
+                if record and files.get(inner) != record:
+                    files[inner] = record
+                    changed.add(name)
+            elif is_dir and mask & (IN_DELETE | IN_MOVED_FROM):
+                prefix = inner + os.sep
+                gone = [f for f in files if f.startswith(prefix)]
+                for rel_path in gone:
+                    del files[rel_path]
+                if gone:
+                    changed.add(name)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                if inner in files:
+                    del files[inner]
+                    changed.add(name)
+        
+        # Adding or removing entries updates a folder's ctime in the flat layout
+        for name in touched - dirty:
+            entry = catalog.get(name)
+            if entry:
+                entry.update(folder_entry(entry['date'], entry['location'], entry['files']))
+                update_folder_dirs(name, os.path.join(entry['location'], name), changed_dirs[name])
+                unsaved_manifests.setdefault(name, time.time())
+            if entry and entry['location'] == UPLOAD_FOLDER:
+                try:
+                    date = datetime.fromtimestamp(os.stat(os.path.join(UPLOAD_FOLDER, name)).st_ctime)
+                except OSError:
+                    dirty.add(name)
+                    continue
+                if date != entry['date']:
+                    entry['date'] = date
+                    changed.add(name)
+        
+        if changed:
+            catalog_version += 1
+    
+    flush_manifests()
+    if dirty:
+        changed |= refresh_catalog_items(dirty)
+    announce_watched(changed)
+    return False
+
+
+def announce_watched(names):
+    """Queue the jobs for uploads changed outside the app, as item_changed() does for the app's own"""
+    forget_folder_indexes(names)
+    # Files pulled from other nodes are already known to the cluster
+    pulled = names & remote_changes
+    queue_item_jobs(names - pulled)
+    queue_item_jobs(pulled, announce=False)
+
+
+def inotify_loop(watcher):
+    rescan_catalog(on_dir=watcher.add_watch, use_manifests=True)
+    sync_search_index()
+    catalog_synced.set()
+    while True:
+        events = watcher.read_events(MANIFEST_SAVE_DELAY if unsaved_manifests else None)
+        if not events:
+            flush_manifests()
+            continue
+        # Coalesce bursts such as bulk copies into a single update
+        started = time.time()
+        while time.time() - started < WATCHER_MAX_DELAY:
+            more = watcher.read_events(WATCHER_QUIET_PERIOD)
+            if not more:
+                break
+            events += more
+        try:
+            overflow = apply_watch_events(watcher, events)
+        except OSError as e:
+            print(f"Catalog watcher error, rescanning: {e}")
+            overflow = True
+        if overflow:
+            watcher.reset()
+            announce_watched(rescan_catalog(on_dir=watcher.add_watch))
+
+
+def poll_loop():
+    """Rescan the upload folder now and then, walking only folders whose directories changed"""
+    while True:
+        time.sleep(CATALOG_POLL_INTERVAL)
+        announce_watched(rescan_catalog(use_manifests=True))
+
+
+def catalog_watcher():
+    """Keep the catalog in sync with changes made outside the app"""
+    if CATALOG_WATCHER in ('auto', 'inotify') and sys.platform.startswith('linux'):
+        try:
+            inotify_loop(InotifyWatcher())
+        except OSError as e:
+            print(f"inotify unavailable ({e}), polling the upload folder instead")
+    
+    rescan_catalog(use_manifests=True)
+    sync_search_index()
+    catalog_synced.set()
+    if CATALOG_WATCHER != 'off':
+        poll_loop()
+
+
 def format_file_size(size_bytes):
     """Convert bytes to human readable format"""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -110,1079 +1972,2498 @@ def format_file_size(size_bytes):
 
 
 def get_file_size(filename):
-    """Get file size"""
-    try:
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        return format_file_size(os.path.getsize(file_path))
-    except:
+    """Get file size, with the size on disk for uploads compressed at rest"""
+    with catalog_lock:
+        entry = catalog.get(filename)
+    if entry is None or entry['kind'] != 'file':
         return "Unknown"
+    if entry['encoding']:
+        return f"{format_file_size(entry['size'])} ({format_file_size(entry['stored_size'])} stored)"
+    return format_file_size(entry['size'])
 
 
-HTML = '''<!doctype html>
-<html><head>
-  <title>Southern IoT - File Sharing Platform</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap" rel="stylesheet">
-  <style>
-    * {
-      margin: 0;
-      padding: 0;
-      box-sizing: border-box;
-    }
-    
-    :root {
-      --primary: #667eea;
-      --primary-dark: #5568d3;
-      --secondary: #764ba2;
-      --success: #10b981;
-      --danger: #ef4444;
-      --warning: #f59e0b;
-      --info: #3b82f6;
-      --text-dark: #1f2937;
-      --text-light: #6b7280;
-      --glass-bg: rgba(255, 255, 255, 0.85);
-      --glass-border: rgba(255, 255, 255, 0.3);
-      --shadow-sm: 0 1px 3px rgba(0,0,0,0.08);
-      --shadow-md: 0 4px 12px rgba(0,0,0,0.1);
-      --shadow-lg: 0 10px 30px rgba(0,0,0,0.12);
-      --shadow-xl: 0 20px 50px rgba(0,0,0,0.15);
-    }
-    
-    body {
-      font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      background-attachment: fixed;
-      min-height: 100vh;
-      padding: 20px;
-      color: var(--text-dark);
-      position: relative;
-      overflow-x: hidden;
-    }
-    
-    /* Animated background particles */
-    .bg-particles {
-      position: fixed;
-      top: 0;
-      left: 0;
-      width: 100%;
-      height: 100%;
-      pointer-events: none;
-      z-index: 0;
-    }
-    
-    .particle {
-      position: absolute;
-      background: rgba(255, 255, 255, 0.3);
-      border-radius: 50%;
-      animation: float 20s infinite ease-in-out;
-    }
-    
-    @keyframes float {
-      0%, 100% { transform: translateY(0) translateX(0); }
-      25% { transform: translateY(-100px) translateX(50px); }
-      50% { transform: translateY(-200px) translateX(-50px); }
-      75% { transform: translateY(-100px) translateX(100px); }
-    }
-    
-    .container {
-      max-width: 1000px;
-      margin: 0 auto;
-      position: relative;
-      z-index: 1;
-    }
-    
-    /* Glassmorphism styles */
-    .glass {
-      background: var(--glass-bg);
-      backdrop-filter: blur(20px);
-      -webkit-backdrop-filter: blur(20px);
-      border: 1px solid var(--glass-border);
-      box-shadow: var(--shadow-xl);
-    }
-    
-    .glass-light {
-      background: rgba(255, 255, 255, 0.95);
-      backdrop-filter: blur(10px);
-      -webkit-backdrop-filter: blur(10px);
-    }
-    
-    header {
-      text-align: center;
-      margin-bottom: 40px;
-      animation: fadeInDown 0.8s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .logo-container {
-      position: relative;
-      display: inline-block;
-      margin-bottom: 20px;
-    }
-    
-    header img {
-      height: 110px;
-      max-width: 90%;
-      filter: drop-shadow(0 8px 16px rgba(0,0,0,0.2));
-      animation: logoFloat 3s ease-in-out infinite;
-    }
-    
-    @keyframes logoFloat {
-      0%, 100% { transform: translateY(0); }
-      50% { transform: translateY(-10px); }
-    }
-    
-    .header-title {
-      color: white;
-      font-size: 2.5em;
-      font-weight: 800;
-      text-shadow: 0 4px 12px rgba(0,0,0,0.3);
-      margin-bottom: 8px;
-      letter-spacing: -0.5px;
-    }
-    
-    .header-subtitle {
-      color: rgba(255,255,255,0.95);
-      font-size: 1.1em;
-      font-weight: 500;
-      text-shadow: 0 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    .info-banner {
-      background: linear-gradient(135deg, rgba(255, 255, 255, 0.95) 0%, rgba(255, 255, 255, 0.85) 100%);
-      backdrop-filter: blur(10px);
-      -webkit-backdrop-filter: blur(10px);
-      color: var(--text-dark);
-      padding: 18px 24px;
-      border-radius: 16px;
-      margin-bottom: 30px;
-      display: flex;
-      align-items: center;
-      gap: 15px;
-      border: 1px solid rgba(255, 255, 255, 0.5);
-      box-shadow: var(--shadow-lg);
-      animation: fadeIn 1s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .info-banner .icon {
-      font-size: 28px;
-      flex-shrink: 0;
-      animation: pulse 2s ease-in-out infinite;
-    }
-    
-    @keyframes pulse {
-      0%, 100% { transform: scale(1); }
-      50% { transform: scale(1.1); }
-    }
-    
-    .info-banner .text {
-      flex-grow: 1;
-      font-size: 0.95em;
-      line-height: 1.6;
-    }
-    
-    .info-banner strong {
-      color: var(--warning);
-      font-weight: 700;
-    }
-    
-    .upload-container {
-      background: var(--glass-bg);
-      backdrop-filter: blur(20px);
-      -webkit-backdrop-filter: blur(20px);
-      border-radius: 24px;
-      padding: 35px;
-      margin-bottom: 35px;
-      border: 1px solid var(--glass-border);
-      box-shadow: var(--shadow-xl);
-      animation: fadeInUp 0.8s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .upload-tabs {
-      display: flex;
-      gap: 12px;
-      margin-bottom: 30px;
-      border-bottom: 2px solid rgba(0, 0, 0, 0.08);
-      padding-bottom: 0;
-    }
-    
-    .upload-tab {
-      padding: 14px 24px;
-      border: none;
-      background: transparent;
-      color: var(--text-light);
-      font-size: 1em;
-      font-weight: 600;
-      cursor: pointer;
-      border-bottom: 3px solid transparent;
-      transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      position: relative;
-      top: 2px;
-      display: flex;
-      align-items: center;
-      gap: 8px;
-    }
-    
-    .upload-tab:hover {
-      color: var(--primary);
-      background: rgba(102, 126, 234, 0.08);
-      border-radius: 12px 12px 0 0;
-      transform: translateY(-2px);
-    }
-    
-    .upload-tab.active {
-      color: var(--primary);
-      border-bottom-color: var(--primary);
-      font-weight: 700;
-    }
-    
-    .upload-tab .emoji {
-      font-size: 1.2em;
-    }
-    
-    .upload-content {
-      display: none;
-      animation: fadeIn 0.5s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .upload-content.active {
-      display: block;
-    }
-    
-    .upload-area {
-      border: 3px dashed rgba(102, 126, 234, 0.3);
-      border-radius: 16px;
-      padding: 50px 30px;
-      text-align: center;
-      background: linear-gradient(135deg, rgba(102, 126, 234, 0.03) 0%, rgba(118, 75, 162, 0.03) 100%);
-      transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-      cursor: pointer;
-      position: relative;
-      overflow: hidden;
-    }
-    
-    .upload-area::before {
-      content: '';
-      position: absolute;
-      top: -50%;
-      left: -50%;
-      width: 200%;
-      height: 200%;
-      background: radial-gradient(circle, rgba(102, 126, 234, 0.1) 0%, transparent 70%);
-      opacity: 0;
-      transition: opacity 0.4s ease;
-    }
-    
-    .upload-area:hover::before {
-      opacity: 1;
-    }
-    
-    .upload-area:hover, .upload-area.dragover {
-      border-color: var(--primary);
-      background: linear-gradient(135deg, rgba(102, 126, 234, 0.08) 0%, rgba(118, 75, 162, 0.08) 100%);
-      transform: translateY(-4px) scale(1.01);
-      box-shadow: 0 12px 24px rgba(102, 126, 234, 0.2);
-    }
-    
-    .upload-area.dragover {
-      border-style: solid;
-      border-width: 3px;
-    }
-    
-    .upload-area .icon {
-      font-size: 56px;
-      margin-bottom: 20px;
-      display: inline-block;
-      animation: bounce 2s ease-in-out infinite;
-    }
-    
-    @keyframes bounce {
-      0%, 100% { transform: translateY(0); }
-      50% { transform: translateY(-10px); }
-    }
-    
-    .upload-area:hover .icon {
-      animation: shake 0.5s ease-in-out;
-    }
-    
-    @keyframes shake {
-      0%, 100% { transform: translateX(0); }
-      25% { transform: translateX(-10px); }
-      75% { transform: translateX(10px); }
-    }
-    
-    .upload-area .title {
-      font-size: 1.3em;
-      font-weight: 700;
-      color: var(--text-dark);
-      margin-bottom: 10px;
-    }
-    
-    .upload-area .subtitle {
-      color: var(--text-light);
-      font-size: 1em;
-      margin-bottom: 20px;
-      font-weight: 500;
-    }
-    
-    .upload-area input[type="file"] {
-      position: absolute;
-      top: 0;
-      left: 0;
-      width: 100%;
-      height: 100%;
-      opacity: 0;
-      cursor: pointer;
-    }
-    
-    .file-selected-indicator {
-      display: none;
-      margin-top: 15px;
-      padding: 12px 20px;
-      background: linear-gradient(135deg, var(--success) 0%, #059669 100%);
-      color: white;
-      border-radius: 10px;
-      font-weight: 600;
-      animation: slideInUp 0.4s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .file-selected-indicator.show {
-      display: block;
-    }
-    
-    @keyframes slideInUp {
-      from {
-        opacity: 0;
-        transform: translateY(20px);
-      }
-      to {
-        opacity: 1;
-        transform: translateY(0);
-      }
-    }
-    
-    .btn-primary {
-      background: linear-gradient(135deg, var(--primary) 0%, var(--secondary) 100%);
-      color: white;
-      border: none;
-      padding: 14px 36px;
-      border-radius: 12px;
-      font-size: 1.05em;
-      font-weight: 700;
-      cursor: pointer;
-      transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      box-shadow: 0 6px 16px rgba(102, 126, 234, 0.4);
-      margin-top: 20px;
-      position: relative;
-      overflow: hidden;
-    }
-    
-    .btn-primary::before {
-      content: '';
-      position: absolute;
-      top: 50%;
-      left: 50%;
-      width: 0;
-      height: 0;
-      border-radius: 50%;
-      background: rgba(255, 255, 255, 0.3);
-      transform: translate(-50%, -50%);
-      transition: width 0.6s, height 0.6s;
-    }
-    
-    .btn-primary:hover::before {
-      width: 300px;
-      height: 300px;
-    }
-    
-    .btn-primary:hover {
-      transform: translateY(-3px);
-      box-shadow: 0 10px 24px rgba(102, 126, 234, 0.5);
-    }
-    
-    .btn-primary:active {
-      transform: translateY(-1px);
-    }
-    
-    .form-group {
-      margin-bottom: 24px;
-      text-align: left;
-    }
-    
-    .form-label {
-      display: block;
-      margin-bottom: 10px;
-      font-weight: 700;
-      color: var(--text-dark);
-      font-size: 0.95em;
-      display: flex;
-      align-items: center;
-      gap: 8px;
-    }
-    
-    .form-input {
-      width: 100%;
-      padding: 14px 18px;
-      border: 2px solid rgba(0, 0, 0, 0.1);
-      border-radius: 12px;
-      font-size: 1em;
-      font-family: inherit;
-      transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      background: white;
-    }
-    
-    .form-input:focus {
-      outline: none;
-      border-color: var(--primary);
-      box-shadow: 0 0 0 4px rgba(102, 126, 234, 0.15);
-      transform: translateY(-2px);
-    }
-    
-    textarea.form-input {
-      min-height: 180px;
-      resize: vertical;
-      font-family: 'Inter', sans-serif;
-      line-height: 1.6;
-    }
-    
-    .char-counter {
-      text-align: right;
-      font-size: 0.85em;
-      color: var(--text-light);
-      margin-top: 8px;
-      font-weight: 600;
-    }
-    
-    .files-section {
-      animation: fadeInUp 1s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .date-section {
-      margin-bottom: 35px;
-    }
-    
-    .date-header {
-      background: var(--glass-bg);
-      backdrop-filter: blur(20px);
-      -webkit-backdrop-filter: blur(20px);
-      color: var(--primary);
-      padding: 18px 26px;
-      border-radius: 16px;
-      font-size: 1.3em;
-      font-weight: 800;
-      margin-bottom: 18px;
-      border: 1px solid var(--glass-border);
-      box-shadow: var(--shadow-md);
-      display: flex;
-      align-items: center;
-      gap: 12px;
-      transition: all 0.3s ease;
-    }
-    
-    .date-header:hover {
-      transform: translateX(5px);
-      box-shadow: var(--shadow-lg);
-    }
-    
-    .file-list {
-      list-style: none;
-      display: flex;
-      flex-direction: column;
-      gap: 12px;
-    }
-    
-    .file-item {
-      background: white;
-      padding: 18px 24px;
-      border-radius: 16px;
-      box-shadow: var(--shadow-sm);
-      transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-      gap: 18px;
-      border: 1px solid rgba(0, 0, 0, 0.05);
-      position: relative;
-      overflow: hidden;
-    }
-    
-    .file-item::before {
-      content: '';
-      position: absolute;
-      left: 0;
-      top: 0;
-      height: 100%;
-      width: 4px;
-      background: linear-gradient(180deg, var(--primary) 0%, var(--secondary) 100%);
-      transform: translateX(-4px);
-      transition: transform 0.3s ease;
-    }
-    
-    .file-item:hover::before {
-      transform: translateX(0);
-    }
-    
-    .file-item:hover {
-      transform: translateX(8px);
-      box-shadow: var(--shadow-md);
-      border-color: rgba(102, 126, 234, 0.2);
-    }
-    
-    .file-item.folder::before {
-      background: linear-gradient(180deg, var(--primary) 0%, var(--info) 100%);
-    }
-    
-    .file-item.text::before {
-      background: linear-gradient(180deg, var(--warning) 0%, #f59e0b 100%);
-    }
-    
-    .file-icon {
-      font-size: 28px;
-      flex-shrink: 0;
-      transition: transform 0.3s ease;
-    }
-    
-    .file-item:hover .file-icon {
-      transform: scale(1.2) rotate(5deg);
-    }
-    
-    .file-info {
-      flex-grow: 1;
-      min-width: 0;
-    }
-    
-    .file-name {
-      font-weight: 700;
-      color: var(--text-dark);
-      word-break: break-word;
-      margin-bottom: 6px;
-      cursor: pointer;
-      display: flex;
-      align-items: center;
-      gap: 10px;
-      font-size: 1.05em;
-    }
-    
-    .file-meta {
-      font-size: 0.85em;
-      color: var(--text-light);
-      font-weight: 600;
-    }
-    
-    .file-actions {
-      display: flex;
-      gap: 10px;
-      flex-shrink: 0;
-    }
-    
-    .btn {
-      padding: 10px 18px;
-      border: none;
-      border-radius: 10px;
-      font-size: 0.9em;
-      font-weight: 700;
-      cursor: pointer;
-      transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      white-space: nowrap;
-      position: relative;
-      overflow: hidden;
-    }
-    
-    .btn::after {
-      content: '';
-      position: absolute;
-      top: 50%;
-      left: 50%;
-      width: 0;
-      height: 0;
-      border-radius: 50%;
-      background: rgba(255, 255, 255, 0.4);
-      transform: translate(-50%, -50%);
-      transition: width 0.6s, height 0.6s;
-    }
-    
-    .btn:hover::after {
-      width: 200px;
-      height: 200px;
-    }
-    
-    .btn-download {
-      background: linear-gradient(135deg, var(--success) 0%, #059669 100%);
-      color: white;
-      box-shadow: 0 4px 12px rgba(16, 185, 129, 0.3);
-    }
-    
-    .btn-download:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 6px 16px rgba(16, 185, 129, 0.4);
-    }
-    
-    .btn-delete {
-      background: linear-gradient(135deg, var(--danger) 0%, #dc2626 100%);
-      color: white;
-      box-shadow: 0 4px 12px rgba(239, 68, 68, 0.3);
-    }
-    
-    .btn-delete:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 6px 16px rgba(239, 68, 68, 0.4);
-    }
-    
-    .btn:active {
-      transform: translateY(0);
-    }
-    
-    .folder-contents {
-      margin-top: 15px;
-      padding-left: 45px;
-      display: none;
-      animation: slideDown 0.4s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .folder-contents.expanded {
-      display: block;
-    }
-    
-    .folder-file {
-      padding: 10px 0;
-      color: var(--text-light);
-      font-size: 0.9em;
-      display: flex;
-      align-items: center;
-      gap: 10px;
-      font-weight: 500;
-      transition: all 0.2s ease;
-    }
-    
-    .folder-file:hover {
-      color: var(--primary);
-      transform: translateX(5px);
-    }
-    
-    .text-preview {
-      margin-top: 15px;
-      padding: 18px;
-      background: linear-gradient(135deg, #f9fafb 0%, #f3f4f6 100%);
-      border-radius: 12px;
-      font-family: 'Courier New', monospace;
-      font-size: 0.9em;
-      white-space: pre-wrap;
-      word-wrap: break-word;
-      max-height: 350px;
-      overflow-y: auto;
-      border: 2px solid rgba(0, 0, 0, 0.08);
-      display: none;
-      line-height: 1.6;
-    }
-    
-    .text-preview.expanded {
-      display: block;
-      animation: slideDown 0.4s cubic-bezier(0.16, 1, 0.3, 1);
-    }
-    
-    .text-preview::-webkit-scrollbar {
-      width: 8px;
-    }
-    
-    .text-preview::-webkit-scrollbar-track {
-      background: rgba(0, 0, 0, 0.05);
-      border-radius: 10px;
-    }
-    
-    .text-preview::-webkit-scrollbar-thumb {
-      background: var(--primary);
-      border-radius: 10px;
-    }
-    
-    .toggle-icon {
-      display: inline-block;
-      transition: transform 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-      font-size: 0.85em;
-      color: var(--primary);
-      font-weight: bold;
-    }
-    
-    .toggle-icon.expanded {
-      transform: rotate(90deg);
-    }
+search_lock = threading.Lock()
+
+
+def search_db():
+    """Open a connection to the search index, creating the schema if needed"""
+    conn = sqlite3.connect(SEARCH_DB, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            item TEXT NOT NULL,
+            path TEXT NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE
+        );
+        CREATE INDEX IF NOT EXISTS files_item ON files(item);
+        CREATE INDEX IF NOT EXISTS files_name ON files(name COLLATE NOCASE);
+        CREATE VIRTUAL TABLE IF NOT EXISTS files_trigram USING fts5(
+            path, content='files', content_rowid='id', tokenize='trigram'
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5(
+            item UNINDEXED, body, tokenize='porter unicode61'
+        );
+    """)
+    return conn
+
+
+def _unindex(conn, name):
+    rows = conn.execute('SELECT id, path FROM files WHERE item = ?', (name,)).fetchall()
+    conn.executemany("INSERT INTO files_trigram(files_trigram, rowid, path) VALUES('delete', ?, ?)", rows)
+    conn.execute('DELETE FROM files WHERE item = ?', (name,))
+    conn.execute('DELETE FROM texts WHERE item = ?', (name,))
+
+
+def _index(conn, name):
+    path = item_path(name)
+    files = folder_files(name)
+    if files is not None:
+        entries = [f"{name}/{rel_path.replace(os.sep, '/')}" for _, rel_path in files]
+    elif os.path.isfile(path):
+        entries = [name]
+    else:
+        return
     
-    .empty-state {
-      text-align: center;
-      padding: 70px 30px;
-      background: var(--glass-bg);
-      backdrop-filter: blur(20px);
-      -webkit-backdrop-filter: blur(20px);
-      border-radius: 20px;
-      border: 1px solid var(--glass-border);
-      box-shadow: var(--shadow-lg);
-    }
+    for entry in entries:
+        cursor = conn.execute('INSERT INTO files(item, path, name) VALUES (?, ?, ?)',
+                              (name, entry, entry.rsplit('/', 1)[-1]))
+        conn.execute('INSERT INTO files_trigram(rowid, path) VALUES (?, ?)', (cursor.lastrowid, entry))
     
-    .empty-state .icon {
-      font-size: 72px;
-      margin-bottom: 24px;
-      opacity: 0.4;
-      animation: float 3s ease-in-out infinite;
-    }
+    if name.endswith('.txt') and os.path.isfile(path):
+        with open_upload(path) as f:
+            body = f.read(SEARCH_MAX_TEXT_BYTES).decode('utf-8', errors='replace')
+            conn.execute('INSERT INTO texts(item, body) VALUES (?, ?)', (name, body))
+
+
+def update_search_index(*names):
+    """Re-index top level uploads after they changed, or drop them if they are gone"""
+    names = {name.replace('\\', '/').split('/')[0] for name in names}
+    try:
+        with search_lock:
+            conn = search_db()
+            with conn:
+                for name in names:
+                    _unindex(conn, name)
+                    _index(conn, name)
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Search index update failed for {', '.join(names)}: {e}")
+
+
+def sync_search_index():
+    """Bring the search index in line with the upload folder after a restart"""
+    on_disk = set()
+    for _, date_data in get_files_by_date():
+        on_disk.update(date_data['folders'])
+        on_disk.update(date_data['files'])
+    
+    with search_lock:
+        conn = search_db()
+        indexed = {row[0] for row in conn.execute('SELECT DISTINCT item FROM files')}
+        with conn:
+            for name in indexed - on_disk:
+                _unindex(conn, name)
+            for name in on_disk - indexed:
+                _index(conn, name)
+        conn.close()
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def search_uploads(query, limit=50):
+    """Search file names, paths inside folders and the content of text uploads"""
+    query = query.strip()
+    if not query:
+        return []
     
-    .empty-state .title {
-      font-size: 1.4em;
-      font-weight: 700;
-      color: var(--text-light);
-      margin-bottom: 10px;
+    conn = search_db()
+    try:
+        if len(query) >= 3:
+            rows = conn.execute(
+                'SELECT f.item, f.path FROM files_trigram t JOIN files f ON f.id = t.rowid '
+                'WHERE files_trigram MATCH ? LIMIT ?', (_fts_phrase(query), limit)).fetchall()
+        else:
+            # Too short for trigrams, fall back to a file name prefix match
+            rows = conn.execute('SELECT item, path FROM files WHERE name >= ? AND name < ? LIMIT ?',
+                                (query, query + '\U0010ffff', limit)).fetchall()
+        results = [{'item': item, 'path': path, 'match': 'name'} for item, path in rows]
+        
+        terms = ' '.join(_fts_phrase(term) + '*' for term in query.split())
+        try:
+            rows = conn.execute(
+                "SELECT item, snippet(texts, 1, '', '', '…', 12) FROM texts WHERE texts MATCH ? "
+                'ORDER BY rank LIMIT ?', (terms, limit)).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        results += [{'item': item, 'path': item, 'match': 'text', 'snippet': snippet}
+                    for item, snippet in rows]
+        return results
+    finally:
+        conn.close()
+
+
+# SHA-256 of every upload's original bytes, computed while it is written and
+# stored with the size and mtime of the file it was computed for. A file
+# whose size and mtime still match but whose content hashes differently has
+# rotted on disk; the scrub job re-hashes everything to find those.
+SCRUB_INTERVAL = float(os.environ.get('SCRUB_INTERVAL_HOURS', 24)) * 3600
+SCRUB_WORKERS = int(os.environ.get('SCRUB_WORKERS', 4))
+scrub_lock = threading.Lock()
+scrub_status = {'running': False, 'started': None, 'finished': None,
+                'checked': 0, 'added': 0, 'corrupt': []}
+
+
+def checksum_db():
+    """Open a connection to the checksum store, creating the schema if needed"""
+    conn = sqlite3.connect(CHECKSUM_DB, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checksums (
+            path TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            verified REAL,
+            corrupt INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS checksums_sha256 ON checksums(sha256)')
+    return conn
+
+
+def upload_key(file_path):
+    """Path of a stored file as the app names it, e.g. folder/sub/file.txt"""
+    location, name, inner = split_upload_path(file_path)
+    return '/'.join([name] + (inner.split(os.sep) if inner else []))
+
+
+def record_checksums(files):
+    """Remember the checksums of files that were just written, given as (path, sha256) pairs"""
+    try:
+        rows = []
+        for file_path, sha256 in files:
+            st = os.stat(file_path)
+            rows.append((upload_key(file_path), sha256, st.st_size, st.st_mtime_ns, time.time()))
+        conn = checksum_db()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO checksums(path, sha256, size, mtime_ns, verified) '
+                             'VALUES (?, ?, ?, ?, ?)', rows)
+        conn.close()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not record checksums: {e}")
+
+
+def record_checksum(file_path, sha256):
+    record_checksums([(file_path, sha256)])
+
+
+def checksum_record(file_path):
+    """Get the recorded (sha256, corrupt) of a stored file, None if unknown or changed since"""
+    try:
+        st = os.stat(file_path)
+        conn = checksum_db()
+        row = conn.execute('SELECT sha256, corrupt, size, mtime_ns FROM checksums WHERE path = ?',
+                           (upload_key(file_path),)).fetchone()
+        conn.close()
+    except (OSError, sqlite3.Error):
+        return None
+    if row and row[2:] == (st.st_size, st.st_mtime_ns):
+        return row[0], bool(row[1])
+    return None
+
+
+def stored_checksum(file_path):
+    record = checksum_record(file_path)
+    return record[0] if record else None
+
+
+def stored_checksums(file_paths):
+    """Get {path: sha256} for the given stored files whose checksum is known and current"""
+    found = {}
+    try:
+        conn = checksum_db()
+        for file_path in file_paths:
+            row = conn.execute('SELECT sha256, size, mtime_ns FROM checksums WHERE path = ?',
+                               (upload_key(file_path),)).fetchone()
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            if row and row[1:] == (st.st_size, st.st_mtime_ns):
+                found[file_path] = row[0]
+        conn.close()
+    except sqlite3.Error:
+        pass
+    return found
+
+
+def find_blobs(sha256s):
+    """Get {sha256: path} of stored files holding the given contents, where known and current"""
+    found = {}
+    try:
+        conn = checksum_db()
+        for sha256 in sha256s:
+            rows = conn.execute('SELECT path, size, mtime_ns FROM checksums WHERE sha256 = ? AND corrupt = 0',
+                                (sha256,)).fetchall()
+            for key, size, mtime_ns in rows:
+                file_path = item_path(key)
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                if (st.st_size, st.st_mtime_ns) == (size, mtime_ns):
+                    found[sha256] = file_path
+                    break
+        conn.close()
+    except sqlite3.Error:
+        pass
+    return found
+
+
+def hash_upload(file_path):
+    """Hash the original bytes of a stored upload"""
+    digest = hashlib.sha256()
+    for chunk in iter_upload(file_path):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_checksum(file_path):
+    """Get the SHA-256 of a stored upload, hashing and recording it if it isn't known"""
+    sha256 = stored_checksum(file_path)
+    if sha256 is None:
+        sha256 = hash_upload(file_path)
+        record_checksum(file_path, sha256)
+    return sha256
+
+
+def forget_checksums(*names):
+    """Drop the checksums of deleted top level uploads"""
+    if not names:
+        return
+    try:
+        conn = checksum_db()
+        with conn:
+            for name in names:
+                conn.execute("DELETE FROM checksums WHERE path = ? OR (path >= ? AND path < ?)",
+                             (name, name + '/', name + '0'))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not drop the checksums of {', '.join(names)}: {e}")
+
+
+def digest_header(sha256):
+    """Value of a Digest header for a hex SHA-256"""
+    return 'sha-256=' + base64.b64encode(bytes.fromhex(sha256)).decode('ascii')
+
+
+def all_upload_files():
+    """List (path on disk, key) of every stored file"""
+    ensure_catalog()
+    files = []
+    with catalog_lock:
+        for name, entry in catalog.items():
+            path = os.path.join(entry['location'], name)
+            if entry['kind'] == 'folder':
+                files.extend((os.path.join(path, rel_path), f"{name}/{rel_path.replace(os.sep, '/')}")
+                             for rel_path in entry['files'])
+            else:
+                files.append((path, name))
+    return files
+
+
+def scrub_file(file):
+    """Hash one file for the scrub, None if it vanished or changed meanwhile"""
+    file_path, key = file
+    try:
+        before = os.stat(file_path)
+        sha256 = hash_upload(file_path)
+        after = os.stat(file_path)
+    except OSError:
+        return None
+    if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+        return None
+    return key, sha256, after.st_size, after.st_mtime_ns
+
+
+def scrub_checksums():
+    """Re-hash every upload in parallel, recording missing checksums and flagging bit rot"""
+    with scrub_lock:
+        if scrub_status['running']:
+            return
+        scrub_status.update(running=True, started=time.time(), finished=None,
+                            checked=0, added=0, corrupt=[])
+    try:
+        conn = checksum_db()
+        known = {row[0]: row[1:] for row in conn.execute('SELECT path, sha256, size, mtime_ns FROM checksums')}
+        files = all_upload_files()
+        now = time.time()
+        with ThreadPoolExecutor(max_workers=SCRUB_WORKERS, thread_name_prefix='scrub') as pool, conn:
+            for result in pool.map(scrub_file, files):
+                if result is None:
+                    continue
+                key, sha256, size, mtime_ns = result
+                record = known.get(key)
+                if record and record[1:] == (size, mtime_ns):
+                    corrupt = record[0] != sha256
+                    if corrupt:
+                        print(f"Checksum mismatch for {key}: expected {record[0]}, got {sha256}")
+                        scrub_status['corrupt'].append(key)
+                    conn.execute('UPDATE checksums SET verified = ?, corrupt = ? WHERE path = ?',
+                                 (now, int(corrupt), key))
+                else:
+                    conn.execute('INSERT OR REPLACE INTO checksums(path, sha256, size, mtime_ns, verified) '
+                                 'VALUES (?, ?, ?, ?, ?)', (key, sha256, size, mtime_ns, now))
+                    scrub_status['added'] += 1
+                scrub_status['checked'] += 1
+            
+            # Files uploaded while the scrub ran aren't in `known` and are kept
+            gone = known.keys() - {key for _, key in files}
+            conn.executemany('DELETE FROM checksums WHERE path = ?', [(key,) for key in gone])
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Scrub failed: {e}")
+    finally:
+        scrub_status.update(running=False, finished=time.time())
+
+
+def scrub_scheduler():
+    while True:
+        time.sleep(SCRUB_INTERVAL)
+        scrub_checksums()
+
+
+# Thumbnails of images, and of the first page of PDFs when poppler's pdftoppm
+# is installed, are rendered by a small worker pool when an upload arrives or
+# on first request. They are cached by the SHA-256 of the upload's content so
+# copies share one thumbnail, and the least recently used ones are dropped
+# once the cache grows past THUMBNAIL_CACHE_BYTES.
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 256))
+THUMBNAIL_CACHE_BYTES = int(os.environ.get('THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+# How long a thumbnail request waits for its render before giving up
+THUMBNAIL_WAIT = 10
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+PDFTOPPM = shutil.which('pdftoppm')
+
+thumbnail_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+thumbnail_jobs = {}
+thumbnail_lock = threading.Lock()
+_thumbnail_cache_size = None
+
+
+def thumbnail_supported(filename):
+    """Check if a thumbnail can be rendered for an upload"""
+    if Image is None:
+        return False
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in IMAGE_EXTENSIONS or (ext == '.pdf' and PDFTOPPM is not None)
+
+
+def thumbnail_path(digest):
+    return os.path.join(THUMBNAIL_FOLDER, digest[:2], digest + '.jpg')
+
+
+def render_thumbnail(path, target):
+    """Render a JPEG thumbnail of an image or of the first page of a PDF"""
+    with tempfile.TemporaryDirectory(dir=THUMBNAIL_FOLDER) as tmpdir:
+        if path.lower().endswith('.pdf'):
+            subprocess.run([PDFTOPPM, '-f', '1', '-l', '1', '-singlefile', '-jpeg',
+                            '-scale-to', str(THUMBNAIL_SIZE), path, os.path.join(tmpdir, 'page')],
+                           check=True, capture_output=True, timeout=60)
+            source = os.path.join(tmpdir, 'page.jpg')
+        elif stored_encoding(path)[0]:
+            with open_upload(path) as f:
+                source = BytesIO(f.read())
+        else:
+            source = path
+        
+        with Image.open(source) as image:
+            # Lets JPEG decode straight at a reduced scale
+            image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            partial = os.path.join(tmpdir, 'thumbnail.jpg')
+            image.save(partial, 'JPEG', quality=80)
+        
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(partial, target)
+
+
+def generate_thumbnail(path):
+    """Make sure the thumbnail of an upload exists and return its path"""
+    target = thumbnail_path(file_checksum(path))
+    if os.path.exists(target):
+        # The modification time orders the cache for eviction
+        os.utime(target)
+        return target
+    render_thumbnail(path, target)
+    trim_thumbnail_cache(os.path.getsize(target))
+    return target
+
+
+def trim_thumbnail_cache(added):
+    """Drop the least recently used thumbnails once the cache is over budget"""
+    global _thumbnail_cache_size
+    with thumbnail_lock:
+        if _thumbnail_cache_size is not None:
+            _thumbnail_cache_size += added
+            if _thumbnail_cache_size <= THUMBNAIL_CACHE_BYTES:
+                return
+        
+        entries = []
+        for root, dirs, files in os.walk(THUMBNAIL_FOLDER):
+            for name in files:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+        total = sum(size for _, size, _ in entries)
+        
+        # Trim below the budget so the next few renders don't walk the cache again
+        limit = THUMBNAIL_CACHE_BYTES * 0.9 if total > THUMBNAIL_CACHE_BYTES else THUMBNAIL_CACHE_BYTES
+        for mtime, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        _thumbnail_cache_size = total
+
+
+def request_thumbnail(path):
+    """Queue the thumbnail of an upload unless it is already being rendered"""
+    with thumbnail_lock:
+        future = thumbnail_jobs.get(path)
+        if future is not None:
+            return future
+        future = thumbnail_pool.submit(generate_thumbnail, path)
+        thumbnail_jobs[path] = future
+    
+    def done(future):
+        with thumbnail_lock:
+            thumbnail_jobs.pop(path, None)
+        if future.exception():
+            print(f"Thumbnail of {path} failed: {future.exception()}")
+    
+    future.add_done_callback(done)
+    return future
+
+
+def render_thumbnails(names):
+    """Render thumbnails of new top level uploads ahead of the first page view"""
+    for name in names:
+        if thumbnail_supported(name):
+            path = item_path(name)
+            if os.path.isfile(path):
+                request_thumbnail(path).result()
+
+
+# Work that can wait until an upload has been answered runs as background
+# jobs. They are kept in SQLite so they survive a restart; JOB_WORKERS
+# threads take them by priority (lowest first) and retry failed ones with
+# growing delays. Jobs of an ordered kind run one at a time in the order
+# they were queued, so changes reach the storage backend and the cluster in
+# the order they were made.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 5
+JOB_POLL_INTERVAL = 5
+# Finished jobs are kept this long for the status endpoint
+JOB_HISTORY = 24 * 3600
+jobs_wakeup = threading.Condition()
+
+
+def replicate_and_publish(names):
+    """Bring the storage backend up to date, then tell the other nodes"""
+    # Replication shares its thread with sync_storage
+    replication_executor.submit(replicate_items, names).result()
+    if CLUSTER_DB:
+        publish_change(names)
+
+
+# kind: (function taking the list of names, priority, ordered)
+JOB_KINDS = {
+    'replicate': (replicate_and_publish, 0, True),
+    'index': (lambda names: update_search_index(*names), 1, False),
+    'thumbnail': (render_thumbnails, 2, False),
+}
+
+
+def jobs_db():
+    """Open a connection to the job queue, creating the schema if needed"""
+    conn = sqlite3.connect(JOBS_DB, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            names TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            state TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after REAL NOT NULL,
+            created REAL NOT NULL,
+            updated REAL NOT NULL,
+            error TEXT
+        )
+    """)
+    conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, priority, id)')
+    return conn
+
+
+JOB_COLUMNS = ('id', 'kind', 'names', 'state', 'attempts', 'run_after', 'created', 'updated', 'error')
+
+
+def job_dict(row):
+    """A row of JOB_COLUMNS as a dict for the status endpoints"""
+    job = dict(zip(JOB_COLUMNS, row))
+    job['names'] = json.loads(job['names'])
+    return job
+
+
+def queue_jobs(names, *kinds):
+    """Queue jobs of the given kinds for top level uploads, return their ids
+    
+    A job still waiting for the same names is reused rather than queued
+    twice, as when the watcher sees an upload the app already handled.
+    Inside a request the ids are also collected in g.jobs for the response.
+    """
+    now = time.time()
+    ids = []
+    try:
+        conn = jobs_db()
+        with conn:
+            for kind in kinds:
+                names_json = json.dumps(sorted(names))
+                row = conn.execute("SELECT id FROM jobs WHERE kind = ? AND names = ? AND state = 'queued' "
+                                   "AND attempts = 0", (kind, names_json)).fetchone()
+                if row:
+                    ids.append(row[0])
+                    continue
+                cursor = conn.execute(
+                    'INSERT INTO jobs(kind, names, priority, run_after, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (kind, names_json, JOB_KINDS[kind][1], now, now, now))
+                ids.append(cursor.lastrowid)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not queue {', '.join(kinds)} of {', '.join(names)}, running them now: {e}")
+        for kind in kinds:
+            JOB_KINDS[kind][0](sorted(names))
+        return []
+    
+    with jobs_wakeup:
+        jobs_wakeup.notify_all()
+    if has_request_context():
+        g.setdefault('jobs', []).extend(ids)
+    return ids
+
+
+def claim_job():
+    """Mark the next job that may run as running, return (id, kind, names, attempts) or None"""
+    ordered = [kind for kind, (_, _, is_ordered) in JOB_KINDS.items() if is_ordered]
+    conn = jobs_db()
+    conn.isolation_level = None
+    try:
+        # Other workers wait between finding and taking the job
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(f"""
+            SELECT id, kind, names, attempts FROM jobs j
+            WHERE state = 'queued' AND run_after <= ?
+              AND NOT (kind IN ({', '.join('?' * len(ordered))}) AND EXISTS (
+                  SELECT 1 FROM jobs e WHERE e.kind = j.kind
+                  AND e.state IN ('queued', 'running') AND e.id < j.id))
+            ORDER BY priority, id LIMIT 1
+        """, [time.time()] + ordered).fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET state = 'running', updated = ? WHERE id = ?", (time.time(), row[0]))
+        conn.execute('COMMIT')
+        return row
+    finally:
+        conn.close()
+
+
+def finish_job(job_id, state, attempts, error=None, run_after=0):
+    conn = jobs_db()
+    with conn:
+        conn.execute('UPDATE jobs SET state = ?, attempts = ?, error = ?, run_after = ?, updated = ? '
+                     'WHERE id = ?', (state, attempts, error, run_after, time.time(), job_id))
+    conn.close()
+    with jobs_wakeup:
+        jobs_wakeup.notify_all()
+
+
+def job_worker():
+    """Run queued jobs as they come in"""
+    while True:
+        try:
+            job = claim_job()
+        except sqlite3.Error as e:
+            print(f"Could not read the job queue: {e}")
+            job = None
+        if job is None:
+            with jobs_wakeup:
+                jobs_wakeup.wait(JOB_POLL_INTERVAL)
+            continue
+        
+        job_id, kind, names, attempts = job
+        attempts += 1
+        try:
+            JOB_KINDS[kind][0](json.loads(names))
+        except Exception as e:
+            if attempts < JOB_MAX_ATTEMPTS:
+                print(f"Job {job_id} ({kind}) failed, retrying: {e}")
+                finish_job(job_id, 'queued', attempts, str(e),
+                           time.time() + JOB_RETRY_DELAY * 2 ** (attempts - 1))
+            else:
+                print(f"Job {job_id} ({kind}) failed for good: {e}")
+                finish_job(job_id, 'failed', attempts, str(e))
+        else:
+            finish_job(job_id, 'done', attempts)
+
+
+def start_job_workers():
+    """Requeue the jobs a previous run left unfinished and start the workers"""
+    conn = jobs_db()
+    with conn:
+        conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+    conn.close()
+    for _ in range(JOB_WORKERS):
+        threading.Thread(target=job_worker, daemon=True).start()
+
+
+def prune_jobs():
+    """Forget finished jobs older than JOB_HISTORY"""
+    try:
+        conn = jobs_db()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE state IN ('done', 'failed') AND updated < ?",
+                         (time.time() - JOB_HISTORY,))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not prune the job queue: {e}")
+
+
+# Stylesheet and script of the page, served as long-cached assets whose
+# URLs change with their content
+APP_CSS = '''* {
+  margin: 0;
+  padding: 0;
+  box-sizing: border-box;
+}
+
+:root {
+  --primary: #667eea;
+  --primary-dark: #5568d3;
+  --secondary: #764ba2;
+  --success: #10b981;
+  --danger: #ef4444;
+  --warning: #f59e0b;
+  --info: #3b82f6;
+  --text-dark: #1f2937;
+  --text-light: #6b7280;
+  --glass-bg: rgba(255, 255, 255, 0.85);
+  --glass-border: rgba(255, 255, 255, 0.3);
+  --shadow-sm: 0 1px 3px rgba(0,0,0,0.08);
+  --shadow-md: 0 4px 12px rgba(0,0,0,0.1);
+  --shadow-lg: 0 10px 30px rgba(0,0,0,0.12);
+  --shadow-xl: 0 20px 50px rgba(0,0,0,0.15);
+}
+
+body {
+  font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
+  background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+  background-attachment: fixed;
+  min-height: 100vh;
+  padding: 20px;
+  color: var(--text-dark);
+  position: relative;
+  overflow-x: hidden;
+}
+
+/* Animated background particles */
+.bg-particles {
+  position: fixed;
+  top: 0;
+  left: 0;
+  width: 100%;
+  height: 100%;
+  pointer-events: none;
+  z-index: 0;
+}
+
+.particle {
+  position: absolute;
+  background: rgba(255, 255, 255, 0.3);
+  border-radius: 50%;
+  animation: float 20s infinite ease-in-out;
+}
+
+@keyframes float {
+  0%, 100% { transform: translateY(0) translateX(0); }
+  25% { transform: translateY(-100px) translateX(50px); }
+  50% { transform: translateY(-200px) translateX(-50px); }
+  75% { transform: translateY(-100px) translateX(100px); }
+}
+
+.container {
+  max-width: 1000px;
+  margin: 0 auto;
+  position: relative;
+  z-index: 1;
+}
+
+/* Glassmorphism styles */
+.glass {
+  background: var(--glass-bg);
+  backdrop-filter: blur(20px);
+  -webkit-backdrop-filter: blur(20px);
+  border: 1px solid var(--glass-border);
+  box-shadow: var(--shadow-xl);
+}
+
+.glass-light {
+  background: rgba(255, 255, 255, 0.95);
+  backdrop-filter: blur(10px);
+  -webkit-backdrop-filter: blur(10px);
+}
+
+header {
+  text-align: center;
+  margin-bottom: 40px;
+  animation: fadeInDown 0.8s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.logo-container {
+  position: relative;
+  display: inline-block;
+  margin-bottom: 20px;
+}
+
+header img {
+  height: 110px;
+  max-width: 90%;
+  filter: drop-shadow(0 8px 16px rgba(0,0,0,0.2));
+  animation: logoFloat 3s ease-in-out infinite;
+}
+
+@keyframes logoFloat {
+  0%, 100% { transform: translateY(0); }
+  50% { transform: translateY(-10px); }
+}
+
+.header-title {
+  color: white;
+  font-size: 2.5em;
+  font-weight: 800;
+  text-shadow: 0 4px 12px rgba(0,0,0,0.3);
+  margin-bottom: 8px;
+  letter-spacing: -0.5px;
+}
+
+.header-subtitle {
+  color: rgba(255,255,255,0.95);
+  font-size: 1.1em;
+  font-weight: 500;
+  text-shadow: 0 2px 4px rgba(0,0,0,0.2);
+}
+
+.info-banner {
+  background: linear-gradient(135deg, rgba(255, 255, 255, 0.95) 0%, rgba(255, 255, 255, 0.85) 100%);
+  backdrop-filter: blur(10px);
+  -webkit-backdrop-filter: blur(10px);
+  color: var(--text-dark);
+  padding: 18px 24px;
+  border-radius: 16px;
+  margin-bottom: 30px;
+  display: flex;
+  align-items: center;
+  gap: 15px;
+  border: 1px solid rgba(255, 255, 255, 0.5);
+  box-shadow: var(--shadow-lg);
+  animation: fadeIn 1s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.info-banner .icon {
+  font-size: 28px;
+  flex-shrink: 0;
+  animation: pulse 2s ease-in-out infinite;
+}
+
+@keyframes pulse {
+  0%, 100% { transform: scale(1); }
+  50% { transform: scale(1.1); }
+}
+
+.info-banner .text {
+  flex-grow: 1;
+  font-size: 0.95em;
+  line-height: 1.6;
+}
+
+.info-banner strong {
+  color: var(--warning);
+  font-weight: 700;
+}
+
+.upload-container {
+  background: var(--glass-bg);
+  backdrop-filter: blur(20px);
+  -webkit-backdrop-filter: blur(20px);
+  border-radius: 24px;
+  padding: 35px;
+  margin-bottom: 35px;
+  border: 1px solid var(--glass-border);
+  box-shadow: var(--shadow-xl);
+  animation: fadeInUp 0.8s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.upload-tabs {
+  display: flex;
+  gap: 12px;
+  margin-bottom: 30px;
+  border-bottom: 2px solid rgba(0, 0, 0, 0.08);
+  padding-bottom: 0;
+}
+
+.upload-tab {
+  padding: 14px 24px;
+  border: none;
+  background: transparent;
+  color: var(--text-light);
+  font-size: 1em;
+  font-weight: 600;
+  cursor: pointer;
+  border-bottom: 3px solid transparent;
+  transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  position: relative;
+  top: 2px;
+  display: flex;
+  align-items: center;
+  gap: 8px;
+}
+
+.upload-tab:hover {
+  color: var(--primary);
+  background: rgba(102, 126, 234, 0.08);
+  border-radius: 12px 12px 0 0;
+  transform: translateY(-2px);
+}
+
+.upload-tab.active {
+  color: var(--primary);
+  border-bottom-color: var(--primary);
+  font-weight: 700;
+}
+
+.upload-tab .emoji {
+  font-size: 1.2em;
+}
+
+.upload-content {
+  display: none;
+  animation: fadeIn 0.5s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.upload-content.active {
+  display: block;
+}
+
+.upload-area {
+  border: 3px dashed rgba(102, 126, 234, 0.3);
+  border-radius: 16px;
+  padding: 50px 30px;
+  text-align: center;
+  background: linear-gradient(135deg, rgba(102, 126, 234, 0.03) 0%, rgba(118, 75, 162, 0.03) 100%);
+  transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+  cursor: pointer;
+  position: relative;
+  overflow: hidden;
+}
+
+.upload-area::before {
+  content: '';
+  position: absolute;
+  top: -50%;
+  left: -50%;
+  width: 200%;
+  height: 200%;
+  background: radial-gradient(circle, rgba(102, 126, 234, 0.1) 0%, transparent 70%);
+  opacity: 0;
+  transition: opacity 0.4s ease;
+}
+
+.upload-area:hover::before {
+  opacity: 1;
+}
+
+.upload-area:hover, .upload-area.dragover {
+  border-color: var(--primary);
+  background: linear-gradient(135deg, rgba(102, 126, 234, 0.08) 0%, rgba(118, 75, 162, 0.08) 100%);
+  transform: translateY(-4px) scale(1.01);
+  box-shadow: 0 12px 24px rgba(102, 126, 234, 0.2);
+}
+
+.upload-area.dragover {
+  border-style: solid;
+  border-width: 3px;
+}
+
+.upload-area .icon {
+  font-size: 56px;
+  margin-bottom: 20px;
+  display: inline-block;
+  animation: bounce 2s ease-in-out infinite;
+}
+
+@keyframes bounce {
+  0%, 100% { transform: translateY(0); }
+  50% { transform: translateY(-10px); }
+}
+
+.upload-area:hover .icon {
+  animation: shake 0.5s ease-in-out;
+}
+
+@keyframes shake {
+  0%, 100% { transform: translateX(0); }
+  25% { transform: translateX(-10px); }
+  75% { transform: translateX(10px); }
+}
+
+.upload-area .title {
+  font-size: 1.3em;
+  font-weight: 700;
+  color: var(--text-dark);
+  margin-bottom: 10px;
+}
+
+.upload-area .subtitle {
+  color: var(--text-light);
+  font-size: 1em;
+  margin-bottom: 20px;
+  font-weight: 500;
+}
+
+.upload-area input[type="file"] {
+  position: absolute;
+  top: 0;
+  left: 0;
+  width: 100%;
+  height: 100%;
+  opacity: 0;
+  cursor: pointer;
+}
+
+.file-selected-indicator {
+  display: none;
+  margin-top: 15px;
+  padding: 12px 20px;
+  background: linear-gradient(135deg, var(--success) 0%, #059669 100%);
+  color: white;
+  border-radius: 10px;
+  font-weight: 600;
+  animation: slideInUp 0.4s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.file-selected-indicator.show {
+  display: block;
+}
+
+.upload-progress {
+  display: none;
+  margin-top: 15px;
+  height: 28px;
+  border-radius: 10px;
+  background: rgba(0, 0, 0, 0.06);
+  overflow: hidden;
+  position: relative;
+}
+
+.upload-progress.show {
+  display: block;
+}
+
+.upload-progress .bar {
+  height: 100%;
+  width: 0;
+  background: linear-gradient(135deg, var(--primary) 0%, var(--secondary) 100%);
+  transition: width 0.2s ease;
+}
+
+.upload-cancel {
+  display: none;
+  margin-top: 10px;
+}
+
+.upload-cancel.show {
+  display: inline-block;
+}
+
+.upload-progress .label {
+  position: absolute;
+  inset: 0;
+  display: flex;
+  align-items: center;
+  justify-content: center;
+  font-size: 0.85em;
+  font-weight: 700;
+  color: var(--text-dark);
+}
+
+@keyframes slideInUp {
+  from {
+    opacity: 0;
+    transform: translateY(20px);
+  }
+  to {
+    opacity: 1;
+    transform: translateY(0);
+  }
+}
+
+.btn-primary {
+  background: linear-gradient(135deg, var(--primary) 0%, var(--secondary) 100%);
+  color: white;
+  border: none;
+  padding: 14px 36px;
+  border-radius: 12px;
+  font-size: 1.05em;
+  font-weight: 700;
+  cursor: pointer;
+  transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  box-shadow: 0 6px 16px rgba(102, 126, 234, 0.4);
+  margin-top: 20px;
+  position: relative;
+  overflow: hidden;
+}
+
+.btn-primary::before {
+  content: '';
+  position: absolute;
+  top: 50%;
+  left: 50%;
+  width: 0;
+  height: 0;
+  border-radius: 50%;
+  background: rgba(255, 255, 255, 0.3);
+  transform: translate(-50%, -50%);
+  transition: width 0.6s, height 0.6s;
+}
+
+.btn-primary:hover::before {
+  width: 300px;
+  height: 300px;
+}
+
+.btn-primary:hover {
+  transform: translateY(-3px);
+  box-shadow: 0 10px 24px rgba(102, 126, 234, 0.5);
+}
+
+.btn-primary:active {
+  transform: translateY(-1px);
+}
+
+.form-group {
+  margin-bottom: 24px;
+  text-align: left;
+}
+
+.form-label {
+  display: block;
+  margin-bottom: 10px;
+  font-weight: 700;
+  color: var(--text-dark);
+  font-size: 0.95em;
+  display: flex;
+  align-items: center;
+  gap: 8px;
+}
+
+.form-input {
+  width: 100%;
+  padding: 14px 18px;
+  border: 2px solid rgba(0, 0, 0, 0.1);
+  border-radius: 12px;
+  font-size: 1em;
+  font-family: inherit;
+  transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  background: white;
+}
+
+.form-input:focus {
+  outline: none;
+  border-color: var(--primary);
+  box-shadow: 0 0 0 4px rgba(102, 126, 234, 0.15);
+  transform: translateY(-2px);
+}
+
+textarea.form-input {
+  min-height: 180px;
+  resize: vertical;
+  font-family: 'Inter', sans-serif;
+  line-height: 1.6;
+}
+
+.char-counter {
+  text-align: right;
+  font-size: 0.85em;
+  color: var(--text-light);
+  margin-top: 8px;
+  font-weight: 600;
+}
+
+.search-container {
+  background: var(--glass-bg);
+  backdrop-filter: blur(20px);
+  -webkit-backdrop-filter: blur(20px);
+  border-radius: 20px;
+  padding: 20px 24px;
+  margin-bottom: 35px;
+  border: 1px solid var(--glass-border);
+  box-shadow: var(--shadow-lg);
+}
+
+.search-results {
+  list-style: none;
+  margin-top: 12px;
+  max-height: 360px;
+  overflow-y: auto;
+}
+
+.search-results:empty {
+  display: none;
+}
+
+.search-result {
+  padding: 10px 14px;
+  border-radius: 10px;
+  font-size: 0.9em;
+}
+
+.search-result:hover {
+  background: rgba(102, 126, 234, 0.08);
+}
+
+.search-result a {
+  color: var(--text-dark);
+  font-weight: 600;
+  text-decoration: none;
+  word-break: break-all;
+}
+
+.search-result .snippet {
+  color: var(--text-light);
+  font-size: 0.9em;
+  margin-top: 4px;
+  white-space: pre-wrap;
+}
+
+.bulk-bar {
+  position: sticky;
+  top: 20px;
+  z-index: 10;
+  display: none;
+  align-items: center;
+  gap: 12px;
+  flex-wrap: wrap;
+  background: var(--glass-bg);
+  backdrop-filter: blur(20px);
+  -webkit-backdrop-filter: blur(20px);
+  border-radius: 16px;
+  padding: 14px 20px;
+  margin-bottom: 20px;
+  border: 1px solid var(--glass-border);
+  box-shadow: var(--shadow-lg);
+}
+
+.bulk-bar.show {
+  display: flex;
+}
+
+.bulk-bar .count {
+  flex-grow: 1;
+  font-weight: 700;
+  color: var(--primary);
+}
+
+.select-item {
+  width: 18px;
+  height: 18px;
+  flex-shrink: 0;
+  cursor: pointer;
+  accent-color: var(--primary);
+}
+
+.files-section {
+  animation: fadeInUp 1s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.date-section {
+  margin-bottom: 35px;
+}
+
+.date-header {
+  background: var(--glass-bg);
+  backdrop-filter: blur(20px);
+  -webkit-backdrop-filter: blur(20px);
+  color: var(--primary);
+  padding: 18px 26px;
+  border-radius: 16px;
+  font-size: 1.3em;
+  font-weight: 800;
+  margin-bottom: 18px;
+  border: 1px solid var(--glass-border);
+  box-shadow: var(--shadow-md);
+  display: flex;
+  align-items: center;
+  gap: 12px;
+  transition: all 0.3s ease;
+}
+
+.date-header:hover {
+  transform: translateX(5px);
+  box-shadow: var(--shadow-lg);
+}
+
+.file-list {
+  list-style: none;
+  display: flex;
+  flex-direction: column;
+  gap: 12px;
+}
+
+.file-item {
+  background: white;
+  padding: 18px 24px;
+  border-radius: 16px;
+  box-shadow: var(--shadow-sm);
+  transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  display: flex;
+  justify-content: space-between;
+  align-items: center;
+  gap: 18px;
+  border: 1px solid rgba(0, 0, 0, 0.05);
+  position: relative;
+  overflow: hidden;
+}
+
+.file-item::before {
+  content: '';
+  position: absolute;
+  left: 0;
+  top: 0;
+  height: 100%;
+  width: 4px;
+  background: linear-gradient(180deg, var(--primary) 0%, var(--secondary) 100%);
+  transform: translateX(-4px);
+  transition: transform 0.3s ease;
+}
+
+.file-item:hover::before {
+  transform: translateX(0);
+}
+
+.file-item:hover {
+  transform: translateX(8px);
+  box-shadow: var(--shadow-md);
+  border-color: rgba(102, 126, 234, 0.2);
+}
+
+.file-item.folder::before {
+  background: linear-gradient(180deg, var(--primary) 0%, var(--info) 100%);
+}
+
+.file-item.text::before {
+  background: linear-gradient(180deg, var(--warning) 0%, #f59e0b 100%);
+}
+
+.file-icon {
+  font-size: 28px;
+  flex-shrink: 0;
+  transition: transform 0.3s ease;
+}
+
+.file-item:hover .file-icon {
+  transform: scale(1.2) rotate(5deg);
+}
+
+.file-icon img.thumbnail {
+  display: block;
+  width: 48px;
+  height: 48px;
+  object-fit: cover;
+  border-radius: 8px;
+}
+
+.file-info {
+  flex-grow: 1;
+  min-width: 0;
+}
+
+.file-name {
+  font-weight: 700;
+  color: var(--text-dark);
+  word-break: break-word;
+  margin-bottom: 6px;
+  cursor: pointer;
+  display: flex;
+  align-items: center;
+  gap: 10px;
+  font-size: 1.05em;
+}
+
+.file-meta {
+  font-size: 0.85em;
+  color: var(--text-light);
+  font-weight: 600;
+}
+
+.file-actions {
+  display: flex;
+  gap: 10px;
+  flex-shrink: 0;
+}
+
+.btn {
+  padding: 10px 18px;
+  border: none;
+  border-radius: 10px;
+  font-size: 0.9em;
+  font-weight: 700;
+  cursor: pointer;
+  transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  white-space: nowrap;
+  position: relative;
+  overflow: hidden;
+}
+
+.btn::after {
+  content: '';
+  position: absolute;
+  top: 50%;
+  left: 50%;
+  width: 0;
+  height: 0;
+  border-radius: 50%;
+  background: rgba(255, 255, 255, 0.4);
+  transform: translate(-50%, -50%);
+  transition: width 0.6s, height 0.6s;
+}
+
+.btn:hover::after {
+  width: 200px;
+  height: 200px;
+}
+
+.btn-download {
+  background: linear-gradient(135deg, var(--success) 0%, #059669 100%);
+  color: white;
+  box-shadow: 0 4px 12px rgba(16, 185, 129, 0.3);
+}
+
+.btn-download:hover {
+  transform: translateY(-2px);
+  box-shadow: 0 6px 16px rgba(16, 185, 129, 0.4);
+}
+
+.btn-share {
+  background: linear-gradient(135deg, var(--info) 0%, #2563eb 100%);
+  color: white;
+  box-shadow: 0 4px 12px rgba(59, 130, 246, 0.3);
+}
+
+.btn-share:hover {
+  transform: translateY(-2px);
+  box-shadow: 0 6px 16px rgba(59, 130, 246, 0.4);
+}
+
+.btn-delete {
+  background: linear-gradient(135deg, var(--danger) 0%, #dc2626 100%);
+  color: white;
+  box-shadow: 0 4px 12px rgba(239, 68, 68, 0.3);
+}
+
+.btn-delete:hover {
+  transform: translateY(-2px);
+  box-shadow: 0 6px 16px rgba(239, 68, 68, 0.4);
+}
+
+.btn:active {
+  transform: translateY(0);
+}
+
+.folder-contents {
+  margin-top: 15px;
+  padding-left: 45px;
+  display: none;
+  animation: slideDown 0.4s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.folder-contents.expanded {
+  display: block;
+}
+
+.folder-file {
+  padding: 10px 0;
+  color: var(--text-light);
+  font-size: 0.9em;
+  display: flex;
+  align-items: center;
+  gap: 10px;
+  font-weight: 500;
+  transition: all 0.2s ease;
+}
+
+.folder-file:hover {
+  color: var(--primary);
+  transform: translateX(5px);
+}
+
+.tree-viewport {
+  max-height: 400px;
+  overflow-y: auto;
+}
+
+.tree-spacer {
+  position: relative;
+}
+
+.tree-row {
+  position: absolute;
+  left: 0;
+  right: 0;
+  height: 32px;
+  padding: 0;
+  white-space: nowrap;
+}
+
+.tree-row.tree-dir {
+  cursor: pointer;
+}
+
+.tree-meta {
+  opacity: 0.7;
+  font-size: 0.9em;
+}
+
+.text-preview {
+  margin-top: 15px;
+  padding: 18px;
+  background: linear-gradient(135deg, #f9fafb 0%, #f3f4f6 100%);
+  border-radius: 12px;
+  font-family: 'Courier New', monospace;
+  font-size: 0.9em;
+  white-space: pre-wrap;
+  word-wrap: break-word;
+  max-height: 350px;
+  overflow-y: auto;
+  border: 2px solid rgba(0, 0, 0, 0.08);
+  display: none;
+  line-height: 1.6;
+}
+
+.text-preview.expanded {
+  display: block;
+  animation: slideDown 0.4s cubic-bezier(0.16, 1, 0.3, 1);
+}
+
+.text-preview::-webkit-scrollbar {
+  width: 8px;
+}
+
+.text-preview::-webkit-scrollbar-track {
+  background: rgba(0, 0, 0, 0.05);
+  border-radius: 10px;
+}
+
+.text-preview::-webkit-scrollbar-thumb {
+  background: var(--primary);
+  border-radius: 10px;
+}
+
+.toggle-icon {
+  display: inline-block;
+  transition: transform 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+  font-size: 0.85em;
+  color: var(--primary);
+  font-weight: bold;
+}
+
+.toggle-icon.expanded {
+  transform: rotate(90deg);
+}
+
+.empty-state {
+  text-align: center;
+  padding: 70px 30px;
+  background: var(--glass-bg);
+  backdrop-filter: blur(20px);
+  -webkit-backdrop-filter: blur(20px);
+  border-radius: 20px;
+  border: 1px solid var(--glass-border);
+  box-shadow: var(--shadow-lg);
+}
+
+.empty-state .icon {
+  font-size: 72px;
+  margin-bottom: 24px;
+  opacity: 0.4;
+  animation: float 3s ease-in-out infinite;
+}
+
+.empty-state .title {
+  font-size: 1.4em;
+  font-weight: 700;
+  color: var(--text-light);
+  margin-bottom: 10px;
+}
+
+.empty-state .subtitle {
+  color: var(--text-light);
+  font-size: 1em;
+}
+
+.status-indicator {
+  position: fixed;
+  top: 24px;
+  right: 24px;
+  padding: 14px 24px;
+  border-radius: 12px;
+  font-size: 0.9em;
+  font-weight: 700;
+  background: white;
+  color: var(--success);
+  box-shadow: var(--shadow-lg);
+  opacity: 0;
+  transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+  z-index: 1000;
+  display: flex;
+  align-items: center;
+  gap: 8px;
+  border: 1px solid rgba(0, 0, 0, 0.08);
+}
+
+.status-indicator.show {
+  opacity: 1;
+  transform: translateY(0);
+}
+
+.status-indicator.online {
+  color: var(--success);
+}
+
+.status-indicator.updated {
+  color: var(--primary);
+}
+
+.status-indicator.error {
+  color: var(--danger);
+}
+
+.status-dot {
+  width: 8px;
+  height: 8px;
+  border-radius: 50%;
+  background: currentColor;
+  animation: pulse-dot 2s ease-in-out infinite;
+}
+
+@keyframes pulse-dot {
+  0%, 100% { opacity: 1; transform: scale(1); }
+  50% { opacity: 0.6; transform: scale(1.3); }
+}
+
+.progress-bar {
+  display: none;
+  margin-top: 15px;
+  height: 6px;
+  background: rgba(0, 0, 0, 0.1);
+  border-radius: 10px;
+  overflow: hidden;
+}
+
+.progress-bar.show {
+  display: block;
+}
+
+.progress-fill {
+  height: 100%;
+  background: linear-gradient(90deg, var(--primary) 0%, var(--secondary) 100%);
+  border-radius: 10px;
+  transition: width 0.3s ease;
+  animation: shimmer 2s infinite;
+}
+
+@keyframes shimmer {
+  0% { background-position: -1000px 0; }
+  100% { background-position: 1000px 0; }
+}
+
+@keyframes fadeIn {
+  from { opacity: 0; }
+  to { opacity: 1; }
+}
+
+@keyframes fadeInUp {
+  from {
+    opacity: 0;
+    transform: translateY(30px);
+  }
+  to {
+    opacity: 1;
+    transform: translateY(0);
+  }
+}
+
+@keyframes fadeInDown {
+  from {
+    opacity: 0;
+    transform: translateY(-30px);
+  }
+  to {
+    opacity: 1;
+    transform: translateY(0);
+  }
+}
+
+@keyframes slideDown {
+  from {
+    opacity: 0;
+    max-height: 0;
+  }
+  to {
+    opacity: 1;
+    max-height: 1000px;
+  }
+}
+
+@media (max-width: 768px) {
+  body {
+    padding: 12px;
+  }
+
+  .header-title {
+    font-size: 1.8em;
+  }
+
+  .header-subtitle {
+    font-size: 0.95em;
+  }
+
+  .upload-container {
+    padding: 24px;
+  }
+
+  .upload-tabs {
+    flex-wrap: wrap;
+  }
+
+  .upload-tab {
+    flex: 1;
+    min-width: 100px;
+    font-size: 0.9em;
+    padding: 12px 16px;
+  }
+
+  .upload-area {
+    padding: 40px 20px;
+  }
+
+  .file-item {
+    flex-direction: column;
+    align-items: flex-start;
+    padding: 16px;
+  }
+
+  .file-actions {
+    width: 100%;
+    justify-content: flex-end;
+  }
+
+  .btn {
+    flex: 1;
+    font-size: 0.85em;
+    padding: 8px 14px;
+  }
+
+  .status-indicator {
+    top: 12px;
+    right: 12px;
+    padding: 10px 16px;
+    font-size: 0.85em;
+  }
+}
+
+@media (prefers-reduced-motion: reduce) {
+  *, *::before, *::after {
+    animation-duration: 0.01ms !important;
+    animation-iteration-count: 1 !important;
+    transition-duration: 0.01ms !important;
+  }
+}
+'''
+
+APP_JS = '''let expandedItems = new Set();
+let checkInterval;
+let currentTab = 'text';
+
+function createParticles() {
+  const container = document.querySelector('.bg-particles');
+  const particleCount = 15;
+
+  for (let i = 0; i < particleCount; i++) {
+    const particle = document.createElement('div');
+    particle.className = 'particle';
+    particle.style.width = Math.random() * 50 + 20 + 'px';
+    particle.style.height = particle.style.width;
+    particle.style.left = Math.random() * 100 + '%';
+    particle.style.top = Math.random() * 100 + '%';
+    particle.style.animationDelay = Math.random() * 20 + 's';
+    particle.style.animationDuration = (Math.random() * 10 + 15) + 's';
+    container.appendChild(particle);
+  }
+}
+
+function switchTab(tabName) {
+  document.querySelectorAll('.upload-tab').forEach(tab => {
+    tab.classList.remove('active');
+  });
+  document.querySelectorAll('.upload-content').forEach(content => {
+    content.classList.remove('active');
+  });
+
+  document.getElementById('tab-' + tabName).classList.add('active');
+  document.getElementById('content-' + tabName).classList.add('active');
+  currentTab = tabName;
+}
+
+// Folder contents are shown as a virtualized tree: directory levels are
+// fetched a page at a time as they scroll into view, and only the rows
+// inside the viewport are in the DOM
+const TREE_ROW_HEIGHT = 32;
+const TREE_OVERSCAN = 10;
+const TREE_PAGE_SIZE = 1000;
+const folderTrees = new Map();
+
+class FolderTree {
+  constructor(folder, version, expandedPaths) {
+    this.folder = folder;
+    this.version = version;
+    this.expandedPaths = expandedPaths || new Set();
+    this.rows = [this.pendingRow('', 0, 0)];
+    this.scrollTop = 0;
+    this.viewport = null;
+  }
+
+  pendingRow(path, depth, offset) {
+    return {kind: 'pending', path: path, depth: depth, offset: offset, loading: false};
+  }
+
+  spliceRows(index, count, rows) {
+    // Rows may number in the tens of thousands, too many to spread into splice()
+    this.rows = this.rows.slice(0, index).concat(rows, this.rows.slice(index + count));
+  }
+
+  mount(container) {
+    container.innerHTML = '<div class="tree-viewport"><div class="tree-spacer"></div></div>';
+    this.viewport = container.firstElementChild;
+    this.spacer = this.viewport.firstElementChild;
+    this.viewport.addEventListener('scroll', () => {
+      this.scrollTop = this.viewport.scrollTop;
+      this.render();
+    });
+    this.spacer.addEventListener('click', (event) => {
+      const row = event.target.closest('.tree-dir');
+      if (row) {
+        this.toggle(this.rows[Number(row.getAttribute('data-index'))]);
+      }
+    });
+    this.render();
+    this.viewport.scrollTop = this.scrollTop;
+  }
+
+  load(pending) {
+    pending.loading = true;
+    const parts = [this.folder].concat(pending.path ? pending.path.split('/') : []);
+    fetch('/folder-tree/' + parts.map(encodeURIComponent).join('/') + '?offset=' + pending.offset + '&limit=' + TREE_PAGE_SIZE)
+      .then(response => response.json())
+      .then(data => {
+        const index = this.rows.indexOf(pending);
+        if (index < 0) {
+          return;
+        }
+        const entries = data.entries || [];
+        const rows = [];
+        entries.forEach(entry => {
+          const path = pending.path ? pending.path + '/' + entry.name : entry.name;
+          const row = {kind: entry.kind, name: entry.name, path: path, depth: pending.depth,
+                       size: entry.size, files: entry.files, expanded: false};
+          rows.push(row);
+          if (row.kind === 'dir' && this.expandedPaths.has(path)) {
+            row.expanded = true;
+            rows.push(this.pendingRow(path, row.depth + 1, 0));
+          }
+        });
+        const next = pending.offset + entries.length;
+        if (entries.length && next < data.total) {
+          rows.push(this.pendingRow(pending.path, pending.depth, next));
+        }
+        this.spliceRows(index, 1, rows);
+        this.render();
+      })
+      .catch(() => {
+        pending.loading = false;
+      });
+  }
+
+  toggle(row) {
+    const index = this.rows.indexOf(row);
+    if (index < 0) {
+      return;
     }
-    
-    .empty-state .subtitle {
-      color: var(--text-light);
-      font-size: 1em;
+    if (row.expanded) {
+      let end = index + 1;
+      while (end < this.rows.length && this.rows[end].depth > row.depth) {
+        end++;
+      }
+      row.children = this.rows.slice(index + 1, end);
+      this.spliceRows(index + 1, end - index - 1, []);
+      this.expandedPaths.delete(row.path);
+    } else {
+      this.spliceRows(index + 1, 0, row.children || [this.pendingRow(row.path, row.depth + 1, 0)]);
+      row.children = null;
+      this.expandedPaths.add(row.path);
     }
-    
-    .status-indicator {
-      position: fixed;
-      top: 24px;
-      right: 24px;
-      padding: 14px 24px;
-      border-radius: 12px;
-      font-size: 0.9em;
-      font-weight: 700;
-      background: white;
-      color: var(--success);
-      box-shadow: var(--shadow-lg);
-      opacity: 0;
-      transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-      z-index: 1000;
-      display: flex;
-      align-items: center;
-      gap: 8px;
-      border: 1px solid rgba(0, 0, 0, 0.08);
+    row.expanded = !row.expanded;
+    this.render();
+  }
+
+  render() {
+    if (!this.viewport) {
+      return;
     }
-    
-    .status-indicator.show {
-      opacity: 1;
-      transform: translateY(0);
+    const top = this.viewport.scrollTop;
+    const first = Math.max(0, Math.floor(top / TREE_ROW_HEIGHT) - TREE_OVERSCAN);
+    const last = Math.min(this.rows.length, Math.ceil((top + this.viewport.clientHeight) / TREE_ROW_HEIGHT) + TREE_OVERSCAN);
+    const html = [];
+    for (let i = first; i < last; i++) {
+      const row = this.rows[i];
+      if (row.kind === 'pending' && !row.loading) {
+        this.load(row);
+      }
+      html.push(this.rowHtml(row, i));
     }
-    
-    .status-indicator.online {
-      color: var(--success);
+    this.spacer.style.height = this.rows.length * TREE_ROW_HEIGHT + 'px';
+    this.spacer.innerHTML = html.join('');
+  }
+
+  rowHtml(row, index) {
+    const style = `top: ${index * TREE_ROW_HEIGHT}px; padding-left: ${row.depth * 20}px;`;
+    if (row.kind === 'pending') {
+      return `<div class="folder-file tree-row" style="${style}"><span class="tree-meta">Loading…</span></div>`;
     }
-    
-    .status-indicator.updated {
-      color: var(--primary);
+    if (row.kind === 'dir') {
+      return `<div class="folder-file tree-row tree-dir" data-index="${index}" style="${style}">` +
+        `<span class="toggle-icon${row.expanded ? ' expanded' : ''}">▶</span><span>📁</span>` +
+        `<span>${escapeHtml(row.name)}</span><span class="tree-meta">${row.files} files • ${formatBytes(row.size)}</span></div>`;
     }
-    
-    .status-dot {
-      width: 8px;
-      height: 8px;
-      border-radius: 50%;
-      background: currentColor;
-      animation: pulse-dot 2s ease-in-out infinite;
+    return `<div class="folder-file tree-row" style="${style}"><span>📄</span>` +
+      `<span>${escapeHtml(row.name)}</span><span class="tree-meta">${formatBytes(row.size)}</span></div>`;
+  }
+}
+
+function mountFolderTree(content) {
+  const folder = content.getAttribute('data-folder');
+  const version = content.getAttribute('data-version');
+  let tree = folderTrees.get(folder);
+  if (!tree || tree.version !== version) {
+    // The folder changed: load it again with the same directories open
+    tree = new FolderTree(folder, version, tree ? tree.expandedPaths : null);
+    folderTrees.set(folder, tree);
+  }
+  tree.mount(content);
+}
+
+function toggleItem(itemId) {
+  const content = document.getElementById('content-' + itemId);
+  const icon = document.getElementById('icon-' + itemId);
+
+  if (content && icon) {
+    content.classList.toggle('expanded');
+    icon.classList.toggle('expanded');
+
+    if (content.classList.contains('expanded')) {
+      expandedItems.add(itemId);
+      if (content.hasAttribute('data-folder')) {
+        mountFolderTree(content);
+      }
+    } else {
+      expandedItems.delete(itemId);
     }
-    
-    @keyframes pulse-dot {
-      0%, 100% { opacity: 1; transform: scale(1); }
-      50% { opacity: 0.6; transform: scale(1.3); }
+  }
+}
+
+function restoreExpandedState() {
+  expandedItems.forEach(itemId => {
+    const content = document.getElementById('content-' + itemId);
+    const icon = document.getElementById('icon-' + itemId);
+    if (content && icon) {
+      content.classList.add('expanded');
+      icon.classList.add('expanded');
+      if (content.hasAttribute('data-folder')) {
+        mountFolderTree(content);
+      }
     }
-    
-    .progress-bar {
-      display: none;
-      margin-top: 15px;
-      height: 6px;
-      background: rgba(0, 0, 0, 0.1);
-      border-radius: 10px;
-      overflow: hidden;
+  });
+}
+
+function updateCharCount(textarea) {
+  const counter = textarea.parentElement.querySelector('.char-counter');
+  if (counter) {
+    const count = textarea.value.length;
+    counter.textContent = count.toLocaleString() + ' characters';
+
+    if (count > 0) {
+      counter.style.color = 'var(--primary)';
+    } else {
+      counter.style.color = 'var(--text-light)';
     }
-    
-    .progress-bar.show {
-      display: block;
+  }
+}
+
+function handleFileSelect(input) {
+  const indicator = input.closest('.upload-area').querySelector('.file-selected-indicator');
+  // A new selection replaces a folder upload waiting for a retry
+  discardFolderUpload(input.form);
+  if (input.files && input.files.length > 0) {
+    if (indicator) {
+      const count = input.files.length;
+      indicator.textContent = `✓ ${count} file${count > 1 ? 's' : ''} selected`;
+      indicator.classList.add('show');
     }
-    
-    .progress-fill {
-      height: 100%;
-      background: linear-gradient(90deg, var(--primary) 0%, var(--secondary) 100%);
-      border-radius: 10px;
-      transition: width 0.3s ease;
-      animation: shimmer 2s infinite;
+  } else {
+    if (indicator) {
+      indicator.classList.remove('show');
     }
-    
-    @keyframes shimmer {
-      0% { background-position: -1000px 0; }
-      100% { background-position: 1000px 0; }
+  }
+}
+
+function showStatus(message, type = 'updated') {
+  const indicator = document.querySelector('.status-indicator');
+  if (indicator) {
+    indicator.innerHTML = `<span class="status-dot"></span><span>${message}</span>`;
+    indicator.className = 'status-indicator show ' + type;
+    setTimeout(() => {
+      indicator.classList.remove('show');
+    }, 3000);
+  }
+}
+
+function checkForUpdates() {
+  fetch('/check-updates?hash=' + currentHash)
+    .then(response => response.json())
+    .then(data => {
+      if (data.updated) {
+        currentHash = data.hash;
+        fetch(window.location.href)
+          .then(response => response.text())
+          .then(html => {
+            const parser = new DOMParser();
+            const doc = parser.parseFromString(html, 'text/html');
+            const newContent = doc.querySelector('.files-section');
+            const currentContent = document.querySelector('.files-section');
+            if (newContent && currentContent) {
+              currentContent.innerHTML = newContent.innerHTML;
+              restoreExpandedState();
+              restoreSelection();
+              showStatus('Content Updated', 'updated');
+            }
+          });
+      }
+    })
+    .catch(error => {
+      console.error('Error checking for updates:', error);
+    });
+}
+
+let searchTimer;
+
+function escapeHtml(text) {
+  const div = document.createElement('div');
+  div.textContent = text;
+  return div.innerHTML;
+}
+
+function runSearch(input) {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(() => {
+    const list = document.getElementById('search-results');
+    const query = input.value.trim();
+    if (!query) {
+      list.innerHTML = '';
+      return;
     }
-    
-    @keyframes fadeIn {
-      from { opacity: 0; }
-      to { opacity: 1; }
+    fetch('/search?q=' + encodeURIComponent(query))
+      .then(response => response.json())
+      .then(data => {
+        if (input.value.trim() !== query) {
+          return;
+        }
+        if (data.results.length === 0) {
+          list.innerHTML = '<li class="search-result">No matches</li>';
+          return;
+        }
+        list.innerHTML = data.results.map(result => {
+          const href = '/uploads/' + result.path.split('/').map(encodeURIComponent).join('/');
+          const icon = result.match === 'text' ? '📝' : '📄';
+          const snippet = result.snippet ? `<div class="snippet">${escapeHtml(result.snippet)}</div>` : '';
+          return `<li class="search-result">${icon} <a href="${href}">${escapeHtml(result.path)}</a>${snippet}</li>`;
+        }).join('');
+      })
+      .catch(error => {
+        console.error('Error searching:', error);
+      });
+  }, 200);
+}
+
+let selectedItems = new Set();
+
+function toggleSelection(checkbox) {
+  if (checkbox.checked) {
+    selectedItems.add(checkbox.value);
+  } else {
+    selectedItems.delete(checkbox.value);
+  }
+  updateBulkBar();
+}
+
+function restoreSelection() {
+  const present = new Set();
+  document.querySelectorAll('.select-item').forEach(checkbox => {
+    present.add(checkbox.value);
+    checkbox.checked = selectedItems.has(checkbox.value);
+  });
+  selectedItems.forEach(item => {
+    if (!present.has(item)) {
+      selectedItems.delete(item);
     }
-    
-    @keyframes fadeInUp {
-      from {
-        opacity: 0;
-        transform: translateY(30px);
-      }
-      to {
-        opacity: 1;
-        transform: translateY(0);
-      }
+  });
+  updateBulkBar();
+}
+
+function clearSelection() {
+  selectedItems.clear();
+  restoreSelection();
+}
+
+function updateBulkBar() {
+  const bar = document.getElementById('bulk-bar');
+  const count = selectedItems.size;
+  bar.querySelector('.count').textContent = `${count} item${count === 1 ? '' : 's'} selected`;
+  bar.classList.toggle('show', count > 0);
+}
+
+function submitBulk(action) {
+  const isDelete = action === '/bulk-delete';
+  if (isDelete && !confirm(`Delete ${selectedItems.size} selected item(s)?`)) {
+    return;
+  }
+  const form = document.createElement('form');
+  form.method = 'post';
+  form.action = action;
+  selectedItems.forEach(item => {
+    const input = document.createElement('input');
+    input.type = 'hidden';
+    input.name = 'items';
+    input.value = item;
+    form.appendChild(input);
+  });
+  if (isDelete) {
+    submitAjax(form, buildFormData(form)).then(clearSelection);
+    return;
+  }
+  document.body.appendChild(form);
+  form.submit();
+  form.remove();
+}
+
+function buildFormData(form) {
+  // Rebuild file fields so folder uploads keep their relative paths
+  const data = new FormData();
+  Array.from(form.elements).forEach(element => {
+    if (!element.name || element.disabled) {
+      return;
     }
-    
-    @keyframes fadeInDown {
-      from {
-        opacity: 0;
-        transform: translateY(-30px);
-      }
-      to {
-        opacity: 1;
-        transform: translateY(0);
-      }
+    if (element.type === 'file') {
+      Array.from(element.files).forEach(file => {
+        data.append(element.name, file, file.webkitRelativePath || file.name);
+      });
+    } else {
+      data.append(element.name, element.value);
     }
-    
-    @keyframes slideDown {
-      from {
-        opacity: 0;
-        max-height: 0;
-      }
-      to {
-        opacity: 1;
-        max-height: 1000px;
+  });
+  return data;
+}
+
+function shareItem(url) {
+  fetch(url, {method: 'POST', headers: {'Accept': 'application/json'}})
+    .then(response => response.json())
+    .then(data => {
+      if (navigator.clipboard && window.isSecureContext) {
+        return navigator.clipboard.writeText(data.url).then(() => showStatus('Share Link Copied', 'updated'));
       }
+      window.prompt('Share link', data.url);
+    })
+    .catch(() => showStatus('Could Not Share', 'error'));
+}
+
+function findByData(selector, attribute, value) {
+  return Array.from(document.querySelectorAll(selector)).find(el => el.getAttribute(attribute) === value);
+}
+
+function showEmptyState() {
+  const section = document.querySelector('.files-section');
+  if (!section.querySelector('.date-section')) {
+    section.innerHTML = `
+    <div class="empty-state">
+      <div class="icon">📂</div>
+      <div class="title">No Uploads Yet</div>
+      <div class="subtitle">Start by uploading your first file or text above</div>
+    </div>`;
+  }
+}
+
+function removeListItem(name) {
+  const item = findByData('.file-item', 'data-name', name);
+  if (!item) {
+    return;
+  }
+  const list = item.parentElement;
+  item.remove();
+  if (!list.querySelector('.file-item')) {
+    list.closest('.date-section').remove();
+    showEmptyState();
+  }
+}
+
+function insertListItem(entry) {
+  removeListItem(entry.name);
+
+  const filesSection = document.querySelector('.files-section');
+  let section = findByData('.date-section', 'data-day', String(entry.day));
+  if (!section) {
+    const emptyState = filesSection.querySelector(':scope > .empty-state');
+    if (emptyState) {
+      emptyState.remove();
     }
-    
-    @media (max-width: 768px) {
-      body {
-        padding: 12px;
-      }
-      
-      .header-title {
-        font-size: 1.8em;
-      }
-      
-      .header-subtitle {
-        font-size: 0.95em;
-      }
-      
-      .upload-container {
-        padding: 24px;
-      }
-      
-      .upload-tabs {
-        flex-wrap: wrap;
-      }
-      
-      .upload-tab {
-        flex: 1;
-        min-width: 100px;
-        font-size: 0.9em;
-        padding: 12px 16px;
-      }
-      
-      .upload-area {
-        padding: 40px 20px;
-      }
-      
-      .file-item {
-        flex-direction: column;
-        align-items: flex-start;
-        padding: 16px;
-      }
-      
-      .file-actions {
-        width: 100%;
-        justify-content: flex-end;
-      }
-      
-      .btn {
-        flex: 1;
-        font-size: 0.85em;
-        padding: 8px 14px;
+    section = document.createElement('div');
+    section.className = 'date-section';
+    section.setAttribute('data-day', entry.day);
+    section.innerHTML = `<div class="date-header"><span>📅</span><span>${escapeHtml(entry.date_label)}</span></div><ul class="file-list"></ul>`;
+    // Groups are ordered newest day first
+    const next = Array.from(filesSection.querySelectorAll('.date-section'))
+      .find(el => Number(el.getAttribute('data-day')) < entry.day);
+    filesSection.insertBefore(section, next || null);
+  }
+
+  const template = document.createElement('template');
+  template.innerHTML = entry.html.trim();
+  const item = template.content.firstElementChild;
+  const key = (el) => (el.getAttribute('data-kind') === 'folder' ? '0' : '1') + el.getAttribute('data-name');
+  const list = section.querySelector('.file-list');
+  const next = Array.from(list.children).find(el => key(el) > key(item));
+  list.insertBefore(item, next || null);
+}
+
+function applyChanges(data) {
+  data.removed.forEach(removeListItem);
+  data.created.forEach(insertListItem);
+  // Skip the next full refresh unless someone else changed things too
+  if (data.previous_hash === currentHash) {
+    currentHash = data.hash;
+  }
+  restoreExpandedState();
+  restoreSelection();
+}
+
+function submitAjax(form, body) {
+  const isUpload = !!form.closest('.upload-container');
+  const button = form.querySelector('button[type="submit"]');
+  if (button) {
+    button.disabled = true;
+  }
+  return fetch(form.action, {method: 'POST', body: body, headers: {'Accept': 'application/json'}})
+    .then(response => {
+      if (!response.ok) {
+        throw new Error('HTTP ' + response.status);
       }
-      
-      .status-indicator {
-        top: 12px;
-        right: 12px;
-        padding: 10px 16px;
-        font-size: 0.85em;
+      return response.json();
+    })
+    .then(data => {
+      applyChanges(data);
+      if (isUpload) {
+        form.reset();
+        form.querySelectorAll('.file-selected-indicator').forEach(el => el.classList.remove('show'));
+        const textarea = form.querySelector('textarea');
+        if (textarea) {
+          updateCharCount(textarea);
+        }
       }
-    }
-    
-    @media (prefers-reduced-motion: reduce) {
-      *, *::before, *::after {
-        animation-duration: 0.01ms !important;
-        animation-iteration-count: 1 !important;
-        transition-duration: 0.01ms !important;
+      if (data.failed && data.failed.length) {
+        showStatus(`${data.failed.length} item(s) could not be deleted`, 'error');
+      } else {
+        showStatus(isUpload ? 'Upload Complete' : 'Deleted', 'updated');
       }
-    }
-  </style>
-  <script>
-    let expandedItems = new Set();
-    let currentHash = '{{ current_hash }}';
-    let checkInterval;
-    let currentTab = 'text';
-    
-    function createParticles() {
-      const container = document.querySelector('.bg-particles');
-      const particleCount = 15;
-      
-      for (let i = 0; i < particleCount; i++) {
-        const particle = document.createElement('div');
-        particle.className = 'particle';
-        particle.style.width = Math.random() * 50 + 20 + 'px';
-        particle.style.height = particle.style.width;
-        particle.style.left = Math.random() * 100 + '%';
-        particle.style.top = Math.random() * 100 + '%';
-        particle.style.animationDelay = Math.random() * 20 + 's';
-        particle.style.animationDuration = (Math.random() * 10 + 15) + 's';
-        container.appendChild(particle);
+    })
+    .catch(error => {
+      console.error('Request failed:', error);
+      showStatus(error.message === 'HTTP 413' ? 'Too Large' : 'Request Failed', 'error');
+    })
+    .finally(() => {
+      if (button) {
+        button.disabled = false;
       }
-    }
-    
-    function switchTab(tabName) {
-      document.querySelectorAll('.upload-tab').forEach(tab => {
-        tab.classList.remove('active');
-      });
-      document.querySelectorAll('.upload-content').forEach(content => {
-        content.classList.remove('active');
+    });
+}
+
+const UPLOAD_STREAMS = 4;
+const UPLOAD_RETRIES = 3;
+
+function putFile(url, file, onProgress) {
+  return new Promise((resolve, reject) => {
+    const xhr = new XMLHttpRequest();
+    xhr.open('PUT', url);
+    xhr.upload.onprogress = (event) => onProgress(event.loaded);
+    xhr.onload = () => (xhr.status < 300 ? resolve() : reject(new Error('HTTP ' + xhr.status)));
+    xhr.onerror = () => reject(new Error('Network error'));
+    xhr.send(file);
+  });
+}
+
+// Folder uploads left with failed files, kept so they can be retried
+const folderUploads = new WeakMap();
+
+function setFolderUploadPending(form, pending) {
+  const button = form.querySelector('button[type="submit"]');
+  button.dataset.label = button.dataset.label || button.textContent;
+  button.textContent = pending ? '🔁 Retry Failed Files' : button.dataset.label;
+  form.querySelector('.upload-cancel').classList.toggle('show', pending);
+}
+
+function discardFolderUpload(form) {
+  const pending = folderUploads.get(form);
+  if (pending) {
+    folderUploads.delete(form);
+    setFolderUploadPending(form, false);
+    fetch(`/upload-sessions/${pending.session}`, {method: 'DELETE'});
+  }
+}
+
+function cancelFolderUpload(form) {
+  discardFolderUpload(form);
+  form.reset();
+  form.querySelectorAll('.file-selected-indicator').forEach(el => el.classList.remove('show'));
+  showStatus('Upload Cancelled', 'updated');
+}
+
+async function uploadFolderPipelined(form) {
+  const input = form.querySelector('input[type="file"]');
+  const files = Array.from(input.files);
+  const progress = form.querySelector('.upload-progress');
+  const button = form.querySelector('button[type="submit"]');
+  const paths = files.map(file => file.webkitRelativePath || file.name);
+  const totalBytes = files.reduce((sum, file) => sum + file.size, 0) || 1;
+  let pending = folderUploads.get(form);
+  const todo = pending ? pending.failed : files.map((file, index) => index);
+  const loaded = files.map(file => file.size);
+  todo.forEach(index => { loaded[index] = 0; });
+  let done = files.length - todo.length;
+  const failedIndexes = [];
+  let failed = 0;
+
+  const render = () => {
+    const sent = loaded.reduce((sum, bytes) => sum + bytes, 0);
+    progress.querySelector('.bar').style.width = (100 * sent / totalBytes).toFixed(1) + '%';
+    progress.querySelector('.label').textContent =
+      `${done} / ${files.length} files • ${formatBytes(sent)} of ${formatBytes(totalBytes)}` + (failed ? ` • ${failed} failed` : '');
+  };
+
+  button.disabled = true;
+  progress.classList.add('show');
+  render();
+  try {
+    if (!pending) {
+      const response = await fetch('/upload-sessions', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+        body: JSON.stringify({paths: paths})
       });
-      
-      document.getElementById('tab-' + tabName).classList.add('active');
-      document.getElementById('content-' + tabName).classList.add('active');
-      currentTab = tabName;
-    }
-    
-    function toggleItem(itemId) {
-      const content = document.getElementById('content-' + itemId);
-      const icon = document.getElementById('icon-' + itemId);
-      
-      if (content && icon) {
-        content.classList.toggle('expanded');
-        icon.classList.toggle('expanded');
-        
-        if (content.classList.contains('expanded')) {
-          expandedItems.add(itemId);
-        } else {
-          expandedItems.delete(itemId);
-        }
+      if (!response.ok) {
+        throw new Error('HTTP ' + response.status);
       }
+      pending = {session: (await response.json()).session, failed: todo};
+      folderUploads.set(form, pending);
     }
-    
-    function restoreExpandedState() {
-      expandedItems.forEach(itemId => {
-        const content = document.getElementById('content-' + itemId);
-        const icon = document.getElementById('icon-' + itemId);
-        if (content && icon) {
-          content.classList.add('expanded');
-          icon.classList.add('expanded');
-        }
-      });
-    }
-    
-    function updateCharCount(textarea) {
-      const counter = textarea.parentElement.querySelector('.char-counter');
-      if (counter) {
-        const count = textarea.value.length;
-        counter.textContent = count.toLocaleString() + ' characters';
-        
-        if (count > 0) {
-          counter.style.color = 'var(--primary)';
-        } else {
-          counter.style.color = 'var(--text-light)';
+
+    let next = 0;
+    const worker = async () => {
+      while (next < todo.length) {
+        const index = todo[next++];
+        const url = `/upload-sessions/${pending.session}/files/` + paths[index].split('/').map(encodeURIComponent).join('/');
+        for (let attempt = 1; ; attempt++) {
+          try {
+            await putFile(url, files[index], (bytes) => { loaded[index] = bytes; render(); });
+            loaded[index] = files[index].size;
+            done++;
+            break;
+          } catch (error) {
+            loaded[index] = 0;
+            if (attempt >= UPLOAD_RETRIES) {
+              console.error('Giving up on ' + paths[index], error);
+              failedIndexes.push(index);
+              failed++;
+              break;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+          }
         }
+        render();
       }
-    }
-    
-    function handleFileSelect(input) {
-      const indicator = input.closest('.upload-area').querySelector('.file-selected-indicator');
-      if (input.files && input.files.length > 0) {
-        if (indicator) {
-          const count = input.files.length;
-          indicator.textContent = `✓ ${count} file${count > 1 ? 's' : ''} selected`;
-          indicator.classList.add('show');
-        }
+    };
+    await Promise.all(Array.from({length: Math.min(UPLOAD_STREAMS, todo.length)}, worker));
+
+    // The folder is only published once every file has arrived
+    let missing = failedIndexes;
+    if (!failed) {
+      const completed = await fetch(`/upload-sessions/${pending.session}/complete`, {
+        method: 'POST',
+        headers: {'Accept': 'application/json'}
+      });
+      if (completed.status === 409) {
+        const needed = new Set((await completed.json()).needed);
+        missing = files.map((file, index) => index).filter(index => needed.has(paths[index]));
+      } else if (!completed.ok) {
+        throw new Error('HTTP ' + completed.status);
       } else {
-        if (indicator) {
-          indicator.classList.remove('show');
-        }
+        folderUploads.delete(form);
+        setFolderUploadPending(form, false);
+        applyChanges(await completed.json());
+        form.reset();
+        form.querySelectorAll('.file-selected-indicator').forEach(el => el.classList.remove('show'));
+        showStatus('Upload Complete', 'updated');
+        return;
       }
     }
-    
-    function showStatus(message, type = 'updated') {
-      const indicator = document.querySelector('.status-indicator');
-      if (indicator) {
-        indicator.innerHTML = `<span class="status-dot"></span><span>${message}</span>`;
-        indicator.className = 'status-indicator show ' + type;
-        setTimeout(() => {
-          indicator.classList.remove('show');
-        }, 3000);
-      }
+    pending.failed = missing;
+    setFolderUploadPending(form, true);
+    showStatus(`${missing.length} file(s) failed to upload, upload again to retry them`, 'error');
+  } catch (error) {
+    console.error('Upload failed:', error);
+    if (pending) {
+      setFolderUploadPending(form, true);
     }
-    
-    function checkForUpdates() {
-      fetch('/check-updates?hash=' + currentHash)
-        .then(response => response.json())
-        .then(data => {
-          if (data.updated) {
-            currentHash = data.hash;
-            fetch(window.location.href)
-              .then(response => response.text())
-              .then(html => {
-                const parser = new DOMParser();
-                const doc = parser.parseFromString(html, 'text/html');
-                const newContent = doc.querySelector('.files-section');
-                const currentContent = document.querySelector('.files-section');
-                if (newContent && currentContent) {
-                  currentContent.innerHTML = newContent.innerHTML;
-                  restoreExpandedState();
-                  showStatus('Content Updated', 'updated');
-                }
-              });
-          }
-        })
-        .catch(error => {
-          console.error('Error checking for updates:', error);
-        });
+    showStatus('Upload Failed', 'error');
+  } finally {
+    button.disabled = false;
+    setTimeout(() => progress.classList.remove('show'), 2000);
+  }
+}
+
+function formatBytes(bytes) {
+  const units = ['B', 'KB', 'MB', 'GB'];
+  let i = 0;
+  while (bytes >= 1024 && i < units.length - 1) {
+    bytes /= 1024;
+    i++;
+  }
+  return bytes.toFixed(1) + ' ' + units[i];
+}
+
+function setupAjaxForms() {
+  document.addEventListener('submit', function(event) {
+    const form = event.target;
+    // Forms cancelled by their confirm() dialog arrive here already prevented
+    if (!form.hasAttribute('data-ajax') || event.defaultPrevented) {
+      return;
     }
-    
-    function setupDragDrop() {
-      const uploadAreas = document.querySelectorAll('.upload-area');
-      
-      uploadAreas.forEach(area => {
-        area.addEventListener('dragover', (e) => {
-          e.preventDefault();
-          area.classList.add('dragover');
-        });
-        
-        area.addEventListener('dragleave', () => {
-          area.classList.remove('dragover');
-        });
-        
-        area.addEventListener('drop', (e) => {
-          e.preventDefault();
-          area.classList.remove('dragover');
-          
-          const input = area.querySelector('input[type="file"]');
-          if (input && e.dataTransfer.files.length > 0) {
-            input.files = e.dataTransfer.files;
-            handleFileSelect(input);
-          }
-        });
-        
-        const input = area.querySelector('input[type="file"]');
-        if (input) {
-          input.addEventListener('change', () => handleFileSelect(input));
-        }
-      });
+    event.preventDefault();
+    if (form.hasAttribute('data-pipelined')) {
+      uploadFolderPipelined(form);
+    } else {
+      submitAjax(form, buildFormData(form));
     }
-    
-    document.addEventListener('DOMContentLoaded', function() {
-      createParticles();
-      switchTab(currentTab);
-      setupDragDrop();
-      checkInterval = setInterval(checkForUpdates, 2000);
-      showStatus('Online', 'online');
+  });
+}
+
+function setupDragDrop() {
+  const uploadAreas = document.querySelectorAll('.upload-area');
+
+  uploadAreas.forEach(area => {
+    area.addEventListener('dragover', (e) => {
+      e.preventDefault();
+      area.classList.add('dragover');
     });
-    
-    window.addEventListener('beforeunload', function() {
-      if (checkInterval) {
-        clearInterval(checkInterval);
+
+    area.addEventListener('dragleave', () => {
+      area.classList.remove('dragover');
+    });
+
+    area.addEventListener('drop', (e) => {
+      e.preventDefault();
+      area.classList.remove('dragover');
+
+      const input = area.querySelector('input[type="file"]');
+      if (input && e.dataTransfer.files.length > 0) {
+        input.files = e.dataTransfer.files;
+        handleFileSelect(input);
       }
     });
-  </script>
+
+    const input = area.querySelector('input[type="file"]');
+    if (input) {
+      input.addEventListener('change', () => handleFileSelect(input));
+    }
+  });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+  createParticles();
+  switchTab(currentTab);
+  setupDragDrop();
+  setupAjaxForms();
+  checkInterval = setInterval(checkForUpdates, 2000);
+  showStatus('Online', 'online');
+});
+
+window.addEventListener('beforeunload', function() {
+  if (checkInterval) {
+    clearInterval(checkInterval);
+  }
+});
+'''
+
+
+HTML = '''<!doctype html>
+<html><head>
+  <title>Southern IoT - File Sharing Platform</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap" rel="stylesheet">
+  <link rel="stylesheet" href="{{ url_for('asset', name=assets['app.css']) }}">
+  <script>let currentHash = '{{ current_hash }}';</script>
+  <script src="{{ url_for('asset', name=assets['app.js']) }}"></script>
 </head>
 <body>
   <div class="bg-particles"></div>
@@ -1219,7 +4500,7 @@ HTML = '''<!doctype html>
       
       <!-- Text Upload -->
       <div class="upload-content active" id="content-text">
-        <form method="post" enctype="multipart/form-data" action="{{ url_for('upload_text') }}">
+        <form method="post" enctype="multipart/form-data" action="{{ url_for('upload_text') }}" data-ajax>
           <div class="form-group">
             <label class="form-label" for="text-title">
               <span>✏️</span> Title (Optional)
@@ -1241,7 +4522,7 @@ HTML = '''<!doctype html>
       
       <!-- Files Upload -->
       <div class="upload-content" id="content-files">
-        <form method="post" enctype="multipart/form-data" action="{{ url_for('upload_files') }}">
+        <form method="post" enctype="multipart/form-data" action="{{ url_for('upload_files') }}" data-ajax>
           <div class="upload-area">
             <div class="icon">📁</div>
             <div class="title">Drag & Drop Files Here</div>
@@ -1255,7 +4536,7 @@ HTML = '''<!doctype html>
       
       <!-- Folder Upload -->
       <div class="upload-content" id="content-folder">
-        <form method="post" enctype="multipart/form-data" action="{{ url_for('upload_folder') }}">
+        <form method="post" enctype="multipart/form-data" action="{{ url_for('upload_folder') }}" data-ajax data-pipelined>
           <div class="upload-area">
             <div class="icon">📂</div>
             <div class="title">Drag & Drop a Folder Here</div>
@@ -1263,85 +4544,44 @@ HTML = '''<!doctype html>
             <input type="file" name="files" webkitdirectory directory multiple required>
             <div class="file-selected-indicator"></div>
           </div>
+          <div class="upload-progress"><div class="bar"></div><span class="label"></span></div>
           <button type="submit" class="btn-primary">📤 Upload Complete Folder</button>
+          <button type="button" class="btn btn-delete upload-cancel" onclick="cancelFolderUpload(this.form)">✖ Cancel Upload</button>
         </form>
       </div>
     </div>
     
+    <div class="search-container">
+      <input type="search" class="form-input" placeholder="🔍 Search file names, folder contents and texts..." oninput="runSearch(this)" aria-label="Search uploads">
+      <ul class="search-results" id="search-results"></ul>
+    </div>
+    
+    <div class="bulk-bar" id="bulk-bar">
+      <span class="count">0 items selected</span>
+      <button class="btn btn-download" onclick="submitBulk('{{ url_for('bulk_download') }}')">⬇ Download Selected</button>
+      <button class="btn btn-delete" onclick="submitBulk('{{ url_for('bulk_delete') }}')">🗑 Delete Selected</button>
+      <button class="btn" onclick="clearSelection()">✕ Clear</button>
+    </div>
+    
     <div class="files-section">
       {% if date_groups %}
-        {% for date_label in date_groups_sorted %}
-          {% set date_data = date_groups[date_label] %}
-          <div class="date-section">
+        {% for day, date_data in date_groups %}
+          <div class="date-section" data-day="{{ day }}">
             <div class="date-header">
               <span>📅</span>
-              <span>{{ date_label }}</span>
+              <span>{{ day_label(day) }}</span>
             </div>
             
             {% if date_data.folders or date_data.files %}
               <ul class="file-list">
                 <!-- Folders -->
-                {% for folder_name, folder_files in date_data.folders.items() %}
-                <li class="file-item folder">
-                  <div class="file-icon">📁</div>
-                  <div class="file-info">
-                    <div class="file-name" onclick="toggleItem('folder-{{ date_label }}-{{ loop.index }}')">
-                      <span class="toggle-icon" id="icon-folder-{{ date_label }}-{{ loop.index }}">▶</span>
-                      <span>{{ folder_name }}</span>
-                    </div>
-                    <div class="file-meta">{{ folder_files|length }} files inside</div>
-                    <div class="folder-contents" id="content-folder-{{ date_label }}-{{ loop.index }}">
-                      {% for file in folder_files %}
-                      <div class="folder-file">
-                        <span>📄</span>
-                        <span>{{ file }}</span>
-                      </div>
-                      {% endfor %}
-                    </div>
-                  </div>
-                  <div class="file-actions">
-                    <form method="get" action="{{ url_for('download_folder', folder_name=folder_name) }}" style="display: inline;">
-                      <button type="submit" class="btn btn-download">⬇ Download</button>
-                    </form>
-                    <form method="post" action="{{ url_for('delete_folder', folder_name=folder_name) }}" onsubmit="return confirm('Delete folder \'{{ folder_name }}\' and all its contents?');" style="display: inline;">
-                      <button type="submit" class="btn btn-delete">🗑 Delete</button>
-                    </form>
-                  </div>
-                </li>
+                {% for folder_name, folder in date_data.folders.items() %}
+                {{ items.folder_item(folder_name, folder) }}
                 {% endfor %}
                 
                 <!-- Files -->
                 {% for filename in date_data.files %}
-                <li class="file-item {% if filename.endswith('.txt') %}text{% endif %}">
-                  <div class="file-icon">
-                    {% if filename.endswith('.txt') %}📝{% else %}📄{% endif %}
-                  </div>
-                  <div class="file-info">
-                    {% if filename.endswith('.txt') %}
-                    <div class="file-name" onclick="toggleItem('text-{{ date_label }}-{{ loop.index }}')">
-                      <span class="toggle-icon" id="icon-text-{{ date_label }}-{{ loop.index }}">▶</span>
-                      <span>{{ filename }}</span>
-                    </div>
-                    <div class="file-meta">Text Document • {{ get_file_size(filename) }}</div>
-                    <div class="text-preview" id="content-text-{{ date_label }}-{{ loop.index }}">{{ get_text_preview(filename) }}</div>
-                    {% else %}
-                    <a href="{{ url_for('uploaded_file', filename=filename) }}" style="text-decoration: none; color: inherit;">
-                      <div class="file-name">{{ filename }}</div>
-                    </a>
-                    <div class="file-meta">File • {{ get_file_size(filename) }}</div>
-                    {% endif %}
-                  </div>
-                  <div class="file-actions">
-                    {% if filename.endswith('.txt') %}
-                    <a href="{{ url_for('uploaded_file', filename=filename) }}" download style="text-decoration: none;">
-                      <button class="btn btn-download">⬇ Download</button>
-                    </a>
-                    {% endif %}
-                    <form method="post" action="{{ url_for('delete_file', filename=filename) }}" onsubmit="return confirm('Delete \'{{ filename }}\'?');" style="display: inline;">
-                      <button type="submit" class="btn btn-delete">🗑 Delete</button>
-                    </form>
-                  </div>
-                </li>
+                {{ items.file_item(filename) }}
                 {% endfor %}
               </ul>
             {% else %}
@@ -1365,52 +4605,779 @@ HTML = '''<!doctype html>
 </html>'''
 
 
+def build_assets(sources):
+    """Fingerprint static assets and precompress them
+    
+    Returns ({logical name: fingerprinted name}, {fingerprinted name: asset}).
+    """
+    names = {}
+    assets = {}
+    for name, (body, mimetype) in sources.items():
+        body = body.encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        asset = {'identity': body, 'mimetype': mimetype, 'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            asset['br'] = brotli.compress(body, quality=11)
+        names[name] = hashed
+        assets[hashed] = asset
+    return names, assets
+
+
+ASSET_NAMES, ASSETS = build_assets({
+    'app.css': (APP_CSS, 'text/css'),
+    'app.js': (APP_JS, 'text/javascript'),
+})
+# Dynamic responses are compressed on the fly; these mimetypes are worth it
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/plain', 'text/css', 'text/javascript'}
+
+
+def preferred_encoding(available):
+    """Pick the best content coding the client accepts out of `available`"""
+    for encoding in ('br', 'gzip'):
+        if encoding in available and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+# Markup of a single listing entry, shared by the full page and the JSON
+# responses of the upload and delete routes
+ITEM_HTML = '''{% macro folder_item(folder_name, folder) %}
+{% set id = item_id(folder_name) %}
+<li class="file-item folder" data-name="{{ folder_name }}" data-kind="folder">
+  <input type="checkbox" class="select-item" value="{{ folder_name }}" onchange="toggleSelection(this)" aria-label="Select {{ folder_name }}">
+  <div class="file-icon">📁</div>
+  <div class="file-info">
+    <div class="file-name" onclick="toggleItem('folder-{{ id }}')">
+      <span class="toggle-icon" id="icon-folder-{{ id }}">▶</span>
+      <span>{{ folder_name }}</span>
+    </div>
+    <div class="file-meta">{{ folder.count }} files inside • {{ format_file_size(folder.size) }}</div>
+    <div class="folder-contents" id="content-folder-{{ id }}" data-folder="{{ folder_name }}" data-version="{{ folder.mtime }}:{{ folder.count }}:{{ folder.size }}"></div>
+  </div>
+  <div class="file-actions">
+    <form method="get" action="{{ url_for('download_folder', folder_name=folder_name) }}" style="display: inline;">
+      <button type="submit" class="btn btn-download">⬇ Download</button>
+    </form>
+    <form method="post" action="{{ url_for('delete_folder', folder_name=folder_name) }}" data-ajax onsubmit="return confirm('Delete folder \'{{ folder_name }}\' and all its contents?');" style="display: inline;">
+      <button type="submit" class="btn btn-delete">🗑 Delete</button>
+    </form>
+  </div>
+</li>
+{% endmacro %}
+
+{% macro file_item(filename) %}
+{% set id = item_id(filename) %}
+<li class="file-item {% if filename.endswith('.txt') %}text{% endif %}" data-name="{{ filename }}" data-kind="file">
+  <input type="checkbox" class="select-item" value="{{ filename }}" onchange="toggleSelection(this)" aria-label="Select {{ filename }}">
+  <div class="file-icon">
+    {% if filename.endswith('.txt') %}📝{% elif thumbnail_supported(filename) %}<img class="thumbnail" src="{{ url_for('thumbnail', filename=filename) }}" loading="lazy" alt="" onerror="this.replaceWith('📄')">{% else %}📄{% endif %}
+  </div>
+  <div class="file-info">
+    {% if filename.endswith('.txt') %}
+    <div class="file-name" onclick="toggleItem('text-{{ id }}')">
+      <span class="toggle-icon" id="icon-text-{{ id }}">▶</span>
+      <span>{{ filename }}</span>
+    </div>
+    <div class="file-meta">Text Document • {{ get_file_size(filename) }}</div>
+    <div class="text-preview" id="content-text-{{ id }}">{{ get_text_preview(filename) }}</div>
+    {% else %}
+    <a href="{{ url_for('uploaded_file', filename=filename) }}" style="text-decoration: none; color: inherit;">
+      <div class="file-name">{{ filename }}</div>
+    </a>
+    <div class="file-meta">File • {{ get_file_size(filename) }}</div>
+    {% endif %}
+  </div>
+  <div class="file-actions">
+    {% if filename.endswith('.txt') %}
+    <a href="{{ url_for('uploaded_file', filename=filename) }}" download style="text-decoration: none;">
+      <button class="btn btn-download">⬇ Download</button>
+    </a>
+    {% endif %}
+    <button type="button" class="btn btn-share" data-url="{{ url_for('share', filename=filename) }}" onclick="shareItem(this.dataset.url)">🔗 Share</button>
+    <form method="post" action="{{ url_for('delete_file', filename=filename) }}" data-ajax onsubmit="return confirm('Delete \'{{ filename }}\'?');" style="display: inline;">
+      <button type="submit" class="btn btn-delete">🗑 Delete</button>
+    </form>
+  </div>
+</li>
+{% endmacro %}'''
+
+
+# Names handed out to uploads that are still being written. With the
+# catalog this tells whether a name is taken without touching the disk, and
+# reserving under one lock means concurrent uploads never get the same
+# name. The next counter to try is remembered per name, so a run of
+# duplicates does not probe every earlier one again.
+reserved_names = set()
+name_counters = {}
+names_lock = threading.RLock()
+MAX_NAME_COUNTERS = 10000
+
+
+def name_taken(name):
+    return name in reserved_names or name in catalog
+
+
+def reserve_name(base_name, ext=''):
+    """Reserve the first free top level name of base_name{ext}, base_name_1{ext}, ...
+    
+    Release it with release_name() once the upload is in the catalog.
+    """
+    ensure_catalog()
+    with names_lock:
+        name = base_name + ext
+        if name_taken(name):
+            counter = name_counters.get(name, 1)
+            while name_taken(f"{base_name}_{counter}{ext}"):
+                counter += 1
+            if len(name_counters) >= MAX_NAME_COUNTERS:
+                name_counters.clear()
+            name_counters[name] = counter + 1
+            name = f"{base_name}_{counter}{ext}"
+        reserved_names.add(name)
+        return name
+
+
+def release_name(name):
+    with names_lock:
+        reserved_names.discard(name)
+
+
 def generate_unique_folder_name(base_name):
-    """Generate a unique folder name by appending timestamp if needed"""
-    folder_path = os.path.join(UPLOAD_FOLDER, base_name)
-    if not os.path.exists(folder_path):
-        return base_name
+    """Reserve a folder name, appending a timestamp if it is taken"""
+    ensure_catalog()
+    with names_lock:
+        if not name_taken(base_name):
+            reserved_names.add(base_name)
+            return base_name
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return reserve_name(f"{base_name}_{timestamp}")
+
+
+def item_id(name):
+    """Stable id for a listing entry's DOM elements"""
+    return hashlib.md5(name.encode()).hexdigest()[:12]
+
+
+_item_macros = None
+
+
+def item_macros():
+    """Get the Jinja macros rendering single listing entries"""
+    global _item_macros
+    if _item_macros is None:
+        template = app.jinja_env.from_string(ITEM_HTML, globals={
+            'item_id': item_id,
+            'get_text_preview': get_text_preview,
+            'get_file_size': get_file_size,
+            'thumbnail_supported': thumbnail_supported,
+            'format_file_size': format_file_size,
+        })
+        _item_macros = template.module
+    return _item_macros
+
+
+def wants_json():
+    """Check if the client asked for a JSON answer instead of a redirect"""
+    accept = request.accept_mimetypes
+    return accept['application/json'] > accept['text/html']
+
+
+def mutation_response(names, previous_hash, failed=None):
+    """Answer an upload or delete: a redirect for plain forms, JSON for fetch
+    
+    The JSON lists each changed item either as created (with its rendered
+    listing entry) or as removed, plus the catalog version afterwards and
+    the items in `failed`, if given.
+    """
+    if not wants_json():
+        return redirect(url_for('index'))
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"{base_name}_{timestamp}"
+    created = []
+    removed = []
+    with catalog_lock:
+        for name in sorted({name.replace('\\', '/').split('/')[0] for name in names}):
+            entry = catalog.get(name)
+            if entry is None:
+                removed.append(name)
+            elif entry['kind'] == 'folder':
+                created.append({'name': name, 'kind': 'folder', 'files': len(entry['files']),
+                                'size': entry['size'],
+                                'day': entry['date'].toordinal(),
+                                'date_label': day_label(entry['date'].toordinal()),
+                                'html': str(item_macros().folder_item(name, folder_summary(entry)))})
+            else:
+                created.append({'name': name, 'kind': 'file',
+                                'day': entry['date'].toordinal(),
+                                'date_label': day_label(entry['date'].toordinal()),
+                                'html': str(item_macros().file_item(name))})
+    data = {
+        'created': created,
+        'removed': removed,
+        'version': current_version(),
+        'hash': get_folder_hash(),
+        'previous_hash': previous_hash,
+        'jobs': g.get('jobs', []),
+    }
+    if failed is not None:
+        data['failed'] = failed
+    return jsonify(data)
+
+
+def folder_upload_target(paths):
+    """Decide where a folder upload goes from the relative paths of its files
+    
+    Returns (folder_name, prefix). A single root folder keeps its own name
+    and the paths are used as they are (prefix None); several roots are
+    gathered under a new Multiple_Folders_* folder used as prefix, whose
+    name stays reserved until released with release_name().
+    """
+    root_folders = []
+    for path in paths:
+        parts = path.replace('\\', '/').split('/')
+        if len(parts) > 1 and parts[0] not in root_folders:
+            root_folders.append(parts[0])
+    
+    if len(root_folders) == 1:
+        return root_folders[0], None
+    
+    first_folder = root_folders[0] if root_folders else "upload"
+    folder_name = generate_unique_folder_name(f"Multiple_Folders_{first_folder}")
+    return folder_name, folder_name
+
+
+def folder_upload_path(prefix, rel_path):
+    """Get the path on disk for one file of a folder upload"""
+    rel_path = rel_path.replace('\\', '/')
+    if prefix is None:
+        return new_item_path(rel_path)
+    return os.path.join(new_item_path(prefix), rel_path)
+
+
+# Text previews and line views only read the lines they show: plain files
+# are memory mapped and files compressed at rest are streamed. To find a
+# line without reading everything before it, a sparse index with the
+# offset of the first line after every LINE_INDEX_STEP bytes is built the
+# first time a file is viewed and kept for the most recently viewed files.
+PREVIEW_LINES = 200
+PREVIEW_BYTES = 64 * 1024
+MAX_VIEW_LINES = 5000
+MAX_VIEW_BYTES = 1024 * 1024
+LINE_INDEX_STEP = 256 * 1024
+LINE_INDEX_CACHE_SIZE = 64
+line_indexes = {}
+line_indexes_lock = threading.Lock()
+
+
+class MappedLines:
+    """Line reader over a memory mapped file, only copying the lines read"""
+    
+    def __init__(self, mm, offset):
+        self.mm = mm
+        self.pos = offset
+    
+    def readline(self, limit):
+        end = self.mm.find(b'\n', self.pos, self.pos + limit)
+        end = min(self.pos + limit, len(self.mm)) if end < 0 else end + 1
+        line = self.mm[self.pos:end]
+        self.pos = end
+        return line
+
+
+@contextmanager
+def open_lines(path, offset=0):
+    """Open a text upload at byte `offset` of its original content for readline(limit)"""
+    encoding, size = stored_encoding(path)
+    if encoding is None:
+        if size == 0:
+            yield BytesIO()
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield MappedLines(mm, offset)
+        return
+    with open_upload(path) as f:
+        f.seek(offset)
+        yield f if encoding == 'gzip' else BufferedReader(f)
+
+
+def read_lines(f, count, max_bytes):
+    """Read up to `count` lines and `max_bytes` bytes, return (lines, whether cut short)"""
+    lines = []
+    used = 0
+    while len(lines) < count:
+        if used >= max_bytes:
+            return lines, True
+        data = f.readline(max_bytes - used)
+        if not data:
+            break
+        used += len(data)
+        lines.append(data.rstrip(b'\r\n').decode('utf-8', 'replace'))
+    return lines, False
+
+
+def skip_lines(f, count):
+    for _ in range(count):
+        while True:
+            data = f.readline(CHUNK_SIZE)
+            if not data:
+                return
+            if data.endswith(b'\n'):
+                break
+
+
+def build_line_index(path, state=None):
+    """Scan a text upload, return ((line numbers, offsets, line count), scan state)
+    
+    The two lists hold the checkpoints of the sparse index: the number and
+    offset of the first line starting after each LINE_INDEX_STEP bytes.
+    Given the state of an earlier scan, only the bytes after it are read.
+    """
+    numbers, offsets, newlines, offset, mark, last = state or ([0], [0], 0, 0, LINE_INDEX_STEP, b'')
+    numbers = list(numbers)
+    offsets = list(offsets)
+    with open_upload(path) as f:
+        f.seek(offset)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            end = offset + len(chunk)
+            while mark < end:
+                pos = chunk.find(b'\n', mark - offset)
+                if pos < 0:
+                    mark = end
+                    break
+                numbers.append(newlines + chunk.count(b'\n', 0, pos + 1))
+                offsets.append(offset + pos + 1)
+                mark = offset + pos + 1 + LINE_INDEX_STEP
+            newlines += chunk.count(b'\n')
+            offset = end
+            last = chunk[-1:]
+    lines = newlines + 1 if last and last != b'\n' else newlines
+    return (numbers, offsets, lines), (numbers, offsets, newlines, offset, mark, last)
+
+
+def cache_line_index(path, key, index, state):
+    with line_indexes_lock:
+        line_indexes.pop(path, None)
+        line_indexes[path] = (key, index, state)
+        while len(line_indexes) > LINE_INDEX_CACHE_SIZE:
+            del line_indexes[next(iter(line_indexes))]
+
+
+def line_index(path):
+    """Get the sparse line index of a text upload, building it if needed"""
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime_ns)
+    with line_indexes_lock:
+        cached = line_indexes.pop(path, None)
+        if cached and cached[0] == key:
+            line_indexes[path] = cached
+            return cached[1]
+    
+    index, state = build_line_index(path)
+    cache_line_index(path, key, index, state)
+    return index
+
+
+def extend_line_index(path, key):
+    """Carry the cached line index of a text upload, built for stat `key`, over an append"""
+    with line_indexes_lock:
+        cached = line_indexes.get(path)
+    if not cached or cached[0] != key:
+        return
+    st = os.stat(path)
+    index, state = build_line_index(path, cached[2])
+    cache_line_index(path, (st.st_size, st.st_mtime_ns), index, state)
+
+
+def text_window(path, first, count):
+    """Read `count` lines of a text upload from line `first` (counting from 0)"""
+    numbers, offsets, total = line_index(path)
+    first = max(0, min(first, total))
+    count = max(0, min(count, MAX_VIEW_LINES, total - first))
+    checkpoint = bisect.bisect_right(numbers, first) - 1
+    with open_lines(path, offsets[checkpoint]) as f:
+        skip_lines(f, first - numbers[checkpoint])
+        lines, truncated = read_lines(f, count, MAX_VIEW_BYTES)
+    return {'start': first + 1, 'end': first + len(lines), 'total': total,
+            'lines': lines, 'truncated': truncated}
+
+
+# Text uploads can be appended to, e.g. to share a running build log, and
+# followed as they grow. An append updates the file's catalog entry in
+# place without bumping the catalog version, so open pages are not
+# reloaded for every line; followers are woken through text_appended.
+# The body is spooled to a temporary file first, so only appends to the
+# same file wait for each other, and only while the bytes are copied.
+FOLLOW_BACKLOG = 16 * 1024
+FOLLOW_POLL_INTERVAL = 1.0
+FOLLOW_KEEPALIVE = 15
+append_locks = {}
+append_lock = threading.Lock()
+text_appended = threading.Condition()
+append_count = 0
+
+
+@contextmanager
+def file_append_lock(name):
+    """Hold the append lock of one upload, shared by the appends waiting for it"""
+    with append_lock:
+        lock, users = append_locks.get(name, (None, 0))
+        lock = lock or threading.Lock()
+        append_locks[name] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with append_lock:
+            lock, users = append_locks[name]
+            if users == 1:
+                del append_locks[name]
+            else:
+                append_locks[name] = (lock, users - 1)
+
+
+def append_text(name, stream):
+    """Append a stream to a top level text upload, return its new size
+    
+    Aborts with 413, leaving the upload as it was, once more than
+    TEXT_MAX_BYTES have been sent.
+    """
+    global append_count
+    file_path = item_path(name)
+    spool, spool_path = create_temp(os.path.dirname(file_path))
+    try:
+        written = 0
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                written += len(chunk)
+                if written > TEXT_MAX_BYTES:
+                    abort(413)
+                spool.write(chunk)
+        finally:
+            spool.close()
+        
+        with file_append_lock(name):
+            try:
+                st = os.stat(file_path)
+            except FileNotFoundError:
+                abort(404)
+            if stored_encoding(file_path)[0] or st.st_nlink > 1:
+                # Compressed at rest: keep it plain from now on so it can grow.
+                # Content shared with a synced folder gets a copy of its own.
+                f, temp_path = create_temp(os.path.dirname(file_path))
+                with open_upload(file_path) as src:
+                    shutil.copyfileobj(src, f, CHUNK_SIZE)
+                sync_close(f)
+                move_into_place(temp_path, file_path)
+            with open(spool_path, 'rb') as src, open(file_path, 'ab') as f:
+                shutil.copyfileobj(src, f, CHUNK_SIZE)
+                f.flush()
+                os.fsync(f.fileno())
+            extend_line_index(file_path, (st.st_size, st.st_mtime_ns))
+            entry = scan_item(name, item_location(name))
+            with catalog_lock:
+                if entry:
+                    catalog[name] = entry
+    finally:
+        os.remove(spool_path)
+    
+    kinds = ['index']
+    if STORAGE_MIRRORED or CLUSTER_DB:
+        kinds.append('replicate')
+    queue_jobs([name], *kinds)
+    with text_appended:
+        append_count += 1
+        text_appended.notify_all()
+    return entry['size'] if entry else 0
+
+
+def follow_start(file_path):
+    """Offset of the first whole line in the last FOLLOW_BACKLOG bytes of a text upload"""
+    size = stored_encoding(file_path)[1]
+    if size <= FOLLOW_BACKLOG:
+        return 0
+    with open_upload(file_path) as f:
+        f.seek(size - FOLLOW_BACKLOG)
+        newline = f.read(FOLLOW_BACKLOG).find(b'\n')
+    return size - FOLLOW_BACKLOG + newline + 1 if newline >= 0 else size
+
+
+def follow_text(file_path, offset):
+    """Yield server-sent events with the text of an upload from byte `offset` on, as it grows"""
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    last_event = time.monotonic()
+    while True:
+        with text_appended:
+            seen = append_count
+        try:
+            size = stored_encoding(file_path)[1]
+        except OSError:
+            yield 'event: gone\ndata: \n\n'
+            return
+        if size < offset:
+            # Replaced by a shorter file: start over
+            offset = 0
+            decoder.reset()
+            yield 'event: reset\ndata: \n\n'
+        if offset < size:
+            with open_upload(file_path) as f:
+                f.seek(offset)
+                data = f.read(min(size - offset, CHUNK_SIZE))
+            offset += len(data)
+            text = decoder.decode(data).replace('\r\n', '\n').replace('\r', '\n')
+            if text:
+                # Bytes of a character cut in half are sent with the next chunk
+                event_id = offset - len(decoder.getstate()[0])
+                yield f"id: {event_id}\n" + ''.join(f"data: {line}\n" for line in text.split('\n')) + '\n'
+                last_event = time.monotonic()
+            continue
+        
+        if time.monotonic() - last_event >= FOLLOW_KEEPALIVE:
+            yield ': keepalive\n\n'
+            last_event = time.monotonic()
+        with text_appended:
+            # Also wakes up now and then for files written by other processes
+            text_appended.wait_for(lambda: append_count != seen, FOLLOW_POLL_INTERVAL)
 
 
 def get_text_preview(filename):
-    """Get preview of text file content"""
+    """Get preview of text file content: its first PREVIEW_LINES lines"""
     try:
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            return content
+        with open_lines(item_path(filename)) as f:
+            lines, truncated = read_lines(f, PREVIEW_LINES, PREVIEW_BYTES)
+            more = truncated or bool(f.readline(1))
+        return '\n'.join(lines) + ('\n…' if more else '')
     except:
         return "Unable to preview file"
 
 
+# Uploads and downloads are shaped by token buckets, one shared by all
+# transfers and one per client. Page loads, polling and the other small
+# requests are never throttled, and while any of them are in flight bulk
+# transfers pay double from the shared bucket to leave them room.
+TRANSFER_ENDPOINTS = {
+    'upload_text', 'upload_files', 'upload_folder', 'upload_session_file', 'append_upload',
+    'download_folder', 'bulk_download', 'uploaded_file', 'shared_file',
+}
+# How long a transfer waits for a free slot before it is turned away
+TRANSFER_QUEUE_TIMEOUT = 30
+# Idle per-client state is dropped after this many seconds
+CLIENT_IDLE_TIMEOUT = 300
+
+
+class TokenBucket:
+    """Token bucket letting through `rate` bytes per second with a burst of one second"""
+    
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, CHUNK_SIZE)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def reserve(self, amount):
+        """Take `amount` tokens, return how many seconds to wait before using them"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+global_bucket = TokenBucket(BANDWIDTH_LIMIT) if BANDWIDTH_LIMIT else None
+global_slots = threading.BoundedSemaphore(MAX_TRANSFERS) if MAX_TRANSFERS else None
+clients = {}
+clients_lock = threading.Lock()
+interactive_requests = 0
+transfer_stats = {
+    'active_transfers': 0,
+    'rejected_transfers': 0,
+    'throttled_seconds': {'upload': 0.0, 'download': 0.0},
+    'queued_seconds': 0.0,
+    'bytes': {'upload': 0, 'download': 0},
+}
+transfer_stats_lock = threading.Lock()
+
+
+def client_state(address):
+    """Get the bucket and transfer slots of a client, creating them on first use"""
+    now = time.monotonic()
+    with clients_lock:
+        state = clients.get(address)
+        if state is None:
+            for idle in [a for a, c in clients.items()
+                         if now - c['seen'] > CLIENT_IDLE_TIMEOUT and not c['active']]:
+                del clients[idle]
+            state = clients[address] = {
+                'bucket': TokenBucket(CLIENT_BANDWIDTH_LIMIT) if CLIENT_BANDWIDTH_LIMIT else None,
+                'slots': threading.BoundedSemaphore(CLIENT_MAX_TRANSFERS) if CLIENT_MAX_TRANSFERS else None,
+                'active': 0,
+                'seen': now,
+            }
+        state['seen'] = now
+        return state
+
+
+def count_stat(key, amount, direction=None):
+    with transfer_stats_lock:
+        if direction:
+            transfer_stats[key][direction] += amount
+        else:
+            transfer_stats[key] += amount
+
+
+def throttle(amount, client_bucket, direction):
+    """Wait until `amount` bytes of a transfer may go through"""
+    delay = 0.0
+    if global_bucket:
+        # Small requests in flight get priority over bulk transfers
+        delay = global_bucket.reserve(amount * 2 if interactive_requests else amount)
+    if client_bucket:
+        delay = max(delay, client_bucket.reserve(amount))
+    count_stat('bytes', amount, direction)
+    if delay:
+        count_stat('throttled_seconds', delay, direction)
+        time.sleep(delay)
+
+
+class ThrottledInput:
+    """Request body stream paced by the bandwidth limits"""
+    
+    def __init__(self, stream, client_bucket):
+        self.stream = stream
+        self.client_bucket = client_bucket
+    
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        throttle(len(data), self.client_bucket, 'upload')
+        return data
+    
+    def readline(self, size=-1):
+        data = self.stream.readline(size)
+        throttle(len(data), self.client_bucket, 'upload')
+        return data
+
+
+class TransferBody:
+    """Response body iterable of a transfer, paced by the bandwidth limits
+
+    It frees the transfer's slots when the server closes it, which is also
+    the case for file responses the server sends without Response.close().
+    """
+    
+    def __init__(self, body, client):
+        self.body = body
+        self.client = client
+        self.shaped = bool(global_bucket or client['bucket'])
+        self.closed = False
+    
+    def __iter__(self):
+        for chunk in self.body:
+            if self.shaped:
+                throttle(len(chunk), self.client['bucket'], 'download')
+            yield chunk
+    
+    def close(self):
+        if hasattr(self.body, 'close'):
+            self.body.close()
+        if not self.closed:
+            self.closed = True
+            finish_transfer(self.client)
+
+
+def acquire_slot(semaphore, deadline):
+    return semaphore is None or semaphore.acquire(timeout=max(0, deadline - time.monotonic()))
+
+
+@app.before_request
+def start_transfer():
+    """Take a transfer slot for uploads and downloads and pace their request body"""
+    global interactive_requests
+    if request.endpoint not in TRANSFER_ENDPOINTS:
+        with transfer_stats_lock:
+            interactive_requests += 1
+        g.interactive = True
+        return
+    
+    client = client_state(request.remote_addr)
+    started = time.monotonic()
+    deadline = started + TRANSFER_QUEUE_TIMEOUT
+    if not acquire_slot(client['slots'], deadline):
+        count_stat('rejected_transfers', 1)
+        return Response('Too many transfers from this client', 429, {'Retry-After': '5'})
+    if not acquire_slot(global_slots, deadline):
+        if client['slots']:
+            client['slots'].release()
+        count_stat('rejected_transfers', 1)
+        return Response('Too many transfers', 429, {'Retry-After': '5'})
+    count_stat('queued_seconds', time.monotonic() - started)
+    count_stat('active_transfers', 1)
+    with clients_lock:
+        client['active'] += 1
+    g.transfer = client
+    
+    if global_bucket or client['bucket']:
+        request.environ['wsgi.input'] = ThrottledInput(request.environ['wsgi.input'], client['bucket'])
+
+
+def finish_transfer(client):
+    with clients_lock:
+        client['active'] -= 1
+    count_stat('active_transfers', -1)
+    if client['slots']:
+        client['slots'].release()
+    if global_slots:
+        global_slots.release()
+
+
+@app.after_request
+def shape_transfer(response):
+    """Pace a transfer's response body and free its slot once it has been sent"""
+    client = g.pop('transfer', None)
+    if client is not None:
+        response.response = TransferBody(response.response, client)
+    return response
+
+
+@app.teardown_request
+def end_request(error=None):
+    global interactive_requests
+    if g.pop('interactive', False):
+        with transfer_stats_lock:
+            interactive_requests -= 1
+    # The request failed before a response could take over the slot
+    client = g.pop('transfer', None)
+    if client is not None:
+        finish_transfer(client)
+
+
+@app.route('/transfer-stats')
+def transfer_stats_view():
+    """Bandwidth shaping metrics: time spent throttled or queued, bytes moved"""
+    with transfer_stats_lock:
+        stats = json.loads(json.dumps(transfer_stats))
+    stats['throttled_seconds'] = {k: round(v, 3) for k, v in stats['throttled_seconds'].items()}
+    stats['queued_seconds'] = round(stats['queued_seconds'], 3)
+    stats['limits'] = {
+        'bandwidth': BANDWIDTH_LIMIT,
+        'client_bandwidth': CLIENT_BANDWIDTH_LIMIT,
+        'max_transfers': MAX_TRANSFERS,
+        'client_max_transfers': CLIENT_MAX_TRANSFERS,
+    }
+    return jsonify(stats)
+
+
 @app.route('/')
 def index():
     date_groups = get_files_by_date()
     current_hash = get_folder_hash()
     
-    def sort_key(date_label):
-        if date_label == "Today":
-            return (0, "")
-        elif date_label == "Yesterday":
-            return (1, "")
-        else:
-            try:
-                date_obj = datetime.strptime(date_label, "%B %d, %Y")
-                return (2, -date_obj.timestamp())
-            except:
-                return (3, date_label)
-    
-    date_groups_sorted = sorted(date_groups.keys(), key=sort_key)
-    
     return render_template_string(HTML, 
                                  date_groups=date_groups, 
-                                 date_groups_sorted=date_groups_sorted,
+                                 day_label=day_label,
                                  current_hash=current_hash,
-                                 get_text_preview=get_text_preview,
-                                 get_file_size=get_file_size)
+                                 items=item_macros(),
+                                 assets=ASSET_NAMES)
 
 
 @app.route('/check-updates')
@@ -1425,13 +5392,147 @@ def check_updates():
     })
 
 
+@app.route('/jobs')
+def jobs_status():
+    """Background job queue: counts by state and kind, running and failed jobs"""
+    conn = jobs_db()
+    counts = {}
+    for state, kind, count in conn.execute('SELECT state, kind, COUNT(*) FROM jobs GROUP BY state, kind'):
+        counts.setdefault(state, {})[kind] = count
+    jobs = [job_dict(row) for row in conn.execute(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE state != 'done' ORDER BY id DESC LIMIT 100")]
+    conn.close()
+    return jsonify({'workers': JOB_WORKERS, 'counts': counts, 'jobs': jobs})
+
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """State of one background job"""
+    conn = jobs_db()
+    row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_dict(row))
+
+
+@app.route('/cluster')
+def cluster_status():
+    """This node's view of the cluster: versions, nodes and lease holders"""
+    status = {'enabled': bool(CLUSTER_DB), 'node': NODE_ID, 'version': current_version()}
+    if CLUSTER_DB:
+        conn = cluster_db()
+        status['latest'] = conn.execute('SELECT COALESCE(MAX(version), 0) FROM changes').fetchone()[0]
+        status['nodes'] = [{'node': node, 'version': version, 'seen': seen} for node, version, seen
+                           in conn.execute('SELECT node, version, seen FROM nodes ORDER BY node')]
+        status['leases'] = {name: {'holder': holder, 'expires': expires} for name, holder, expires
+                            in conn.execute('SELECT name, holder, expires FROM leases')}
+        conn.close()
+    return jsonify(status)
+
+
+@app.route('/folder-tree/<path:path>')
+def folder_tree(path):
+    """One directory level of an uploaded folder, a page at a time"""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', FOLDER_PAGE_SIZE, type=int), 1), MAX_FOLDER_PAGE_SIZE)
+    entries = folder_level(path)
+    if entries is None:
+        return jsonify({'error': 'Folder not found'}), 404
+    return jsonify({
+        'path': path.strip('/'),
+        'total': len(entries),
+        'offset': offset,
+        'entries': entries[offset:offset + limit],
+    })
+
+
+@app.route('/search')
+def search():
+    """Search uploads by file name, path or text content"""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'query': query, 'results': search_uploads(query, limit)})
+
+
+def receive_text_upload():
+    """Stream the text upload form to a temporary file
+
+    Returns (title, temp_path, sha256); temp_path is None when no text was sent.
+    Aborts with 413 as soon as the text grows past TEXT_MAX_BYTES.
+    """
+    # Allow some room for the title and the multipart framing
+    if request.content_length is not None and request.content_length > TEXT_MAX_BYTES + CHUNK_SIZE:
+        abort(413)
+    
+    encoding = None
+    if AT_REST_COMPRESSION != 'off' and (request.content_length or 0) > AT_REST_MIN_BYTES:
+        encoding = AT_REST_COMPRESSION
+    elif 0 < TEXT_GZIP_THRESHOLD < (request.content_length or 0):
+        encoding = 'gzip'
+    f, temp_path = create_temp(INCOMING_FOLDER)
+    out = at_rest_writer(f, encoding)
+    written = 0
+    
+    def write(data):
+        nonlocal written
+        written += len(data)
+        if written > TEXT_MAX_BYTES:
+            out.close()
+            os.remove(temp_path)
+            abort(413)
+        out.write(data)
+    
+    title = b''
+    try:
+        mimetype, options = parse_options_header(request.content_type or '')
+        if mimetype == 'multipart/form-data' and 'boundary' in options:
+            decoder = MultipartDecoder(options['boundary'].encode('ascii'))
+            field = None
+            while True:
+                try:
+                    event = decoder.next_event()
+                except ValueError:
+                    # The body ended before the closing boundary or is malformed
+                    abort(400)
+                if isinstance(event, (Field, File)):
+                    field = event.name
+                elif isinstance(event, Data):
+                    if field == 'text_content':
+                        write(event.data)
+                    elif field == 'title' and len(title) < 1024:
+                        title += event.data
+                elif isinstance(event, Epilogue):
+                    break
+                elif decoder.complete:
+                    break
+                else:
+                    decoder.receive_data(request.stream.read(CHUNK_SIZE) or None)
+        else:
+            # Urlencoded forms from other clients are small enough to parse whole
+            write(request.form.get('text_content', '').encode('utf-8'))
+            title = request.form.get('title', '').encode('utf-8')
+        out.close()
+    except BaseException:
+        if os.path.exists(temp_path):
+            out.close()
+            os.remove(temp_path)
+        raise
+    
+    if not written:
+        os.remove(temp_path)
+        temp_path = None
+    return title.decode('utf-8', errors='replace').strip(), temp_path, out.sha256.hexdigest()
+
+
 @app.route('/upload-text', methods=['POST'])
 def upload_text():
     """Handle text upload"""
-    text_content = request.form.get('text_content', '')
-    title = request.form.get('title', '').strip()
+    previous_hash = get_folder_hash()
+    title, temp_path, sha256 = receive_text_upload()
+    changed = []
     
-    if text_content:
+    if temp_path:
         if title:
             safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '_', '-')).strip()
             safe_title = safe_title.replace(' ', '_')
@@ -1440,99 +5541,513 @@ def upload_text():
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"text_{timestamp}.txt"
         
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        counter = 1
-        base_name, ext = os.path.splitext(filename)
-        while os.path.exists(file_path):
-            filename = f"{base_name}_{counter}{ext}"
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            counter += 1
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(text_content)
-    
-    return redirect(url_for('index'))
+        filename = reserve_name(*os.path.splitext(filename))
+        try:
+            file_path = new_item_path(filename)
+            move_into_place(temp_path, file_path)
+            record_checksum(file_path, sha256)
+            item_changed(filename)
+        finally:
+            release_name(filename)
+        changed.append(filename)
+    
+    return mutation_response(changed, previous_hash)
 
 
 @app.route('/upload-files', methods=['POST'])
 def upload_files():
+    previous_hash = get_folder_hash()
     files = request.files.getlist('files')
+    changed = []
     
     if len(files) == 1:
         file = files[0]
         if file and file.filename:
-            file_path = os.path.join(UPLOAD_FOLDER, os.path.basename(file.filename))
-            file.save(file_path)
+            file_path = new_item_path(os.path.basename(file.filename))
+            record_checksum(file_path, save_upload(file, file_path))
+            item_changed(os.path.basename(file.filename))
+            changed.append(os.path.basename(file.filename))
     else:
         first_filename = os.path.splitext(os.path.basename(files[0].filename))[0]
         folder_name = generate_unique_folder_name(f"Multiple_Files_{first_filename}")
-        folder_path = os.path.join(UPLOAD_FOLDER, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        for file in files:
-            if file and file.filename:
-                file_path = os.path.join(folder_path, os.path.basename(file.filename))
-                file.save(file_path)
-    
-    return redirect(url_for('index'))
+        try:
+            folder_path = new_item_path(folder_name)
+            os.makedirs(folder_path, exist_ok=True)
+            
+            checksums = []
+            for file in files:
+                if file and file.filename:
+                    file_path = os.path.join(folder_path, os.path.basename(file.filename))
+                    checksums.append((file_path, save_upload(file, file_path)))
+            record_checksums(checksums)
+            item_changed(folder_name)
+        finally:
+            release_name(folder_name)
+        changed.append(folder_name)
+    
+    return mutation_response(changed, previous_hash)
 
 
 @app.route('/upload-folder', methods=['POST'])
 def upload_folder():
+    previous_hash = get_folder_hash()
     files = request.files.getlist('files')
     if not files:
-        return redirect(url_for('index'))
-    
-    root_folders = set()
-    for file in files:
-        if file.filename:
-            parts = file.filename.replace('\\', '/').split('/')
-            if len(parts) > 1:
-                root_folders.add(parts[0])
+        return mutation_response([], previous_hash)
     
-    if len(root_folders) == 1:
+    folder_name, prefix = folder_upload_target([file.filename for file in files if file.filename])
+    try:
+        checksums = []
         for file in files:
             if file and file.filename:
-                file_path = os.path.join(UPLOAD_FOLDER, file.filename.replace('\\', '/'))
+                file_path = folder_upload_path(prefix, file.filename)
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                file.save(file_path)
-    else:
-        first_folder = list(root_folders)[0] if root_folders else "upload"
-        folder_name = generate_unique_folder_name(f"Multiple_Folders_{first_folder}")
-        folder_path = os.path.join(UPLOAD_FOLDER, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        for file in files:
-            if file and file.filename:
-                file_path = os.path.join(folder_path, file.filename.replace('\\', '/'))
+                checksums.append((file_path, save_upload(file, file_path)))
+        record_checksums(checksums)
+        item_changed(folder_name)
+    finally:
+        if prefix is not None:
+            release_name(folder_name)
+    
+    return mutation_response([folder_name], previous_hash)
+
+
+# Folder uploads from the page are split into one request per file. A
+# session fixes the target folder up front so every file lands in the same
+# place a single multipart upload_folder request would have used. Until the
+# session completes its files are kept in a hidden staging directory, which
+# is then renamed into place, so the listing never shows half a folder.
+# A session knows the paths it expects and only completes once all of them
+# have arrived; files that failed can be sent again in the same session.
+# Sessions abandoned for UPLOAD_SESSION_TTL are dropped with their files.
+UPLOAD_SESSION_TTL = 24 * 3600
+upload_sessions = {}
+upload_sessions_lock = threading.Lock()
+
+
+def expire_upload_sessions():
+    """Drop the sessions older than UPLOAD_SESSION_TTL and their staged files"""
+    now = time.time()
+    with upload_sessions_lock:
+        expired = [upload_sessions.pop(k) for k, v in list(upload_sessions.items())
+                   if now - v['created'] > UPLOAD_SESSION_TTL]
+    for session in expired:
+        shutil.rmtree(session['staging'], ignore_errors=True)
+        if session['prefix'] is not None:
+            release_name(session['folder'])
+
+
+def add_upload_session(folder_name, prefix, previous_hash, needed):
+    """Register an upload session with an empty staging directory, return its id
+    
+    `needed` maps the paths still to be sent to their SHA-256, or None when
+    the content isn't known up front.
+    """
+    expire_upload_sessions()
+    session_id = hashlib.sha256(os.urandom(32)).hexdigest()[:32]
+    staging = os.path.join(UPLOAD_FOLDER, TEMP_PREFIX + session_id)
+    os.makedirs(staging)
+    with upload_sessions_lock:
+        upload_sessions[session_id] = {'folder': folder_name, 'prefix': prefix, 'created': time.time(),
+                                       'previous_hash': previous_hash, 'needed': needed,
+                                       'staging': staging, 'checksums': []}
+    return session_id
+
+
+def session_file_path(session, rel_path):
+    """Get the staging path of one file of an upload session"""
+    parts = rel_path.split('/')
+    if session['prefix'] is None:
+        # Paths start with the folder itself, which the staging directory stands for
+        parts = parts[1:]
+    return os.path.join(session['staging'], *parts)
+
+
+def publish_staging(staging, folder_name):
+    """Move a staging directory into place as a top level folder, return the folder's path
+    
+    Into an existing folder of the same name the files are merged, as a
+    multipart upload_folder request would have written them.
+    """
+    folder_path = new_item_path(folder_name)
+    try:
+        os.rename(staging, folder_path)
+    except OSError as e:
+        if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+            raise
+        for root, dirs, files in os.walk(staging):
+            target = os.path.join(folder_path, os.path.relpath(root, staging))
+            os.makedirs(target, exist_ok=True)
+            for filename in files:
+                os.replace(os.path.join(root, filename), os.path.join(target, filename))
+            fsync_directory(target)
+        shutil.rmtree(staging)
+    fsync_directory(os.path.dirname(folder_path))
+    return folder_path
+
+
+@app.route('/upload-sessions', methods=['POST'])
+def create_upload_session():
+    """Start a per-file folder upload"""
+    paths = [str(path) for path in (request.get_json(silent=True) or {}).get('paths', [])]
+    if not paths:
+        return jsonify({'error': 'No files'}), 400
+    needed = {}
+    for path in paths:
+        parts = path.replace('\\', '/').split('/')
+        if any(part in ('', '.', '..') for part in parts):
+            return jsonify({'error': 'Invalid path', 'path': path}), 400
+        needed['/'.join(parts)] = None
+    
+    folder_name, prefix = folder_upload_target(paths)
+    try:
+        session_id = add_upload_session(folder_name, prefix, get_folder_hash(), needed)
+    except BaseException:
+        if prefix is not None:
+            release_name(folder_name)
+        raise
+    return jsonify({'session': session_id, 'folder': folder_name})
+
+
+@app.route('/upload-sessions/<session_id>', methods=['DELETE'])
+def cancel_upload_session(session_id):
+    """Drop an upload session and the files it received"""
+    with upload_sessions_lock:
+        session = upload_sessions.pop(session_id, None)
+    if session is None:
+        return jsonify({'error': 'Unknown upload session'}), 404
+    
+    shutil.rmtree(session['staging'], ignore_errors=True)
+    if session['prefix'] is not None:
+        release_name(session['folder'])
+    return jsonify({'session': session_id})
+
+
+# Syncing uploads a new version of a folder from a manifest of its files.
+# Files whose content is already stored anywhere, going by the recorded
+# checksums, are hard linked into the session's staging directory; only the
+# rest has to be sent, through the session, which checks each one against
+# the manifest. The new folder appears once the session completes.
+@app.route('/sync-folder', methods=['POST'])
+def sync_folder():
+    """Start a folder sync from a manifest, answer which files still need sending
+    
+    The JSON body is {"folder": name, "files": [{"path", "size", "sha256"}]}
+    with paths relative to the folder. The new version is a new folder,
+    timestamped if the name is taken.
+    """
+    manifest = request.get_json(silent=True) or {}
+    folder = str(manifest.get('folder', '')).strip()
+    if not folder or '/' in folder or '\\' in folder or folder in ('.', '..') or is_temp_name(folder):
+        return jsonify({'error': 'Invalid folder name'}), 400
+    
+    files = {}
+    for item in manifest.get('files', []):
+        try:
+            parts = str(item['path']).replace('\\', '/').split('/')
+            size = int(item['size'])
+            sha256 = str(item['sha256']).lower()
+            valid = len(bytes.fromhex(sha256)) == 32
+        except (KeyError, TypeError, ValueError):
+            valid = False
+        if not valid or any(part in ('', '.', '..') for part in parts):
+            return jsonify({'error': 'Invalid manifest entry', 'entry': item}), 400
+        files['/'.join(parts)] = (size, sha256)
+    if not files:
+        return jsonify({'error': 'No files'}), 400
+    
+    folder_name = generate_unique_folder_name(folder)
+    try:
+        session_id = add_upload_session(folder_name, folder_name, get_folder_hash(), {})
+    except BaseException:
+        release_name(folder_name)
+        raise
+    
+    # The client doesn't know the session yet, nothing else touches it
+    session = upload_sessions[session_id]
+    blobs = find_blobs({sha256 for _, sha256 in files.values()})
+    reused = 0
+    reused_bytes = 0
+    for rel_path, (size, sha256) in files.items():
+        source = blobs.get(sha256)
+        if source is not None:
+            file_path = session_file_path(session, rel_path)
+            try:
                 os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                file.save(file_path)
+                link_blob(source, file_path)
+                session['checksums'].append((os.path.relpath(file_path, session['staging']), sha256))
+                reused += 1
+                reused_bytes += size
+                continue
+            except OSError as e:
+                print(f"Could not reuse {source} for {folder_name}/{rel_path}: {e}")
+        session['needed'][rel_path] = sha256
+    
+    return jsonify({'session': session_id, 'folder': folder_name, 'needed': sorted(session['needed']),
+                    'reused': reused, 'reused_bytes': reused_bytes})
+
+
+@app.route('/upload-sessions/<session_id>/files/<path:rel_path>', methods=['PUT'])
+def upload_session_file(session_id, rel_path):
+    """Receive one file of a folder upload as the raw request body"""
+    session = upload_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown upload session'}), 404
+    
+    parts = rel_path.replace('\\', '/').split('/')
+    if any(part in ('', '.', '..') for part in parts):
+        return jsonify({'error': 'Invalid path'}), 400
+    if session['prefix'] is None and (parts[0] != session['folder'] or len(parts) < 2):
+        return jsonify({'error': 'File outside the uploaded folder'}), 400
+    
+    rel_path = '/'.join(parts)
+    needed = session['needed']
+    file_path = session_file_path(session, rel_path)
+    if rel_path not in needed:
+        if os.path.isfile(file_path):
+            # Sent again after a lost response, the copy already here is kept
+            return jsonify({'path': rel_path})
+        return jsonify({'error': 'File not needed'}), 400
+    
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    sha256 = save_stream(request.stream, rel_path, file_path)
+    expected = needed.get(rel_path)
+    if expected is not None and sha256 != expected:
+        os.remove(file_path)
+        return jsonify({'error': 'Checksum mismatch', 'path': rel_path}), 400
+    with upload_sessions_lock:
+        needed.pop(rel_path, None)
+        # Recorded under the final path once the folder is in place
+        session['checksums'].append((os.path.relpath(file_path, session['staging']), sha256))
+    return jsonify({'path': rel_path})
+
+
+@app.route('/upload-sessions/<session_id>/complete', methods=['POST'])
+def complete_upload_session(session_id):
+    """Finish a per-file folder upload and publish the folder"""
+    with upload_sessions_lock:
+        session = upload_sessions.get(session_id)
+        if session is not None and session['needed']:
+            return jsonify({'error': 'Files missing', 'needed': sorted(session['needed'])}), 409
+        upload_sessions.pop(session_id, None)
+    if session is None:
+        return jsonify({'error': 'Unknown upload session'}), 404
     
-    return redirect(url_for('index'))
+    try:
+        folder_path = publish_staging(session['staging'], session['folder'])
+        record_checksums([(os.path.join(folder_path, rel_path), sha256)
+                          for rel_path, sha256 in session['checksums']])
+        item_changed(session['folder'])
+    finally:
+        if session['prefix'] is not None:
+            release_name(session['folder'])
+    return mutation_response([session['folder']], session['previous_hash'])
 
 
 @app.route('/download-folder/<path:folder_name>')
 def download_folder(folder_name):
-    folder_path = os.path.join(UPLOAD_FOLDER, folder_name)
+    files = folder_files(folder_name)
     
-    if not os.path.exists(folder_path):
+    if files is None:
         return "Folder not found", 404
     
-    memory_file = BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, folder_path)
-                zf.write(file_path, arcname)
+    return zip_response(files, f'{folder_name}.zip')
+
+
+# Checksum manifest added to folder archives, readable by `sha256sum -c`
+CHECKSUM_MANIFEST = 'SHA256SUMS'
+
+
+class ZipStream:
+    """Write-only file object handing out what a ZipFile wrote so far
+
+    It has no seek(), so zipfile writes data descriptors and the archive
+    can be sent while it is being built.
+    """
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+    
+    def write(self, data):
+        self.buffer += data
+        self.offset += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.offset
+    
+    def flush(self):
+        pass
+    
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def resolve_selection(paths):
+    """Turn selected upload paths into (file path on disk, name in archive) pairs"""
+    seen = set()
+    for path in paths:
+        path = path.replace('\\', '/').strip('/')
+        location = item_location(path.split('/')[0])
+        full_path = safe_join(location, path) if location and path else None
+        if not full_path or not os.path.exists(full_path):
+            continue
+        if os.path.isdir(full_path):
+            for file_path, rel_path in folder_files(path) or []:
+                arcname = os.path.join(path, rel_path)
+                if arcname not in seen:
+                    seen.add(arcname)
+                    yield file_path, arcname
+        elif path not in seen:
+            seen.add(path)
+            yield full_path, path
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive of (file path, name in archive) pairs chunk by chunk
+    
+    A SHA256SUMS file listing the checksum of every entry ends the archive.
+    Checksums that weren't recorded yet are taken on the way and recorded.
+    """
+    stream = ZipStream()
+    known = stored_checksums(file_path for file_path, _ in entries)
+    sums = []
+    hashed = []
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for file_path, arcname in entries:
+            if not os.path.isfile(file_path):
+                continue
+            sha256 = known.get(file_path)
+            digest = hashlib.sha256()
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open_upload(file_path) as src, zf.open(zinfo, 'w', force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if sha256 is None:
+                        digest.update(chunk)
+                    dest.write(chunk)
+                    if len(stream.buffer) >= CHUNK_SIZE:
+                        yield stream.take()
+            if sha256 is None:
+                sha256 = digest.hexdigest()
+                hashed.append((file_path, sha256))
+            sums.append(f"{sha256}  {arcname.replace(os.sep, '/')}\n")
+        if sums and CHECKSUM_MANIFEST not in {arcname for _, arcname in entries}:
+            zf.writestr(CHECKSUM_MANIFEST, ''.join(sums))
+    record_checksums(hashed)
+    yield stream.take()
+
+
+def zip_response(entries, filename):
+    """Stream a ZIP archive of (file path, name in archive) pairs as a download named `filename`"""
+    response = Response(stream_zip(entries), mimetype='application/zip')
+    try:
+        filename.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    except UnicodeEncodeError:
+        response.headers.set('Content-Disposition', 'attachment',
+                             filename=filename.encode('ascii', 'replace').decode('ascii'),
+                             **{'filename*': "UTF-8''" + urllib.parse.quote(filename)})
+    return response
+
+
+def selected_items():
+    """Get the list of selected upload paths from a form post or a JSON body"""
+    if request.is_json:
+        return [str(item) for item in (request.get_json(silent=True) or {}).get('items', [])]
+    return request.form.getlist('items')
+
+
+@app.route('/bulk-download', methods=['POST'])
+def bulk_download():
+    """Download the selected files and folders as one ZIP archive"""
+    entries = list(resolve_selection(selected_items()))
+    if not entries:
+        return "Nothing selected", 400
     
-    memory_file.seek(0)
-    return send_file(
-        memory_file,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=f'{folder_name}.zip'
-    )
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return zip_response(entries, f'selected_{timestamp}.zip')
+
+
+@app.route('/bulk-delete', methods=['POST'])
+def bulk_delete():
+    """Delete the selected files and folders with a single catalog update
+    
+    Items that can't be deleted are listed as failed in the JSON answer;
+    the catalog is updated for everything touched, including folders only
+    partly removed.
+    """
+    previous_hash = get_folder_hash()
+    removed = []
+    touched = []
+    failed = []
+    try:
+        for path in selected_items():
+            path = path.replace('\\', '/').strip('/')
+            location = item_location(path.split('/')[0])
+            full_path = safe_join(location, path) if location and path else None
+            if not full_path or not os.path.exists(full_path):
+                continue
+            touched.append(path)
+            try:
+                if os.path.isdir(full_path):
+                    shutil.rmtree(full_path)
+                else:
+                    os.remove(full_path)
+            except OSError as e:
+                print(f"Could not delete {path}: {e}")
+                failed.append(path)
+                continue
+            removed.append(path)
+    finally:
+        if touched:
+            item_changed(*touched)
+    return mutation_response(removed, previous_hash, failed)
+
+
+@app.route('/assets/<name>')
+def asset(name):
+    """Serve a fingerprinted stylesheet or script, precompressed when the client allows"""
+    asset = ASSETS.get(name)
+    if asset is None:
+        abort(404)
+    encoding = preferred_encoding(asset)
+    response = Response(asset[encoding or 'identity'], mimetype=asset['mimetype'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # The name changes with the content, so it never needs revalidating
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress HTML and JSON responses above COMPRESS_MIN_BYTES"""
+    if (request.endpoint in TRANSFER_ENDPOINTS or request.endpoint == 'asset'
+            or response.direct_passthrough or response.is_streamed
+            or response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = preferred_encoding({'br', 'gzip'} if brotli is not None else {'gzip'})
+    if encoding is None:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=5))
+    else:
+        response.set_data(gzip.compress(body, 6))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
 
 @app.route('/logo.png')
@@ -1540,26 +6055,287 @@ def logo():
     return send_from_directory('.', 'logo.png')
 
 
+def send_upload(location, filename, file_path, sha256=None, etag=None):
+    """Send a stored upload, as stored when the client accepts its at-rest compression
+    
+    The SHA-256, when known, is the entity tag and the Digest; otherwise
+    `etag` is the entity tag if given.
+    """
+    encoding, size = stored_encoding(file_path)
+    etag = sha256 or etag
+    if encoding and request.accept_encodings[encoding]:
+        # Send the stored bytes untouched and let the client decompress
+        response = send_from_directory(location, filename,
+                                       etag=f"{etag}.{encoding}" if etag else True)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+    if encoding:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = Response(iter_upload(file_path), mimetype=mimetype,
+                            headers={'Content-Length': str(size), 'Vary': 'Accept-Encoding'})
+        if etag:
+            response.set_etag(etag)
+            if sha256:
+                response.headers['Digest'] = digest_header(sha256)
+            response.make_conditional(request.environ)
+        return response
+    response = send_from_directory(location, filename, etag=etag or True)
+    if sha256:
+        response.headers['Digest'] = digest_header(sha256)
+    return response
+
+
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    top = filename.split('/')[0]
+    location = item_location(top) or UPLOAD_FOLDER
+    file_path = safe_join(location, filename)
+    if file_path and os.path.isfile(file_path):
+        return send_upload(location, filename, file_path, stored_checksum(file_path))
+    return send_from_directory(location, filename)
+
+
+# Share links name the content they were made for and carry their expiry
+# and an HMAC over both, so serving one needs no lookup and its response
+# never changes: caches may keep it until the link expires. A link stops
+# working when the file is replaced; sharing it again gives a new URL.
+MAX_SHARE_TTL = 365 * 24 * 3600
+SHARE_KEY_BYTES = 32
+_share_key = None
+share_key_lock = threading.Lock()
+
+
+def share_key():
+    """Get the key share links are signed with, creating a random one on first use
+    
+    The key file is written in full under a temporary name and then linked
+    into place, so processes starting together never read a partial key.
+    """
+    global _share_key
+    with share_key_lock:
+        if _share_key is not None:
+            return _share_key
+        if SHARE_SECRET:
+            _share_key = SHARE_SECRET.encode()
+            return _share_key
+        
+        path = os.path.join(DATA_FOLDER, 'share_secret')
+        if not os.path.exists(path):
+            fd, temp_path = tempfile.mkstemp(dir=DATA_FOLDER, prefix='share_secret.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(os.urandom(SHARE_KEY_BYTES))
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Fails if another process got there first; its key is used
+                os.link(temp_path, path)
+                fsync_directory(DATA_FOLDER)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temp_path)
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) != SHARE_KEY_BYTES:
+            raise RuntimeError(f"{path} does not hold a {SHARE_KEY_BYTES} byte key, remove it to make a new one")
+        _share_key = key
+        return _share_key
+
+
+def content_version(file_path):
+    """Short tag of a stored file's current content, changing whenever it is replaced or modified"""
+    st = os.stat(file_path)
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def share_signature(filename, version, expires):
+    message = f"{version}/{expires}/{filename}".encode()
+    digest = hmac.new(share_key(), message, hashlib.sha256).digest()[:18]
+    return base64.urlsafe_b64encode(digest).decode()
+
+
+@app.route('/share/<path:filename>', methods=['POST'])
+def share(filename):
+    """Make a share link for a file, valid for ?ttl= seconds (SHARE_TTL by default)"""
+    top = filename.split('/')[0]
+    file_path = safe_join(item_location(top) or UPLOAD_FOLDER, filename)
+    if not file_path or not os.path.isfile(file_path):
+        abort(404)
+    ttl = min(max(request.values.get('ttl', SHARE_TTL, type=int), 60), MAX_SHARE_TTL)
+    version = content_version(file_path)
+    expires = int(time.time()) + ttl
+    url = url_for('shared_file', version=version, expires=expires,
+                  signature=share_signature(filename, version, expires), filename=filename, _external=True)
+    return jsonify({'url': url, 'expires': expires})
+
+
+@app.route('/s/<version>/<int:expires>/<signature>/<path:filename>')
+def shared_file(version, expires, signature, filename):
+    """Download through a share link, cacheable until the link expires"""
+    # Compared as bytes, compare_digest() refuses non-ASCII strings
+    if not hmac.compare_digest(signature.encode(), share_signature(filename, version, expires).encode()):
+        abort(403)
+    remaining = expires - int(time.time())
+    if remaining <= 0:
+        abort(410)
+    top = filename.split('/')[0]
+    location = item_location(top) or UPLOAD_FOLDER
+    file_path = safe_join(location, filename)
+    # A changed file is not what the link was made for
+    if not file_path or not os.path.isfile(file_path) or content_version(file_path) != version:
+        abort(404)
+    response = send_upload(location, filename, file_path, etag=version)
+    response.headers['Cache-Control'] = f'public, max-age={remaining}, immutable'
+    return response
+
+
+@app.route('/text/<path:filename>')
+def text_lines(filename):
+    """Lines of a text upload: ?start=N&end=M (from 1, inclusive) or the last ?tail=K"""
+    top = filename.split('/')[0]
+    file_path = safe_join(item_location(top) or UPLOAD_FOLDER, filename)
+    if not file_path or not os.path.isfile(file_path):
+        abort(404)
+    tail = request.args.get('tail', type=int)
+    if tail is not None:
+        total = line_index(file_path)[2]
+        return jsonify(text_window(file_path, total - max(tail, 0), max(tail, 0)))
+    start = max(request.args.get('start', 1, type=int), 1)
+    end = request.args.get('end', start + PREVIEW_LINES - 1, type=int)
+    return jsonify(text_window(file_path, start - 1, end - start + 1))
+
+
+@app.route('/append/<path:filename>', methods=['POST'])
+def append_upload(filename):
+    """Append the request body, or its text_content form field, to a text upload"""
+    with catalog_lock:
+        entry = catalog.get(filename)
+    if not filename.endswith('.txt') or entry is None or entry['kind'] != 'file':
+        abort(404)
+    if request.content_length is not None and request.content_length > TEXT_MAX_BYTES:
+        abort(413)
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        stream = BytesIO(request.form.get('text_content', '').encode('utf-8'))
+    else:
+        stream = request.stream
+    size = append_text(filename, stream)
+    return jsonify({'name': filename, 'size': size})
+
+
+@app.route('/follow/<path:filename>')
+def follow_upload(filename):
+    """Stream what is appended to a text upload as server-sent events
+    
+    Starts with the last lines of the file, or at byte ?offset=N (or the
+    Last-Event-ID a reconnecting EventSource sends); event ids are offsets.
+    """
+    with catalog_lock:
+        entry = catalog.get(filename)
+    if not filename.endswith('.txt') or entry is None or entry['kind'] != 'file':
+        abort(404)
+    file_path = item_path(filename)
+    offset = request.args.get('offset', request.headers.get('Last-Event-ID'), type=int)
+    if offset is None:
+        offset = follow_start(file_path)
+    return Response(follow_text(file_path, max(offset, 0)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/verify/<path:filename>')
+def verify(filename):
+    """Report the SHA-256 of an upload, or of each file in a folder
+    
+    With ?sha256=<hex> the answer also says whether the upload matches it.
+    """
+    top = filename.split('/')[0]
+    file_path = safe_join(item_location(top) or UPLOAD_FOLDER, filename)
+    if not file_path or not os.path.exists(file_path):
+        abort(404)
+    
+    if os.path.isdir(file_path):
+        results = []
+        for path, rel_path in folder_files(filename) or []:
+            record = checksum_record(path)
+            results.append({'path': rel_path.replace(os.sep, '/'),
+                            'sha256': record[0] if record else None,
+                            'corrupt': record[1] if record else False})
+        return jsonify({'path': filename, 'files': results})
+    
+    record = checksum_record(file_path)
+    sha256 = record[0] if record else file_checksum(file_path)
+    result = {'path': filename, 'sha256': sha256, 'corrupt': record[1] if record else False}
+    expected = request.args.get('sha256')
+    if expected:
+        result['match'] = expected.strip().lower() == sha256
+    return jsonify(result)
+
+
+@app.route('/scrub', methods=['GET', 'POST'])
+def scrub():
+    """Show the state of the last integrity scrub, POST starts a new one"""
+    if request.method == 'POST' and not scrub_status['running']:
+        threading.Thread(target=scrub_checksums, daemon=True).start()
+    with scrub_lock:
+        return jsonify(dict(scrub_status, corrupt=list(scrub_status['corrupt'])))
+
+
+@app.route('/thumbnails/<path:filename>')
+def thumbnail(filename):
+    top = filename.split('/')[0]
+    file_path = safe_join(item_location(top) or UPLOAD_FOLDER, filename)
+    if not file_path or not os.path.isfile(file_path) or not thumbnail_supported(filename):
+        abort(404)
+    try:
+        target = request_thumbnail(file_path).result(timeout=THUMBNAIL_WAIT)
+    except FutureTimeoutError:
+        abort(503)
+    except Exception:
+        abort(404)
+    try:
+        return send_file(os.path.abspath(target), mimetype='image/jpeg',
+                         etag=os.path.basename(target)[:-4], max_age=3600)
+    except FileNotFoundError:
+        # Evicted between render and send, the next request renders it again
+        abort(503)
 
 
 @app.route('/delete/<path:filename>', methods=['POST'])
 def delete_file(filename):
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    previous_hash = get_folder_hash()
+    file_path = item_path(filename)
     if os.path.exists(file_path):
         os.remove(file_path)
-    return redirect(url_for('index'))
+        item_changed(filename)
+    return mutation_response([filename], previous_hash)
 
 
 @app.route('/delete-folder/<path:folder_name>', methods=['POST'])
 def delete_folder(folder_name):
-    folder_path = os.path.join(UPLOAD_FOLDER, folder_name)
+    previous_hash = get_folder_hash()
+    folder_path = item_path(folder_name)
     if os.path.exists(folder_path) and os.path.isdir(folder_path):
-        import shutil
         shutil.rmtree(folder_path)
-    return redirect(url_for('index'))
+        item_changed(folder_name)
+    return mutation_response([folder_name], previous_hash)
+
+
+def start_background_tasks():
+    """Start expiry, cleanup, the job workers, the catalog watcher and storage sync"""
+    threading.Thread(target=auto_delete_scheduler, daemon=True).start()
+    threading.Thread(target=janitor, daemon=True).start()
+    start_job_workers()
+    threading.Thread(target=catalog_watcher, daemon=True).start()
+    if SCRUB_INTERVAL > 0:
+        threading.Thread(target=scrub_scheduler, daemon=True).start()
+    if CLUSTER_DB:
+        threading.Thread(target=cluster_follower, daemon=True).start()
+    elif STORAGE_MIRRORED:
+        replication_executor.submit(sync_storage)
+
+
+if BACKGROUND_TASKS != 'off':
+    start_background_tasks()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+"""Move existing uploads between the flat and the dated storage layout
+
+    python migrate_uploads.py dated    # uploads/<name> -> uploads/YYYY/MM/DD/<name>
+    python migrate_uploads.py flat     # uploads/YYYY/MM/DD/<name> -> uploads/<name>
+
+Stop the app before migrating and start it again with STORAGE_LAYOUT set to
+the new layout. The flat layout dates uploads by their ctime, which a move
+resets, so migrating back to flat groups everything under the current day.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+PARTITION_FORMAT = os.path.join('%Y', '%m', '%d')
+
+
+def is_partition_year(name):
+    return len(name) == 4 and name.isdigit() and os.path.isdir(os.path.join(UPLOAD_FOLDER, name))
+
+
+def partition_dirs():
+    """Yield every YYYY/MM/DD partition directory"""
+    for year in sorted(os.listdir(UPLOAD_FOLDER)):
+        if not is_partition_year(year):
+            continue
+        year_path = os.path.join(UPLOAD_FOLDER, year)
+        for month in sorted(os.listdir(year_path)):
+            month_path = os.path.join(year_path, month)
+            if not os.path.isdir(month_path):
+                continue
+            for day in sorted(os.listdir(month_path)):
+                day_path = os.path.join(month_path, day)
+                if os.path.isdir(day_path):
+                    yield day_path
+
+
+def to_dated(dry_run):
+    moved = 0
+    for item in sorted(os.listdir(UPLOAD_FOLDER)):
+        source = os.path.join(UPLOAD_FOLDER, item)
+        if item.startswith('.') or is_partition_year(item):
+            continue
+        created = datetime.fromtimestamp(os.path.getctime(source))
+        partition = os.path.join(UPLOAD_FOLDER, created.strftime(PARTITION_FORMAT))
+        target = os.path.join(partition, item)
+        if os.path.exists(target):
+            print(f"Skipped {item}: {target} already exists", file=sys.stderr)
+            continue
+        print(f"{source} -> {target}")
+        if not dry_run:
+            os.makedirs(partition, exist_ok=True)
+            os.rename(source, target)
+        moved += 1
+    return moved
+
+
+def to_flat(dry_run):
+    moved = 0
+    for partition in list(partition_dirs()):
+        for item in sorted(os.listdir(partition)):
+            source = os.path.join(partition, item)
+            target = os.path.join(UPLOAD_FOLDER, item)
+            if os.path.exists(target):
+                print(f"Skipped {item}: {target} already exists", file=sys.stderr)
+                continue
+            print(f"{source} -> {target}")
+            if not dry_run:
+                os.rename(source, target)
+            moved += 1
+        if not dry_run:
+            # Drop the day, month and year directories once they are empty
+            path = partition
+            while path != UPLOAD_FOLDER and not os.listdir(path):
+                os.rmdir(path)
+                path = os.path.dirname(path)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate uploads to another storage layout')
+    parser.add_argument('layout', choices=['dated', 'flat'])
+    parser.add_argument('--dry-run', action='store_true', help='only print what would be moved')
+    args = parser.parse_args()
+
+    if not os.path.isdir(UPLOAD_FOLDER):
+        parser.error(f"upload folder {UPLOAD_FOLDER!r} does not exist")
+
+    moved = to_dated(args.dry_run) if args.layout == 'dated' else to_flat(args.dry_run)
+    print(f"{'Would move' if args.dry_run else 'Moved'} {moved} item(s) to the {args.layout} layout")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Local stand-in for an S3 compatible object store
+
+Serves the part of the S3 API the app's S3Storage backend uses, addressed
+path-style as http://host:port/<bucket>/<key>: object PUT, GET with Range,
+HEAD and DELETE, ListObjectsV2 and multipart uploads. Objects are plain
+files under --root, buckets are created on first use and requests are not
+authenticated, so this is for trying STORAGE_BACKEND=s3 and for benchmarks,
+not for keeping data.
+
+    python s3_emulator.py --root /tmp/s3 --port 9000
+    STORAGE_BACKEND=s3 S3_ENDPOINT=http://127.0.0.1:9000 python ip.py
+
+--latency and --bandwidth slow every request down like a remote store would,
+so the effect of parallel part transfers shows up locally.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from flask import Flask, request, Response, send_file
+from werkzeug.security import safe_join
+
+
+CHUNK_SIZE = 64 * 1024
+MAX_KEYS = 1000
+MULTIPART_FOLDER = '.multipart'
+
+
+def xml_response(root, body, status=200):
+    return Response(f'<?xml version="1.0" encoding="UTF-8"?>\n<{root}>{body}</{root}>',
+                    status, mimetype='application/xml')
+
+
+def error(code, message, status):
+    return xml_response('Error', f'<Code>{code}</Code><Message>{escape(message)}</Message>', status)
+
+
+def iso_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def create_app(root, latency=0.0, bandwidth=0):
+    """Build the emulator app storing objects under `root`
+
+    `latency` seconds are added to every request and request and response
+    bodies move at most `bandwidth` bytes per second each (0 for no limit).
+    """
+    app = Flask(__name__)
+    multipart_root = os.path.join(root, MULTIPART_FOLDER)
+    os.makedirs(multipart_root, exist_ok=True)
+
+    def pace(size):
+        if bandwidth:
+            time.sleep(size / bandwidth)
+
+    def paced(body):
+        for chunk in body:
+            pace(len(chunk))
+            yield chunk
+
+    def object_path(bucket, key):
+        if bucket.startswith('.'):
+            return None
+        return safe_join(root, bucket, key) if key else safe_join(root, bucket)
+
+    def receive(target_dir):
+        """Write the request body to a temp file, return (path, md5 hex)"""
+        os.makedirs(target_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target_dir, prefix='.tmp-')
+        md5 = hashlib.md5()
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = request.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                pace(len(chunk))
+                md5.update(chunk)
+                f.write(chunk)
+        return temp_path, md5.hexdigest()
+
+    @app.before_request
+    def delay():
+        if latency:
+            time.sleep(latency)
+
+    @app.route('/<bucket>', methods=['GET', 'PUT'])
+    def bucket_view(bucket):
+        bucket_path = object_path(bucket, '')
+        if bucket_path is None:
+            return error('InvalidBucketName', bucket, 400)
+        if request.method == 'PUT':
+            os.makedirs(bucket_path, exist_ok=True)
+            return ''
+
+        # ListObjectsV2
+        prefix = request.args.get('prefix', '')
+        after = request.args.get('continuation-token') or request.args.get('start-after', '')
+        max_keys = min(int(request.args.get('max-keys', MAX_KEYS)), MAX_KEYS)
+        keys = []
+        for dirpath, dirnames, filenames in os.walk(bucket_path):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, filename), bucket_path).replace(os.sep, '/')
+                if key.startswith(prefix) and key > after:
+                    keys.append(key)
+        keys.sort()
+        page = keys[:max_keys]
+        truncated = len(keys) > max_keys
+
+        contents = []
+        for key in page:
+            st = os.stat(os.path.join(bucket_path, *key.split('/')))
+            contents.append(f'<Contents><Key>{escape(key)}</Key><Size>{st.st_size}</Size>'
+                            f'<LastModified>{iso_time(st.st_mtime)}</LastModified></Contents>')
+        body = (f'<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>'
+                f'<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>'
+                f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>' + ''.join(contents))
+        if truncated:
+            body += f'<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>'
+        return xml_response('ListBucketResult', body)
+
+    @app.route('/<bucket>/<path:key>', methods=['GET', 'PUT', 'POST', 'DELETE'])
+    def object_view(bucket, key):
+        path = object_path(bucket, key)
+        if path is None:
+            return error('InvalidArgument', key, 400)
+        upload_id = request.args.get('uploadId')
+        upload_path = safe_join(multipart_root, upload_id) if upload_id else None
+        if upload_id and (upload_path is None or not os.path.isdir(upload_path)):
+            return error('NoSuchUpload', upload_id, 404)
+
+        if request.method == 'POST' and 'uploads' in request.args:
+            upload_id = uuid.uuid4().hex
+            os.makedirs(os.path.join(multipart_root, upload_id))
+            with open(os.path.join(multipart_root, upload_id, 'upload.json'), 'w') as f:
+                json.dump({'bucket': bucket, 'key': key}, f)
+            return xml_response('InitiateMultipartUploadResult',
+                                f'<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>'
+                                f'<UploadId>{upload_id}</UploadId>')
+
+        if request.method == 'PUT' and upload_id:
+            part_number = int(request.args['partNumber'])
+            temp_path, md5 = receive(upload_path)
+            os.replace(temp_path, os.path.join(upload_path, f'{part_number:05d}.{md5}'))
+            return Response('', headers={'ETag': f'"{md5}"'})
+
+        if request.method == 'POST' and upload_id:
+            parts = {name.split('.')[0]: name for name in os.listdir(upload_path)}
+            digests = []
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as out:
+                for part in ET.fromstring(request.get_data()).iter():
+                    if not part.tag.endswith('PartNumber'):
+                        continue
+                    name = parts.get(f'{int(part.text):05d}')
+                    if name is None:
+                        os.remove(temp_path)
+                        return error('InvalidPart', part.text, 400)
+                    digests.append(bytes.fromhex(name.split('.')[1]))
+                    with open(os.path.join(upload_path, name), 'rb') as f:
+                        shutil.copyfileobj(f, out, CHUNK_SIZE)
+            os.replace(temp_path, path)
+            shutil.rmtree(upload_path)
+            etag = f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}"'
+            return xml_response('CompleteMultipartUploadResult',
+                                f'<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>'
+                                f'<ETag>{escape(etag)}</ETag>')
+
+        if request.method == 'DELETE' and upload_id:
+            shutil.rmtree(upload_path)
+            return Response(status=204)
+
+        if request.method == 'PUT':
+            temp_path, md5 = receive(os.path.dirname(path))
+            os.replace(temp_path, path)
+            return Response('', headers={'ETag': f'"{md5}"'})
+
+        if request.method == 'DELETE':
+            if os.path.isfile(path):
+                os.remove(path)
+            return Response(status=204)
+
+        # GET and HEAD, with Range support from send_file
+        if not os.path.isfile(path):
+            return error('NoSuchKey', key, 404)
+        response = send_file(os.path.abspath(path), mimetype='application/octet-stream', conditional=True)
+        if bandwidth and request.method == 'GET':
+            response.response = paced(response.response)
+        return response
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for an S3 compatible object store')
+    parser.add_argument('--root', default='s3-data', help='directory holding the buckets')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--bandwidth', type=int, default=0,
+                        help='bytes per second per request body, 0 for no limit')
+    args = parser.parse_args()
+
+    app = create_app(args.root, args.latency, args.bandwidth)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
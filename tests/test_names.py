@@ -0,0 +1,55 @@
+"""Regression tests for reserving upload names under concurrency"""
+import importlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONTENDED_UPLOADS = 1000
+
+
+@pytest.fixture
+def ip(tmp_path, monkeypatch):
+    """The app configured for an empty upload folder in tmp_path, without background threads"""
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setenv('DATA_FOLDER', str(tmp_path / 'data'))
+    monkeypatch.setenv('CATALOG_WATCHER', 'off')
+    monkeypatch.setenv('BACKGROUND_TASKS', 'off')
+    sys.modules.pop('ip', None)
+    module = importlib.import_module('ip')
+    yield module
+    sys.modules.pop('ip', None)
+
+
+def test_concurrent_reservations_get_unique_names(ip):
+    with ThreadPoolExecutor(16) as pool:
+        names = list(pool.map(lambda i: ip.reserve_name('report', '.txt'), range(200)))
+    assert len(set(names)) == len(names)
+    assert 'report.txt' in names
+
+
+def test_released_name_can_be_reserved_again(ip):
+    name = ip.reserve_name('draft', '.txt')
+    assert ip.reserve_name('draft', '.txt') != name
+    ip.release_name(name)
+    assert ip.reserve_name('draft', '.txt') == name
+
+
+def test_concurrent_same_title_uploads_are_all_kept(ip):
+    client = ip.app.test_client()
+
+    def upload(i):
+        response = client.post('/upload-text', data={'title': 'contended', 'text_content': f'upload {i}'})
+        response.close()
+        return response.status_code
+
+    with ThreadPoolExecutor(64) as pool:
+        statuses = list(pool.map(upload, range(CONTENDED_UPLOADS)))
+    assert all(status < 400 for status in statuses)
+    with ip.catalog_lock:
+        stored = [name for name in ip.catalog if name.startswith('contended')]
+    assert len(stored) == CONTENDED_UPLOADS
+    assert len(os.listdir(ip.UPLOAD_FOLDER)) == CONTENDED_UPLOADS